@@ -0,0 +1,22 @@
+import os
+import shutil
+
+import pytest
+
+import corpus
+
+PYMEDIACONCH_BENCHMARK_CORPUS_ENV_VARIABLE = "PYMEDIACONCH_BENCHMARK_CORPUS"
+
+
+@pytest.fixture(scope="session")
+def corpus_files(tmp_path_factory):
+    if corpus_path := os.getenv(PYMEDIACONCH_BENCHMARK_CORPUS_ENV_VARIABLE):
+        # Reuse an existing corpus between runs. Missing files are created.
+        return corpus.create_corpus(corpus_path)
+    if not shutil.which("ffmpeg"):
+        pytest.skip(
+            f"neither environment variable "
+            f"{PYMEDIACONCH_BENCHMARK_CORPUS_ENV_VARIABLE} nor ffmpeg was "
+            f"found, skipping benchmarks"
+        )
+    return corpus.create_corpus(tmp_path_factory.mktemp("corpus"))
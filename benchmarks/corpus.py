@@ -0,0 +1,76 @@
+"""Generate a reproducible corpus of media files for the benchmarks."""
+
+import argparse
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+
+# name: (container extension, ffmpeg encoding arguments)
+CODECS = {
+    "ffv1_mkv": ("mkv", ["-c:v", "ffv1", "-level", "3", "-c:a", "pcm_s24le"]),
+    "mpeg4_mp4": ("mp4", ["-c:v", "mpeg4", "-q:v", "2", "-c:a", "aac"]),
+    "prores_mov": ("mov", ["-c:v", "prores", "-c:a", "pcm_s24le"]),
+    "dv_avi": ("avi", ["-c:v", "dvvideo", "-pix_fmt", "yuv411p", "-c:a", "pcm_s16le", "-ar", "48000"]),
+}
+
+SIZES = {
+    "sd": "720x480",
+    "hd": "1920x1080",
+}
+
+DURATIONS = [1, 10]
+
+# Sources are synthetic and the output is written with bitexact flags so the
+# same ffmpeg build always produces byte identical files.
+BITEXACT = ["-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1"]
+
+
+def corpus_files():
+    """Yield (file name, codec, size, duration) for every corpus entry."""
+    for codec, size, duration in itertools.product(CODECS, SIZES, DURATIONS):
+        if codec == "dv_avi" and size != "sd":
+            continue
+        extension, _ = CODECS[codec]
+        yield f"{codec}_{size}_{duration}s.{extension}", codec, size, duration
+
+
+def create_corpus(output_dir, ffmpeg=None):
+    """Create any corpus files missing from output_dir.
+
+    Returns a dictionary of file name to full path.
+    """
+    ffmpeg = ffmpeg or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise FileNotFoundError("ffmpeg not found, cannot create benchmark corpus")
+    os.makedirs(output_dir, exist_ok=True)
+    files = {}
+    for file_name, codec, size, duration in corpus_files():
+        full_path = os.path.join(output_dir, file_name)
+        files[file_name] = full_path
+        if os.path.exists(full_path):
+            continue
+        _, encoding = CODECS[codec]
+        subprocess.check_call(
+            [
+                ffmpeg, "-nostdin", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"smptebars=duration={duration}:size={SIZES[size]}:rate=30000/1001",
+                "-f", "lavfi", "-i", f"sine=frequency=1000:duration={duration}:sample_rate=48000",
+                *encoding, *BITEXACT, "-y", full_path
+            ]
+        )
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the benchmark media corpus")
+    parser.add_argument("output", help="output directory")
+    args = parser.parse_args()
+    for file_name in create_corpus(args.output):
+        print(file_name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import corpus
+from uiucprescon.pymediaconch import batch, mediaconch
+from uiucprescon.pymediaconch.policies import Policy
+
+CORPUS_FILE_NAMES = [file_name for file_name, *_ in corpus.corpus_files()]
+
+REPORT_FORMATS = [
+    mediaconch.MediaConch_format_t.MediaConch_format_Text,
+    mediaconch.MediaConch_format_t.MediaConch_format_Xml,
+    mediaconch.MediaConch_format_t.MediaConch_format_MaXml,
+    mediaconch.MediaConch_format_t.MediaConch_format_Html,
+    mediaconch.MediaConch_format_t.MediaConch_format_Json,
+    mediaconch.MediaConch_format_t.MediaConch_format_CSV,
+]
+
+POLICY_TEMPLATE = """<?xml version="1.0"?>
+<policy type="and" name="Benchmark policy {index}">
+  <rule name="Has format" value="Format" tracktype="General" occurrence="*" operator="exists"/>
+  <rule name="Video width" value="Width" tracktype="Video" occurrence="*" operator="&gt;">{index}</rule>
+</policy>
+"""
+
+
+def make_policies(count):
+    return [
+        Policy.from_string(POLICY_TEMPLATE.format(index=index), name=f"benchmark_{index}")
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("file_name", CORPUS_FILE_NAMES)
+def test_add_file(benchmark, corpus_files, file_name):
+    benchmark.group = "add_file"
+    benchmark.extra_info["bytes"] = os.path.getsize(corpus_files[file_name])
+
+    def setup():
+        return (mediaconch.MediaConch(), corpus_files[file_name]), {}
+
+    benchmark.pedantic(lambda mc, path: mc.add_file(path), setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("report_format", REPORT_FORMATS, ids=lambda value: value.name)
+def test_get_report(benchmark, corpus_files, report_format):
+    benchmark.group = "get_report"
+    mc = mediaconch.MediaConch()
+    mc.set_format(report_format)
+    file_id = mc.add_file(corpus_files["ffv1_mkv_hd_10s.mkv"])
+    benchmark(mc.get_report, file_id)
+
+
+@pytest.mark.parametrize("policy_count", [0, 1, 10, 40])
+def test_policy_count_scaling(benchmark, corpus_files, policy_count):
+    benchmark.group = "policy count"
+    path = corpus_files["ffv1_mkv_sd_1s.mkv"]
+
+    def setup():
+        mc = batch.create_instance(make_policies(policy_count))
+        return (mc, path), {}
+
+    benchmark.pedantic(batch.validate_file, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+@pytest.mark.parametrize("max_workers", [1, 2, 4, 8])
+def test_worker_scaling(benchmark, corpus_files, mode, max_workers):
+    benchmark.group = f"{mode} scaling"
+    benchmark.extra_info["max_workers"] = max_workers
+    paths = list(corpus_files.values()) * 4
+    benchmark.pedantic(
+        batch.validate_many,
+        args=(paths,),
+        kwargs={"max_workers": max_workers, "mode": mode},
+        rounds=3
+    )
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "pass",
+        "import uiucprescon.pymediaconch.cli",
+        "import uiucprescon.pymediaconch.batch",
+        "from uiucprescon.pymediaconch import mediaconch",
+        "import uiucprescon.pymediaconch.mediaconch",
+    ],
+    ids=lambda value: "interpreter" if value == "pass" else value,
+)
+def test_import_time(benchmark, code):
+    # Each round starts a fresh interpreter. The "interpreter" case is the
+    # startup cost alone, to subtract from the others.
+    benchmark.group = "import"
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", code],),
+        kwargs={"check": True},
+        rounds=10,
+    )
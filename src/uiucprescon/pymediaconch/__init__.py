@@ -0,0 +1,15 @@
+"""Python wrapper around MediaConch."""
+
+from typing import Any
+
+
+def __getattr__(name: str) -> Any:
+    # ``from uiucprescon.pymediaconch import mediaconch`` looks the name up
+    # here before it falls back to importing the submodule, so it gets the
+    # deferred module and the extension is only loaded when first used.
+    # ``import uiucprescon.pymediaconch.mediaconch`` still loads it at once.
+    if name == "mediaconch":
+        from uiucprescon.pymediaconch._native import mediaconch
+
+        return mediaconch
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
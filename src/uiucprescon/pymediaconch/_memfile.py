@@ -0,0 +1,101 @@
+"""Files that live in memory but can be opened by path."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Optional, Union
+
+BufferLike = Union[bytes, bytearray, memoryview]
+
+_COPY_SIZE = 4 * 1024 * 1024
+
+
+def _supports_memfd() -> bool:
+    return hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+
+
+class MemoryFile:
+    """Writable file that libmediaconch can open by :attr:`path`.
+
+    On Linux the data is held in an anonymous memory file created with
+    memfd_create and is never written to disk. Such a file takes RAM, or
+    swap, for every byte written to it, so once it would grow past
+    ``max_memory`` bytes its content is moved to a temporary file on disk.
+    Elsewhere a temporary file is used from the start. Temporary files are
+    deleted again by :meth:`close`.
+
+    The :attr:`path` changes when the content is moved to disk.
+    """
+
+    def __init__(
+        self,
+        name: str = "pymediaconch",
+        suffix: str = "",
+        max_memory: Optional[int] = None,
+    ) -> None:
+        self._name = name
+        self._suffix = suffix
+        self.max_memory = max_memory
+        if _supports_memfd() and (max_memory is None or max_memory > 0):
+            self._fd = os.memfd_create(name, os.MFD_CLOEXEC)
+            self.path = f"/proc/self/fd/{self._fd}"
+            self._temporary = False
+        else:
+            self._fd, self.path = self._create_temporary()
+            self._temporary = True
+        self.size = 0
+
+    def _create_temporary(self):
+        return tempfile.mkstemp(prefix=f"{self._name}-", suffix=self._suffix)
+
+    def _move_to_disk(self) -> None:
+        fd, path = self._create_temporary()
+        try:
+            offset = 0
+            while offset < self.size:
+                block = os.pread(self._fd, _COPY_SIZE, offset)
+                view = memoryview(block)
+                while view:
+                    view = view[os.write(fd, view):]
+                offset += len(block)
+        except BaseException:
+            os.close(fd)
+            os.remove(path)
+            raise
+        os.close(self._fd)
+        self._fd, self.path, self._temporary = fd, path, True
+
+    @property
+    def in_memory(self) -> bool:
+        """True while the content is held in memory rather than on disk."""
+        return not self._temporary
+
+    def write(self, data: BufferLike) -> None:
+        """Append data to the file without copying it first."""
+        view = memoryview(data).cast("B")
+        if (
+            self.in_memory
+            and self.max_memory is not None
+            and self.size + len(view) > self.max_memory
+        ):
+            self._move_to_disk()
+        while view:
+            written = os.write(self._fd, view)
+            self.size += written
+            view = view[written:]
+
+    def close(self) -> None:
+        """Release the memory or delete the temporary file."""
+        if self._fd < 0:
+            return
+        os.close(self._fd)
+        self._fd = -1
+        if self._temporary:
+            os.remove(self.path)
+
+    def __enter__(self) -> MemoryFile:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
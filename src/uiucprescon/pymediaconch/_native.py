@@ -0,0 +1,56 @@
+"""Deferred loading of the compiled extension.
+
+The extension links MediaInfoLib, libxml2 and libxslt, and loading it is
+most of the cost of importing this package. The modules of the package
+refer to it through :data:`mediaconch`, which only loads it on first use,
+so importing them, for example to build a command line parser or to parse
+saved reports, does not load it. ``from uiucprescon.pymediaconch import
+mediaconch`` gives the same deferred module, while
+``import uiucprescon.pymediaconch.mediaconch`` loads the extension at once.
+"""
+
+from __future__ import annotations
+
+import importlib
+import types
+from typing import TYPE_CHECKING, Any, Optional
+
+__all__ = ["mediaconch"]
+
+
+class _LazyModule:
+    """Stands in for a module until one of its attributes is used."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Optional[types.ModuleType] = None
+
+    def load(self) -> types.ModuleType:
+        """Import the module if it has not been imported yet."""
+        if self._module is None:
+            # The import system serializes concurrent imports, so there is
+            # no need for a lock here.
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        """Check if the module has been imported."""
+        return self._module is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.load(), attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+if TYPE_CHECKING:
+    # Type checkers see the extension itself, described by mediaconch.pyi,
+    # so that annotations such as ``mediaconch.MediaConch`` resolve.
+    from uiucprescon.pymediaconch import mediaconch
+else:
+    #: The ``uiucprescon.pymediaconch.mediaconch`` extension, loaded the
+    #: first time one of its attributes, such as ``MediaConch``, is used.
+    mediaconch = _LazyModule("uiucprescon.pymediaconch.mediaconch")
@@ -0,0 +1,173 @@
+"""asyncio interface to MediaConch."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import os
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from uiucprescon.pymediaconch import batch
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import Policy, PolicySource, add_policy
+
+__all__ = ["AsyncMediaConch"]
+
+T = TypeVar("T")
+
+
+class AsyncMediaConch:
+    """Awaitable wrapper around :class:`MediaConch`.
+
+    The blocking library calls run on a thread pool with at most
+    ``max_concurrency`` of them in flight at a time.
+
+    :meth:`add_file`, :meth:`get_report`, :meth:`add_policy` and
+    :meth:`set_format` all act on a single underlying instance, so calls to
+    them are serialized. :meth:`validate` and :meth:`as_completed` use
+    separate worker instances configured with the same format and policies,
+    so up to ``max_concurrency`` files are validated at once. Worker
+    instances created before the last :meth:`add_policy` or
+    :meth:`set_format` call are discarded rather than reused.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._owns_executor = executor is None
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._instance = mediaconch.MediaConch()
+        self._policies: List[PolicySource] = []
+        self._format: Optional[mediaconch.MediaConch_format_t] = None
+        # Bumped whenever the configuration changes. Each worker instance is
+        # kept with the generation it was configured for.
+        self._generation = 0
+        self._idle_workers: List[Tuple[int, mediaconch.MediaConch]] = []
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args)
+            )
+
+    async def _run_on_instance(self, func: Callable[..., T], *args) -> T:
+        async with self._lock:
+            return await self._run(func, *args)
+
+    async def add_file(self, filename: batch.StrPath) -> int:
+        """Add a file and return its file id."""
+        return await self._run_on_instance(
+            self._instance.add_file, os.fspath(filename)
+        )
+
+    async def get_report(self, file_id: int) -> str:
+        """Get the report for a file id returned by :meth:`add_file`."""
+        return await self._run_on_instance(self._instance.get_report, file_id)
+
+    async def add_policy(self, policy: PolicySource) -> int:
+        """Add a policy file or :class:`Policy`.
+
+        A policy that fails to load, returning a negative result, is not
+        applied to the worker instances.
+        """
+        if not isinstance(policy, Policy):
+            policy = os.fspath(policy)
+        result = await self._run_on_instance(
+            add_policy, self._instance, policy
+        )
+        if result >= 0:
+            self._policies.append(policy)
+            self._new_generation()
+        return result
+
+    async def set_format(self, format: mediaconch.MediaConch_format_t) -> int:
+        """Set the output format."""
+        result = await self._run_on_instance(self._instance.set_format, format)
+        self._format = format
+        self._new_generation()
+        return result
+
+    def _new_generation(self) -> None:
+        self._generation += 1
+        self._idle_workers.clear()
+
+    async def get_last_error(self) -> str:
+        """Get the last error message."""
+        return await self._run_on_instance(self._instance.get_last_error)
+
+    async def validate(self, path: batch.StrPath) -> batch.ValidationResult:
+        """Validate a single file on a worker instance."""
+        if self._idle_workers:
+            generation, instance = self._idle_workers.pop()
+        else:
+            generation = self._generation
+            instance = await self._run(
+                batch.create_instance, tuple(self._policies), self._format
+            )
+        result = await self._run(batch.validate_file, instance, path)
+        # Only reached if the call was not cancelled. A cancelled call may
+        # still be running on the executor, so its instance is not reused.
+        # Neither is one configured before the configuration last changed.
+        if (
+            generation == self._generation
+            and len(self._idle_workers) < self.max_concurrency
+        ):
+            self._idle_workers.append((generation, instance))
+        return result
+
+    async def as_completed(
+        self, paths: Iterable[batch.StrPath]
+    ) -> AsyncIterator[batch.ValidationResult]:
+        """Validate files, yielding each result as soon as it is ready.
+
+        ``paths`` is consumed lazily, keeping at most ``max_concurrency``
+        files in flight.
+        """
+        remaining = iter(paths)
+        pending: set = set()
+        try:
+            while True:
+                for path in remaining:
+                    pending.add(asyncio.ensure_future(self.validate(path)))
+                    if len(pending) >= self.max_concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self) -> None:
+        """Shut down the thread pool if it was created by this object."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> AsyncMediaConch:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,493 @@
+"""Compressed, deduplicated archive of MediaConch reports."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+    cast,
+)
+from xml.sax.saxutils import escape
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore[assignment]
+
+__all__ = ["ArchiveEntry", "ReportArchive"]
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+_READ_SIZE = 64 * 1024
+
+# Reports name the media file they are about, so they are stored with its
+# path replaced by a token and the path is put back when they are read.
+# A raw NUL byte cannot occur in XML or, unescaped, in JSON, so the tokens
+# cannot be confused with report content. Any NUL in a report is stored
+# as a token of its own to keep that true.
+_NUL_TOKEN = b"\x00n\x00"
+_PATH_TOKENS = (b"\x00p\x00", b"\x00x\x00", b"\x00j\x00")
+_TOKEN = re.compile(rb"\x00[npxj]\x00")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    codec TEXT NOT NULL,
+    dictionary INTEGER REFERENCES dictionaries (id),
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    blob INTEGER NOT NULL REFERENCES blobs (id),
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class ArchiveEntry:
+    """A report stored in a :class:`ReportArchive`."""
+
+    id: int
+    path: str
+    digest: str
+    size: int
+    stored_size: int
+    added: float
+
+
+def _path_forms(path: str) -> Dict[bytes, bytes]:
+    """Map each token to the bytes it stands for in reports about path."""
+    forms = {_NUL_TOKEN: b"\x00"}
+    if not path:
+        return forms
+    for token, text in zip(
+        _PATH_TOKENS,
+        (
+            path,
+            escape(path, {'"': "&quot;"}),
+            json.dumps(path, ensure_ascii=False)[1:-1],
+        ),
+    ):
+        data = text.encode("utf-8", "surrogateescape")
+        if data not in forms.values():
+            forms[token] = data
+    return forms
+
+
+def _remove_path(data: bytes, forms: Dict[bytes, bytes]) -> bytes:
+    tokens = {form: token for token, form in forms.items()}
+    pattern = re.compile(
+        b"|".join(
+            re.escape(form) for form in sorted(tokens, key=len, reverse=True)
+        )
+    )
+    return pattern.sub(lambda match: tokens[match.group()], data)
+
+
+class _PathReader(io.RawIOBase):
+    """Puts the path back into a stored report as it is read."""
+
+    def __init__(self, source: BinaryIO, forms: Dict[bytes, bytes]) -> None:
+        self._source = source
+        self._forms = forms
+        self._pending = b""
+        self._partial = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            data = self._source.read(_READ_SIZE)
+            if not data:
+                if self._partial:
+                    raise ValueError("Stored report ends inside a token")
+                return 0
+            data = self._partial + data
+            # Every token holds two NUL bytes, so an odd count means the
+            # last token is cut off and must wait for the next read.
+            if data.count(b"\x00") % 2:
+                cut = data.rindex(b"\x00")
+                data, self._partial = data[:cut], data[cut:]
+            else:
+                self._partial = b""
+            self._pending = _TOKEN.sub(
+                lambda match: self._forms[match.group()], data
+            )
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        self._source.close()
+        super().close()
+
+
+class _ZlibReader(io.RawIOBase):
+    """Decompresses a zlib stream as it is read."""
+
+    def __init__(self, source: BinaryIO) -> None:
+        self._source = source
+        self._decompressor = zlib.decompressobj()
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            if self._decompressor.eof:
+                return 0
+            compressed = self._decompressor.unconsumed_tail
+            if not compressed:
+                compressed = self._source.read(_READ_SIZE)
+                if not compressed:
+                    self._pending = self._decompressor.flush()
+                    if not self._pending:
+                        return 0
+                    break
+            self._pending = self._decompressor.decompress(
+                compressed, len(buffer)
+            )
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        self._source.close()
+        super().close()
+
+
+class ReportArchive:
+    """SQLite file of compressed reports, for keeping every report cheaply.
+
+    Each distinct report is compressed and stored once, addressed by the
+    SHA-256 digest of its content; adding a report that is already stored
+    only adds an entry pointing at it. The path of the media file, which
+    every report contains, is left out of the stored content and put back
+    from the entry when the report is read, so reports of files with the
+    same properties are stored once. Entries can be looked up by the id
+    returned from :meth:`add` or by the path of the media file, and are read
+    back either whole or as a stream that decompresses as it is read, so
+    only the report asked for is ever decompressed.
+
+    Reports are compressed with zlib. With the optional ``zstandard``
+    package installed, ``codec="zstd"`` uses Zstandard instead, and
+    :meth:`train_dictionary` builds a dictionary from the reports already
+    stored that makes new reports with the same structure compress much
+    smaller. Reports stored with an older dictionary or codec stay
+    readable.
+
+    The archive can be shared by threads and by processes on the same host.
+
+    Args:
+        path: archive file, created if it does not exist.
+        codec: ``"zlib"`` or ``"zstd"``.
+        level: compression level. The codec's default if not set.
+    """
+
+    def __init__(
+        self,
+        path: StrPath,
+        codec: str = ZLIB,
+        level: Optional[int] = None,
+    ) -> None:
+        if codec not in (ZLIB, ZSTD):
+            raise ValueError(
+                f"Unknown codec {codec!r}, expected 'zlib' or 'zstd'"
+            )
+        if codec == ZSTD and zstandard is None:
+            raise ImportError(
+                "The zstd codec needs the zstandard package, install with "
+                "pip install uiucprescon.pymediaconch[zstd]"
+            )
+        self.path = os.fspath(path)
+        self.codec = codec
+        self.level = level
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self._dictionaries: dict = {}
+        row = self._connection.execute(
+            "SELECT max(id) FROM dictionaries"
+        ).fetchone()
+        self._dictionary_id: Optional[int] = row[0]
+
+    def _zstd_dictionary(self, dictionary_id: int):
+        if dictionary_id not in self._dictionaries:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT data FROM dictionaries WHERE id = ?",
+                    (dictionary_id,),
+                ).fetchone()
+            self._dictionaries[dictionary_id] = (
+                zstandard.ZstdCompressionDict(row[0])
+            )
+        return self._dictionaries[dictionary_id]
+
+    def _compress(self, data: bytes):
+        if self.codec == ZLIB:
+            level = -1 if self.level is None else self.level
+            return zlib.compress(data, level), None
+        dictionary_id = self._dictionary_id
+        options = {}
+        if dictionary_id is not None:
+            options["dict_data"] = self._zstd_dictionary(dictionary_id)
+        if self.level is not None:
+            options["level"] = self.level
+        compressor = zstandard.ZstdCompressor(**options)
+        return compressor.compress(data), dictionary_id
+
+    def add(self, path: StrPath, report: Union[str, bytes]) -> int:
+        """Store the report for a media file.
+
+        Args:
+            path: media file the report is about.
+            report: report as returned by ``get_report`` or
+                ``get_report_bytes``.
+
+        Returns:
+            The id of the new entry.
+        """
+        data = report.encode("utf-8") if isinstance(report, str) else report
+        data = _remove_path(data, _path_forms(os.fspath(path)))
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is not None:
+                return self._insert_entry(path, digest)
+        # Compressing is the slow part, so other threads are not held up.
+        compressed, dictionary_id = self._compress(data)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Ignored if another thread or process stored it meanwhile.
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO blobs "
+                    "(digest, codec, dictionary, size, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, self.codec, dictionary_id, len(data), compressed),
+                )
+                entry_id = self._insert_entry(path, digest)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return entry_id
+
+    def _insert_entry(self, path: StrPath, digest: str) -> int:
+        cursor = self._connection.execute(
+            "INSERT INTO entries (path, blob, added) "
+            "SELECT ?, id, ? FROM blobs WHERE digest = ?",
+            (os.fspath(path), time.time(), digest),
+        )
+        entry_id = cursor.lastrowid
+        assert entry_id is not None
+        return entry_id
+
+    def add_many(self, results: Iterable) -> int:
+        """Store the report of every successful ValidationResult.
+
+        Returns:
+            Number of reports stored.
+        """
+        stored = 0
+        for result in results:
+            if result.report is not None:
+                self.add(result.path, result.report)
+                stored += 1
+        return stored
+
+    def _blob_row(self, entry_id: int):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT blobs.id, blobs.codec, blobs.dictionary, entries.path "
+                "FROM entries JOIN blobs ON entries.blob = blobs.id "
+                "WHERE entries.id = ?",
+                (entry_id,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No archive entry with id {entry_id}")
+        return row
+
+    def _compressed_stream(self, blob_id: int) -> BinaryIO:
+        if hasattr(self._connection, "blobopen"):
+            # Python 3.11 and later read the blob incrementally. A Blob has
+            # the read method the decompressors use.
+            return cast(
+                BinaryIO,
+                self._connection.blobopen(
+                    "blobs", "data", blob_id, readonly=True
+                ),
+            )
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM blobs WHERE id = ?", (blob_id,)
+            ).fetchone()
+        return io.BytesIO(row[0])
+
+    def open(self, entry_id: int) -> BinaryIO:
+        """Open a stored report for reading, decompressing as it is read.
+
+        The file object can be passed straight to
+        :func:`~uiucprescon.pymediaconch.results.iter_outcomes`.
+        """
+        blob_id, codec, dictionary_id, path = self._blob_row(entry_id)
+        return io.BufferedReader(
+            _PathReader(
+                self._decompressed(blob_id, codec, dictionary_id),
+                _path_forms(path),
+            ),
+            _READ_SIZE,
+        )
+
+    def _decompressed(
+        self, blob_id: int, codec: str, dictionary_id: Optional[int]
+    ) -> BinaryIO:
+        source = self._compressed_stream(blob_id)
+        if codec == ZLIB:
+            return io.BufferedReader(_ZlibReader(source), _READ_SIZE)
+        if zstandard is None:
+            raise ImportError(
+                "This report was stored with zstd, which needs the "
+                "zstandard package"
+            )
+        options = {}
+        if dictionary_id is not None:
+            options["dict_data"] = self._zstd_dictionary(dictionary_id)
+        return zstandard.ZstdDecompressor(**options).stream_reader(
+            source, closefd=True
+        )
+
+    def get(self, entry_id: int) -> bytes:
+        """Read a whole stored report."""
+        with self.open(entry_id) as stream:
+            return stream.read()
+
+    def latest(self, path: StrPath) -> Optional[int]:
+        """Get the id of the newest entry for a media file, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT max(id) FROM entries WHERE path = ?",
+                (os.fspath(path),),
+            ).fetchone()
+        return row[0]
+
+    def entries(
+        self, path: Optional[StrPath] = None
+    ) -> Iterator[ArchiveEntry]:
+        """List the entries, or only those for one media file, oldest first."""
+        query = (
+            "SELECT entries.id, entries.path, blobs.digest, blobs.size, "
+            "length(blobs.data), entries.added "
+            "FROM entries JOIN blobs ON entries.blob = blobs.id"
+        )
+        parameters: tuple = ()
+        if path is not None:
+            query += " WHERE entries.path = ?"
+            parameters = (os.fspath(path),)
+        with self._lock:
+            rows = self._connection.execute(
+                query + " ORDER BY entries.id", parameters
+            ).fetchall()
+        for row in rows:
+            yield ArchiveEntry(*row)
+
+    def train_dictionary(self, size: int = 112640, samples: int = 1000) -> int:
+        """Train a zstd dictionary on the most recently stored reports.
+
+        Reports added afterwards are compressed with the new dictionary.
+
+        Args:
+            size: dictionary size in bytes.
+            samples: number of stored reports to learn from.
+
+        Returns:
+            The id of the dictionary.
+        """
+        if self.codec != ZSTD:
+            raise ValueError("Dictionaries are only used by the zstd codec")
+        with self._lock:
+            blobs = self._connection.execute(
+                "SELECT id, codec, dictionary FROM blobs "
+                "ORDER BY id DESC LIMIT ?",
+                (samples,),
+            ).fetchall()
+        # Trained on the reports as stored, without their paths, since
+        # that is what the dictionary will compress.
+        reports: List[Union[bytes, bytearray, memoryview]] = []
+        for blob_id, codec, dictionary_id in blobs:
+            with self._decompressed(blob_id, codec, dictionary_id) as stream:
+                reports.append(stream.read())
+        dictionary = zstandard.train_dictionary(size, reports)
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO dictionaries (data) VALUES (?)",
+                (dictionary.as_bytes(),),
+            )
+            dictionary_id = cursor.lastrowid
+            assert dictionary_id is not None
+            self._dictionary_id = dictionary_id
+            self._dictionaries[dictionary_id] = dictionary
+        return dictionary_id
+
+    def stats(self) -> dict:
+        """Count entries and distinct reports and their sizes in bytes."""
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT count(*) FROM entries"
+            ).fetchone()[0]
+            blobs, size, stored = self._connection.execute(
+                "SELECT count(*), coalesce(sum(size), 0), "
+                "coalesce(sum(length(data)), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "reports": blobs,
+            "bytes": size,
+            "stored_bytes": stored,
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
+
+    def __enter__(self) -> ReportArchive:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,674 @@
+"""Validate batches of files concurrently."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
+import json
+import os
+import re
+import threading
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Union,
+)
+from xml.sax.saxutils import escape
+
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.buffers import stream_file
+from uiucprescon.pymediaconch.cache import ReportCache
+from uiucprescon.pymediaconch.policies import (
+    Policy,
+    PolicySource,
+    add_policies,
+)
+from uiucprescon.pymediaconch.session import MediaConchSession
+
+__all__ = [
+    "CancellationToken",
+    "ProcessPoolValidator",
+    "ThreadPoolValidator",
+    "ValidationResult",
+    "create_instance",
+    "initialize_process_worker",
+    "iter_validate",
+    "validate_file",
+    "validate_in_process_worker",
+    "validate_many",
+]
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+#: Decides whether a file gets validated, such as a
+#: :class:`~uiucprescon.pymediaconch.sniff.MediaFilter`.
+MediaFilter = Callable[[str], bool]
+
+
+class _Instance(Protocol):
+    """Anything :func:`validate_file` can add files to.
+
+    A MediaConch instance, a session or an instrumented instance.
+    """
+
+    def add_file(self, filename: str) -> int: ...
+
+    def get_report(self, file_id: int) -> str: ...
+
+    def get_last_error(self) -> str: ...
+
+
+# Worker instances are replaced after this many files so that long batches
+# run in flat memory. See MediaConchSession.
+WORKER_MAX_FILES = 1000
+
+
+@dataclasses.dataclass(frozen=True)
+class ValidationResult:
+    """Outcome of validating a single file.
+
+    Exactly one of ``report`` and ``error`` is set. ``partial`` is True when
+    only the start of the file was analyzed because it was larger than the
+    ``max_bytes`` budget. ``timed_out`` is True when the file was abandoned
+    because it took longer than the time allowed. ``skipped`` is True when
+    the file was not validated because the media filter turned it down.
+    """
+
+    path: str
+    report: Optional[str] = None
+    error: Optional[str] = None
+    partial: bool = False
+    timed_out: bool = False
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """True if MediaConch produced a report for the file."""
+        return self.error is None
+
+
+class CancellationToken:
+    """Flag for asking a running batch to stop.
+
+    Batches check the token before starting each file. Files already being
+    analyzed are finished, except by
+    :class:`~uiucprescon.pymediaconch.supervisor.SupervisedValidator`,
+    which stops them.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the batch to stop. Safe to call from any thread."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """True once :meth:`cancel` has been called."""
+        return self._event.is_set()
+
+
+def create_instance(
+    policies: Sequence[PolicySource] = (),
+    format: Optional[mediaconch.MediaConch_format_t] = None,
+) -> mediaconch.MediaConch:
+    """Create a MediaConch instance with the format and policies applied.
+
+    Raises:
+        ValueError: one of the policies could not be loaded.
+    """
+    instance = mediaconch.MediaConch()
+    if format is not None:
+        instance.set_format(format)
+    add_policies(instance, policies)
+    return instance
+
+
+def validate_file(
+    instance: _Instance,
+    path: StrPath,
+    max_bytes: Optional[int] = None,
+    media_filter: Optional[MediaFilter] = None,
+) -> ValidationResult:
+    """Add a file to an existing instance and return its report.
+
+    Args:
+        instance: MediaConch instance to use.
+        path: file to validate.
+        max_bytes: if set and the file is larger, only analyze its first
+            ``max_bytes`` bytes and mark the result as partial. This is
+            enough for container and stream level checks on formats that
+            keep their headers at the start of the file, such as Matroska,
+            but not for MP4 or MOV files with the moov atom at the end.
+            The prefix is analyzed from a copy, whose name is replaced by
+            ``path`` in the report.
+        media_filter: if set and it returns False for ``path``, skip the file
+            without adding it to the instance.
+    """
+    path = os.fspath(path)
+    if media_filter is not None and not media_filter(path):
+        return ValidationResult(
+            path, error="Not a recognized media file", skipped=True
+        )
+    if max_bytes is None or not _larger_than(path, max_bytes):
+        return _report(instance, path, path)
+    try:
+        with open(path, "rb") as file_handle, stream_file(
+            file_handle, size=max_bytes
+        ) as prefix:
+            result = _report(instance, path, prefix)
+    except OSError as error:
+        # Directories, files without read permission and read errors are
+        # reported like any other file that cannot be validated.
+        return ValidationResult(path, error=str(error))
+    return dataclasses.replace(
+        result,
+        report=(
+            None
+            if result.report is None
+            else _rename(result.report, prefix, path)
+        ),
+        partial=True,
+    )
+
+
+def _rename(report: str, analyzed_path: str, path: str) -> str:
+    """Replace the name of the analyzed copy of a file with its path."""
+    start = re.match(r"[\s\ufeff]*(.?)", report)
+    markup = start.group(1) if start else ""
+    if markup == "<":
+        name = escape(path, {'"': "&quot;"})
+    elif markup in ("{", "["):
+        name = json.dumps(path, ensure_ascii=False)[1:-1]
+    else:
+        name = path
+    # /proc/self/fd/1 must not match the start of /proc/self/fd/12.
+    pattern = re.compile(re.escape(analyzed_path) + r"(?!\d)")
+    return pattern.sub(lambda match: name, report)
+
+
+def _larger_than(path: str, size: int) -> bool:
+    try:
+        return os.path.getsize(path) > size
+    except OSError:
+        # Let MediaConch report on files that cannot be read.
+        return False
+
+
+def _report(
+    instance: _Instance, path: str, analyzed_path: str
+) -> ValidationResult:
+    file_id = instance.add_file(analyzed_path)
+    if file_id < 0:
+        return ValidationResult(
+            path, error=instance.get_last_error() or f"Unable to add {path}"
+        )
+    return ValidationResult(path, report=instance.get_report(file_id))
+
+
+def _validate_cached(
+    instance: _Instance,
+    path: str,
+    cache: ReportCache,
+    policies: Sequence[PolicySource],
+    format_name: Optional[str],
+    max_bytes: Optional[int],
+    media_filter: Optional[MediaFilter],
+) -> ValidationResult:
+    # Runs in the workers, so that with hash_content the files are hashed
+    # in parallel, each one as the worker gets to it.
+    try:
+        key: Optional[str] = cache.key(path, policies, format_name)
+    except OSError:
+        # Unreadable files are left for MediaConch to report on.
+        key = None
+    if key is not None:
+        report = cache.get(key)
+        if report is not None:
+            return ValidationResult(path, report)
+    result = validate_file(instance, path, max_bytes, media_filter)
+    if key is not None and result.report is not None and not result.partial:
+        cache.put(key, result.report)
+    return result
+
+
+def _normalize_policies(
+    policies: Iterable[PolicySource],
+) -> Tuple[PolicySource, ...]:
+    return tuple(
+        policy if isinstance(policy, Policy) else os.fspath(policy)
+        for policy in policies
+    )
+
+
+# Session owned by the current process pool worker. Set once per worker
+# process by initialize_process_worker and reused for every file it handles.
+_worker_instance: Optional[MediaConchSession] = None
+_worker_max_bytes: Optional[int] = None
+_worker_media_filter: Optional[MediaFilter] = None
+_worker_cache: Optional[ReportCache] = None
+_worker_policies: Sequence[PolicySource] = ()
+_worker_format_name: Optional[str] = None
+
+
+def initialize_process_worker(
+    policies: Sequence[PolicySource],
+    format_name: Optional[str],
+    max_bytes: Optional[int],
+    media_filter: Optional[MediaFilter] = None,
+    cache: Optional[ReportCache] = None,
+) -> MediaConchSession:
+    """Set up the current process to validate files.
+
+    Call once in each worker process, for example as the initializer of a
+    process pool, before :func:`validate_in_process_worker`. The process
+    keeps one session configured with ``policies`` for every file it
+    validates.
+
+    Args:
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format_name: name of a ``MediaConch_format_t`` member, which unlike
+            the member itself pickles without loading the extension. The
+            library default is used if None.
+        max_bytes: passed on to :func:`validate_file`.
+        media_filter: passed on to :func:`validate_file`.
+        cache: look up and store reports in this cache.
+
+    Returns:
+        The session files are added to. It is only set up on the first
+        file, unless :meth:`~MediaConchSession.warm` is called first.
+    """
+    global _worker_instance, _worker_max_bytes, _worker_media_filter
+    global _worker_cache, _worker_policies, _worker_format_name
+    _worker_max_bytes = max_bytes
+    _worker_media_filter = media_filter
+    _worker_cache = cache
+    _worker_policies = _normalize_policies(policies)
+    _worker_format_name = format_name
+    report_format = (
+        None
+        if format_name is None
+        else getattr(mediaconch.MediaConch_format_t, format_name)
+    )
+    _worker_instance = MediaConchSession(
+        _worker_policies, report_format, max_files=WORKER_MAX_FILES
+    )
+    return _worker_instance
+
+
+def validate_in_process_worker(path: str) -> ValidationResult:
+    """Validate a file in the current worker process.
+
+    The process must have been set up by :func:`initialize_process_worker`.
+    """
+    assert _worker_instance is not None, "process worker was not initialized"
+    if _worker_cache is not None:
+        return _validate_cached(
+            _worker_instance,
+            path,
+            _worker_cache,
+            _worker_policies,
+            _worker_format_name,
+            _worker_max_bytes,
+            _worker_media_filter,
+        )
+    return validate_file(
+        _worker_instance, path, _worker_max_bytes, _worker_media_filter
+    )
+
+
+def _validate_chunk_in_process_worker(
+    paths: List[str],
+) -> List[ValidationResult]:
+    return [validate_in_process_worker(path) for path in paths]
+
+
+class ThreadPoolValidator:
+    """Thread pool whose threads each keep a configured MediaConch session.
+
+    The thread counterpart of :class:`ProcessPoolValidator`. Every worker
+    thread creates a :class:`MediaConchSession` and loads ``policies``
+    once, then reuses it for all the files it is given for as long as the
+    pool is open. ``max_bytes`` and ``media_filter`` are passed on to
+    :func:`validate_file`. With a ``cache``, reports are looked up in it
+    before a file is analyzed and stored in it afterwards.
+
+    Use as a context manager, or call :meth:`close` when done.
+    """
+
+    def __init__(
+        self,
+        policies: Sequence[PolicySource] = (),
+        format: Optional[mediaconch.MediaConch_format_t] = None,
+        max_workers: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        media_filter: Optional[MediaFilter] = None,
+        cache: Optional[ReportCache] = None,
+    ) -> None:
+        self._policies = _normalize_policies(policies)
+        self._format = format
+        self._format_name = None if format is None else format.name
+        self._max_bytes = max_bytes
+        self._media_filter = media_filter
+        self._cache = cache
+        self._local = threading.local()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, initializer=self._initialize
+        )
+
+    def _initialize(self) -> None:
+        self._local.instance = MediaConchSession(
+            self._policies, self._format, max_files=WORKER_MAX_FILES
+        )
+
+    def _validate_one(self, path: StrPath) -> ValidationResult:
+        if self._cache is not None:
+            return _validate_cached(
+                self._local.instance,
+                os.fspath(path),
+                self._cache,
+                self._policies,
+                self._format_name,
+                self._max_bytes,
+                self._media_filter,
+            )
+        return validate_file(
+            self._local.instance, path, self._max_bytes, self._media_filter
+        )
+
+    def validate(self, paths: Iterable[StrPath]) -> Iterator[ValidationResult]:
+        """Validate files, yielding results in the same order as ``paths``."""
+        return self._executor.map(self._validate_one, paths)
+
+    def close(self) -> None:
+        """Shut down the worker threads."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> ThreadPoolValidator:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ProcessPoolValidator:
+    """Process pool whose workers keep a configured MediaConch instance.
+
+    Every worker process creates its instance and loads ``policies`` once,
+    then reuses it for all the files sent to it for as long as the pool is
+    open, only replacing it every :data:`WORKER_MAX_FILES` files to keep
+    memory flat. Paths are sent to the workers, and results are sent back,
+    ``chunksize`` files at a time. ``max_bytes`` and ``media_filter`` are
+    passed on to :func:`validate_file`; the filter must be picklable. With
+    a ``cache``, each worker process opens its own connection to the cache
+    file, and looks up and stores the reports of the files it is sent.
+
+    Use as a context manager, or call :meth:`close` when done.
+    """
+
+    def __init__(
+        self,
+        policies: Sequence[PolicySource] = (),
+        format: Optional[mediaconch.MediaConch_format_t] = None,
+        max_workers: Optional[int] = None,
+        chunksize: int = 16,
+        max_bytes: Optional[int] = None,
+        media_filter: Optional[MediaFilter] = None,
+        cache: Optional[ReportCache] = None,
+    ) -> None:
+        self.chunksize = chunksize
+        # Enum members are sent to the workers by name so that pickling does
+        # not depend on how the extension module exposes them.
+        format_name = None if format is None else format.name
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=initialize_process_worker,
+            initargs=(
+                _normalize_policies(policies),
+                format_name,
+                max_bytes,
+                media_filter,
+                cache,
+            ),
+        )
+
+    def validate(self, paths: Iterable[StrPath]) -> Iterator[ValidationResult]:
+        """Validate files, yielding results in the same order as ``paths``."""
+        return self._executor.map(
+            validate_in_process_worker,
+            (os.fspath(path) for path in paths),
+            chunksize=self.chunksize,
+        )
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> ProcessPoolValidator:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _chunks(paths: Iterable[StrPath], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for path in paths:
+        chunk.append(os.fspath(path))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_validate(
+    paths: Iterable[StrPath],
+    policies: Sequence[PolicySource] = (),
+    format: Optional[mediaconch.MediaConch_format_t] = None,
+    max_workers: Optional[int] = None,
+    mode: str = "thread",
+    chunksize: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    cancel: Optional[CancellationToken] = None,
+    media_filter: Optional[MediaFilter] = None,
+    cache: Optional[ReportCache] = None,
+) -> Iterator[ValidationResult]:
+    """Validate files, yielding each result as soon as it is ready.
+
+    Unlike :func:`validate_many`, results come back in completion order
+    and ``paths`` is consumed lazily, with no more than two chunks per
+    worker in flight. This suits very long or open ended sequences of
+    paths, such as a directory walk.
+
+    Args:
+        paths: files to validate.
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format: report format. The library default is used if not set.
+        max_workers: number of workers. Defaults to the number of CPUs.
+        mode: ``"thread"`` or ``"process"``.
+        chunksize: files sent to a worker at a time. Defaults to 1 for
+            threads and 16 for processes.
+        max_bytes: only analyze the first ``max_bytes`` of larger files.
+            See :func:`validate_file`.
+        cancel: stop handing out files once this token is cancelled. The
+            results of the files already started are still yielded.
+        media_filter: only validate the files it returns True for, such as
+            a :class:`~uiucprescon.pymediaconch.sniff.MediaFilter`. Other
+            files are left out of the results. It runs in the workers, and
+            must be picklable in process mode.
+        cache: reuse reports from, and store new reports in, this cache,
+            as in :func:`validate_many`.
+    """
+    policies = _normalize_policies(policies)
+    format_name = None if format is None else format.name
+    workers = max_workers or os.cpu_count() or 1
+    executor: concurrent.futures.Executor
+    run_chunk: Callable[[List[str]], List[ValidationResult]]
+    if mode == "thread":
+        local = threading.local()
+
+        def initialize() -> None:
+            local.instance = MediaConchSession(
+                policies, format, max_files=WORKER_MAX_FILES
+            )
+
+        def validate_in_thread(path: str) -> ValidationResult:
+            if cache is not None:
+                return _validate_cached(
+                    local.instance,
+                    path,
+                    cache,
+                    policies,
+                    format_name,
+                    max_bytes,
+                    media_filter,
+                )
+            return validate_file(local.instance, path, max_bytes, media_filter)
+
+        def run_chunk_in_thread(chunk: List[str]) -> List[ValidationResult]:
+            return [validate_in_thread(path) for path in chunk]
+
+        run_chunk = run_chunk_in_thread
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, initializer=initialize
+        )
+        chunksize = chunksize or 1
+    elif mode == "process":
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=initialize_process_worker,
+            initargs=(policies, format_name, max_bytes, media_filter, cache),
+        )
+        run_chunk = _validate_chunk_in_process_worker
+        chunksize = chunksize or 16
+    else:
+        raise ValueError(
+            f"Unknown mode {mode!r}, expected 'thread' or 'process'"
+        )
+
+    try:
+        pending: set = set()
+        for chunk in _chunks(paths, chunksize):
+            if cancel is not None and cancel.cancelled:
+                break
+            pending.add(executor.submit(run_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield from _unskipped(future.result())
+        if cancel is not None and cancel.cancelled:
+            for future in pending:
+                future.cancel()
+        for future in concurrent.futures.as_completed(pending):
+            if not future.cancelled():
+                yield from _unskipped(future.result())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _unskipped(
+    results: List[ValidationResult],
+) -> Iterator[ValidationResult]:
+    return (result for result in results if not result.skipped)
+
+
+def validate_many(
+    paths: Iterable[StrPath],
+    policies: Sequence[PolicySource] = (),
+    format: Optional[mediaconch.MediaConch_format_t] = None,
+    max_workers: Optional[int] = None,
+    mode: str = "thread",
+    chunksize: int = 16,
+    cache: Optional[ReportCache] = None,
+    max_bytes: Optional[int] = None,
+    media_filter: Optional[MediaFilter] = None,
+) -> List[ValidationResult]:
+    """Validate files on a thread or process pool.
+
+    Each worker owns its own MediaConch instance, configured once with
+    ``policies`` and ``format`` and reused for every file the worker handles
+    until it is replaced after :data:`WORKER_MAX_FILES` files.
+
+    Use ``mode="process"`` to keep the global state of libxml2, libxslt and
+    MediaInfoLib separate per worker. See :class:`ProcessPoolValidator` for
+    validating a stream of files without restarting the workers.
+
+    Args:
+        paths: files to validate.
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format: report format. The library default is used if not set.
+        max_workers: number of workers. Defaults to the executor default.
+        mode: ``"thread"`` or ``"process"``.
+        chunksize: files per round trip to a worker in process mode.
+        cache: reuse reports from, and store new reports in, this cache.
+            Partial reports are never stored. Cache keys are computed, and
+            with ``hash_content`` files are hashed, by the workers. Process
+            workers count hits and misses on their own connections, not on
+            ``cache``.
+        max_bytes: only analyze the first ``max_bytes`` of larger files,
+            for a fast first pass. See :func:`validate_file`.
+        media_filter: only validate the files it returns True for. The
+            others get a result with ``skipped`` set. Cached reports are
+            used without consulting it.
+
+    Returns:
+        One result per path, in the same order as ``paths``.
+    """
+    policies = _normalize_policies(policies)
+    if mode not in ("thread", "process"):
+        raise ValueError(
+            f"Unknown mode {mode!r}, expected 'thread' or 'process'"
+        )
+    return _validate(
+        paths,
+        policies,
+        format,
+        max_workers,
+        mode,
+        chunksize,
+        max_bytes,
+        media_filter,
+        cache,
+    )
+
+
+def _validate(
+    paths: Iterable[StrPath],
+    policies: Sequence[PolicySource],
+    format: Optional[mediaconch.MediaConch_format_t],
+    max_workers: Optional[int],
+    mode: str,
+    chunksize: int,
+    max_bytes: Optional[int],
+    media_filter: Optional[MediaFilter],
+    cache: Optional[ReportCache],
+) -> List[ValidationResult]:
+    if mode == "process":
+        with ProcessPoolValidator(
+            policies,
+            format,
+            max_workers,
+            chunksize,
+            max_bytes,
+            media_filter,
+            cache,
+        ) as validator:
+            return list(validator.validate(paths))
+    with ThreadPoolValidator(
+        policies, format, max_workers, max_bytes, media_filter, cache
+    ) as validator:
+        return list(validator.validate(paths))
@@ -0,0 +1,125 @@
+"""Validate media held in memory or read from a stream.
+
+libmediaconch can only open files by path, so the data is always copied
+once, into a file that MediaInfoLib can open. On Linux that file is held in
+memory, up to ``max_memory`` bytes; larger data goes to a temporary file on
+disk instead, so streaming a large master does not need as much RAM as the
+master is big. Elsewhere a temporary file is always used.
+"""
+
+from __future__ import annotations
+
+import contextlib
+from typing import BinaryIO, Iterator, Optional
+
+from uiucprescon.pymediaconch._memfile import BufferLike, MemoryFile
+
+__all__ = ["add_buffer", "add_stream", "buffer_file", "stream_file"]
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+#: Most bytes held in memory before data is written to disk instead.
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def buffer_file(
+    data: BufferLike, max_memory: Optional[int] = DEFAULT_MAX_MEMORY
+) -> Iterator[str]:
+    """Expose a buffer as a path that MediaInfoLib can open.
+
+    Accepts any object supporting the buffer protocol, such as bytes,
+    bytearray, memoryview or mmap. The data is copied, in memory if it is
+    no larger than ``max_memory`` bytes, or to a temporary file on disk.
+    The path is valid until the block exits.
+    """
+    with MemoryFile(
+        name="pymediaconch-buffer", max_memory=max_memory
+    ) as memory_file:
+        memory_file.write(data)
+        yield memory_file.path
+
+
+def _read_chunks(
+    stream: BinaryIO, chunk_size: int, size: Optional[int]
+) -> Iterator[BufferLike]:
+    # Reuse one buffer for every chunk instead of allocating bytes objects.
+    view = memoryview(bytearray(chunk_size))
+    remaining = size
+    while remaining is None or remaining > 0:
+        wanted = (
+            chunk_size if remaining is None else min(chunk_size, remaining)
+        )
+        if hasattr(stream, "readinto"):
+            read = stream.readinto(view[:wanted])
+            chunk: BufferLike = view[:read]
+        else:
+            chunk = stream.read(wanted)
+            read = len(chunk)
+        if not read:
+            return
+        if remaining is not None:
+            remaining -= read
+        yield chunk
+
+
+@contextlib.contextmanager
+def stream_file(
+    stream: BinaryIO,
+    size: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+) -> Iterator[str]:
+    """Expose the content of a binary stream as a path.
+
+    The stream is read in chunks of ``chunk_size`` bytes, up to ``size``
+    bytes or to the end of the stream if ``size`` is None, and copied into
+    a file. The first ``max_memory`` bytes are held in memory; if there
+    are more, everything is moved to a temporary file on disk. A
+    ``max_memory`` of None keeps any amount in memory, which takes as much
+    RAM or swap as the stream is long. The path is valid until the block
+    exits.
+    """
+    with MemoryFile(
+        name="pymediaconch-stream", max_memory=max_memory
+    ) as memory_file:
+        for chunk in _read_chunks(stream, chunk_size, size):
+            memory_file.write(chunk)
+        yield memory_file.path
+
+
+@contextlib.contextmanager
+def add_buffer(
+    instance,
+    data: BufferLike,
+    max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+) -> Iterator[int]:
+    """Add media held in a buffer to a MediaConch instance.
+
+    Yields the file id. The data stays available to the instance until the
+    block exits, so get the report inside it::
+
+        with add_buffer(mc, data) as file_id:
+            report = mc.get_report(file_id)
+    """
+    with buffer_file(data, max_memory) as path:
+        yield instance.add_file(path)
+
+
+@contextlib.contextmanager
+def add_stream(
+    instance,
+    stream: BinaryIO,
+    size: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+) -> Iterator[int]:
+    """Add media read from a binary stream to a MediaConch instance.
+
+    Works with sockets wrapped with ``makefile("rb")``, pipes and regular
+    files. Yields the file id, as :func:`add_buffer` does. The whole stream
+    is copied before it is analyzed, to disk once it is larger than
+    ``max_memory``; see :func:`stream_file`.
+    """
+    with stream_file(stream, size, chunk_size, max_memory) as path:
+        yield instance.add_file(path)
@@ -0,0 +1,210 @@
+"""On-disk cache of MediaConch reports."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Sequence, Union
+
+from uiucprescon.pymediaconch.policies import Policy, PolicySource
+
+__all__ = ["ReportCache", "file_digest"]
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+_READ_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_last_used ON reports (last_used);
+CREATE TABLE IF NOT EXISTS total (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO total SELECT 0, COALESCE(SUM(size), 0) FROM reports;
+CREATE TRIGGER IF NOT EXISTS reports_insert AFTER INSERT ON reports
+BEGIN
+    UPDATE total SET size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS reports_delete AFTER DELETE ON reports
+BEGIN
+    UPDATE total SET size = size - OLD.size;
+END;
+"""
+
+
+def file_digest(path: StrPath) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_handle:
+        for block in iter(lambda: file_handle.read(_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ReportCache:
+    """SQLite backed report cache with least recently used eviction.
+
+    Entries are keyed on the file identity, the content of the policies and
+    the report format, so a report is only reused when none of them changed.
+    The file identity is its absolute path and size plus either its
+    modification time or, with ``hash_content=True``, a digest of its
+    content. Hashing reads every byte of the file but survives touches that
+    preserve content. Copies and moved files are cache misses either way,
+    since the path is part of the identity.
+
+    Once the stored reports exceed ``max_bytes`` the least recently used
+    entries are evicted. The total size is kept up to date by the database,
+    so a full cache evicts in time proportional to the entries removed
+    rather than to its size.
+
+    The cache can be shared by threads and by processes on the same host.
+    A pickled cache, such as one sent to a worker process, opens its own
+    connection to the same file when it is unpickled.
+    """
+
+    def __init__(
+        self,
+        path: StrPath,
+        max_bytes: int = 1024**3,
+        hash_content: bool = False,
+    ) -> None:
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._policy_digests: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def __reduce__(self):
+        return (
+            ReportCache,
+            (self.path, self.max_bytes, self.hash_content),
+        )
+
+    def key(
+        self,
+        path: StrPath,
+        policies: Sequence[PolicySource] = (),
+        format_name: Optional[str] = None,
+    ) -> str:
+        """Build the cache key for validating ``path``.
+
+        Args:
+            path: media file.
+            policies: policy files or :class:`Policy` objects the report is
+                generated with.
+            format_name: name of the MediaConch_format_t used, or None for
+                the library default.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        identity = [path, str(stat.st_size)]
+        if self.hash_content:
+            identity.append(file_digest(path))
+        else:
+            identity.append(str(stat.st_mtime_ns))
+        identity.extend(self._policy_digest(policy) for policy in policies)
+        identity.append(format_name or "")
+        return hashlib.sha256("\0".join(identity).encode()).hexdigest()
+
+    def _policy_digest(self, policy: PolicySource) -> str:
+        if isinstance(policy, Policy):
+            return policy.digest
+        stat = os.stat(policy)
+        signature = (os.path.abspath(policy), stat.st_size, stat.st_mtime_ns)
+        if signature not in self._policy_digests:
+            self._policy_digests[signature] = file_digest(policy)
+        return self._policy_digests[signature]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached report for ``key``, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT report FROM reports WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE reports SET last_used = ? WHERE key = ?",
+                (time.time_ns(), key),
+            )
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, report: str) -> None:
+        """Store a report, evicting old entries if the cache is full."""
+        size = len(report.encode())
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            # Not INSERT OR REPLACE, whose delete does not fire the trigger
+            # that keeps the total.
+            self._connection.execute(
+                "DELETE FROM reports WHERE key = ?", (key,)
+            )
+            self._connection.execute(
+                "INSERT INTO reports "
+                "(key, report, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, report, size, time.time_ns()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total() > self.max_bytes:
+            cursor = self._connection.execute(
+                "DELETE FROM reports WHERE key = ("
+                "SELECT key FROM reports ORDER BY last_used LIMIT 1)"
+            )
+            if not cursor.rowcount:
+                break
+            self.evictions += 1
+
+    def _total(self) -> int:
+        return self._connection.execute(
+            "SELECT size FROM total"
+        ).fetchone()[0]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._connection.execute("DELETE FROM reports")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counts and the current size."""
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
+
+    def __enter__(self) -> ReportCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,425 @@
+"""Command line interface, run with ``python -m uiucprescon.pymediaconch``."""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from uiucprescon.pymediaconch import sniff
+
+__all__ = ["Manifest", "main", "walk"]
+
+# Names accepted by --format, each mapping to
+# MediaConch_format_t.MediaConch_format_<name>.
+FORMAT_NAMES = (
+    "Text",
+    "Xml",
+    "MaXml",
+    "JsTree",
+    "Html",
+    "OrigXml",
+    "Simple",
+    "CSV",
+    "Json",
+)
+
+
+def walk(paths: Iterable[str]) -> Iterator[str]:
+    """Yield every file under the given files and directories.
+
+    Directories are walked depth first in sorted order, without following
+    symbolic links, and without listing more than one directory at a time.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            yield from _walk_directory(path)
+        else:
+            yield path
+
+
+def _walk_directory(directory: str) -> Iterator[str]:
+    with os.scandir(directory) as entries:
+        ordered = sorted(entries, key=lambda entry: entry.name)
+    for entry in ordered:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_directory(entry.path)
+        elif entry.is_file():
+            yield entry.path
+
+
+class Manifest:
+    """Record of the files already validated, for resuming a run.
+
+    Stored as one JSON object per line with the ``path`` and whether it was
+    validated ``ok``, appended and flushed as each file finishes so that it
+    survives an interrupted run.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done: Dict[str, bool] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file_handle:
+                for line in file_handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line of a run that was killed mid write.
+                        continue
+                    self.done[record["path"]] = record["ok"]
+        self._file_handle = open(path, "a", encoding="utf-8")
+
+    def should_skip(self, path: str, retry_failed: bool = False) -> bool:
+        """Check if a file was already validated in an earlier run."""
+        if path not in self.done:
+            return False
+        return self.done[path] or not retry_failed
+
+    def record(self, path: str, ok: bool) -> None:
+        """Mark a file as validated."""
+        self.done[path] = ok
+        self._file_handle.write(json.dumps({"path": path, "ok": ok}) + "\n")
+        self._file_handle.flush()
+
+    def close(self) -> None:
+        """Close the manifest file."""
+        self._file_handle.close()
+
+
+def get_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m uiucprescon.pymediaconch",
+        description="Validate media files with MediaConch",
+    )
+    subparsers = parser.add_subparsers(
+        title="subcommands", required=True, dest="subcommand"
+    )
+    validate = subparsers.add_parser(
+        "validate",
+        help="validate files and directory trees",
+        description="Validate files and directory trees, writing one JSON "
+                    "record per file as soon as it is done",
+    )
+    validate.add_argument(
+        "paths", nargs="+", help="files or directories to validate"
+    )
+    _add_validation_arguments(validate)
+    validate.add_argument(
+        "-o", "--output",
+        help="write JSON lines to this file instead of standard output",
+    )
+    validate.add_argument(
+        "--manifest",
+        help="record finished files here and skip files already recorded",
+    )
+    validate.add_argument(
+        "--retry-failed", action="store_true",
+        help="with --manifest, validate files that failed last time again",
+    )
+    validate.add_argument(
+        "--timeout", type=float, default=None,
+        help="give up on a file after TIMEOUT seconds, stopping its worker "
+             "process",
+    )
+    validate.add_argument(
+        "--max-memory", type=int, default=None,
+        help="stop worker processes that use more than MAX_MEMORY bytes, "
+             "failing the file they were on",
+    )
+
+    watch = subparsers.add_parser(
+        "watch",
+        help="validate files as they appear or change",
+        description="Watch directories and validate files once they stop "
+                    "changing, writing one JSON record per validation",
+    )
+    watch.add_argument("paths", nargs="+", help="directories to watch")
+    _add_validation_arguments(watch)
+    watch.add_argument(
+        "--settle", type=float, default=5.0,
+        help="seconds a file must be unchanged before it is validated "
+             "(default: %(default)s)",
+    )
+    watch.add_argument(
+        "--interval", type=float, default=2.0,
+        help="seconds between polls (default: %(default)s)",
+    )
+    watch.add_argument(
+        "--skip-existing", action="store_true",
+        help="do not validate files that are already there at start",
+    )
+    watch.add_argument(
+        "--poll", action="store_true",
+        help="poll the directories instead of using inotify",
+    )
+
+    enqueue = subparsers.add_parser(
+        "enqueue",
+        help="add files to a shared work queue",
+        description="Add files and directory trees to a work queue "
+                    "directory for 'work' processes to validate",
+    )
+    enqueue.add_argument("queue", help="work queue directory")
+    enqueue.add_argument(
+        "paths", nargs="+", help="files or directories to add"
+    )
+
+    work = subparsers.add_parser(
+        "work",
+        help="validate files from a shared work queue",
+        description="Validate files from a work queue directory until it "
+                    "is empty. Run as many as needed, on any host that "
+                    "can reach the directory",
+    )
+    work.add_argument("queue", help="work queue directory")
+    # Queue workers are always processes, each with its own lease.
+    _add_validation_arguments(work, worker_mode=False)
+    work.add_argument(
+        "--lease", type=float, default=300.0,
+        help="seconds before the file of a worker that stopped responding "
+             "is handed to another worker (default: %(default)s)",
+    )
+    work.add_argument(
+        "--max-attempts", type=int, default=3,
+        help="times a file is tried before it is given up "
+             "(default: %(default)s)",
+    )
+    work.add_argument(
+        "--wait", type=float, default=None,
+        help="when the queue is empty, check again every WAIT seconds "
+             "while other workers are still busy",
+    )
+    return parser
+
+
+def _add_validation_arguments(
+    parser: argparse.ArgumentParser, worker_mode: bool = True
+) -> None:
+    parser.add_argument(
+        "-p", "--policy", action="append", default=[], dest="policies",
+        help="policy file to apply, may be repeated",
+    )
+    parser.add_argument(
+        "-f", "--format", choices=FORMAT_NAMES, default="Json",
+        help="report format (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of workers (default: number of CPUs)",
+    )
+    if worker_mode:
+        parser.add_argument(
+            "--mode", choices=("thread", "process"), default="thread",
+            help="run workers as threads or processes "
+                 "(default: %(default)s)",
+        )
+    parser.add_argument(
+        "--max-bytes", type=int, default=None,
+        help="only analyze the first MAX_BYTES of larger files",
+    )
+    parser.add_argument(
+        "--sniff", action="store_true",
+        help="skip files that do not start like a known media container",
+    )
+    parser.add_argument(
+        "--kind", action="append", default=[], dest="kinds",
+        choices=sorted(sniff.KINDS),
+        help="only validate this kind of file, such as matroska or dpx, "
+             "may be repeated (implies --sniff)",
+    )
+    parser.add_argument(
+        "--include", action="append", default=[], metavar="PATTERN",
+        help="always validate files matching this pattern, may be "
+             "repeated (implies --sniff)",
+    )
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="PATTERN",
+        help="never validate files matching this pattern, may be repeated "
+             "(implies --sniff)",
+    )
+
+
+def _media_filter(
+    args: argparse.Namespace,
+) -> Optional[sniff.MediaFilter]:
+    if not (args.sniff or args.kinds or args.include or args.exclude):
+        return None
+    return sniff.MediaFilter(
+        kinds=frozenset(args.kinds) if args.kinds else None,
+        include=tuple(args.include),
+        exclude=tuple(args.exclude),
+    )
+
+
+def to_record(result, format_name: str) -> dict:
+    """Convert a ValidationResult to a JSON serializable dict.
+
+    Json reports are embedded as objects, other formats as text.
+    """
+    report = result.report
+    if report is not None and format_name == "Json":
+        report = json.loads(report)
+    return {
+        "path": result.path,
+        "ok": result.ok,
+        "partial": result.partial,
+        "timed_out": result.timed_out,
+        "skipped": result.skipped,
+        "error": result.error,
+        "report": report,
+    }
+
+
+def run_validate(args: argparse.Namespace, output: IO[str]) -> int:
+    # Imported here so that --help works without loading the extension.
+    from uiucprescon.pymediaconch import batch, mediaconch, supervisor
+
+    manifest = Manifest(args.manifest) if args.manifest else None
+    paths: Iterable[str] = walk(args.paths)
+    if manifest is not None:
+        paths = (
+            path for path in paths
+            if not manifest.should_skip(path, args.retry_failed)
+        )
+    report_format = getattr(
+        mediaconch.MediaConch_format_t, f"MediaConch_format_{args.format}"
+    )
+    validator = None
+    if args.timeout is not None or args.max_memory is not None:
+        # Only worker processes can be stopped in the middle of a file.
+        validator = supervisor.SupervisedValidator(
+            args.policies,
+            report_format,
+            max_workers=args.jobs,
+            timeout=args.timeout,
+            max_memory=args.max_memory,
+            max_bytes=args.max_bytes,
+            media_filter=_media_filter(args),
+        )
+        results = validator.validate(paths)
+    else:
+        results = batch.iter_validate(
+            paths,
+            policies=args.policies,
+            format=report_format,
+            max_workers=args.jobs,
+            mode=args.mode,
+            max_bytes=args.max_bytes,
+            media_filter=_media_filter(args),
+        )
+    failures = 0
+    try:
+        for result in results:
+            output.write(json.dumps(to_record(result, args.format)) + "\n")
+            output.flush()
+            if manifest is not None:
+                manifest.record(result.path, result.ok)
+            if not result.ok:
+                failures += 1
+    finally:
+        if validator is not None:
+            validator.close()
+        if manifest is not None:
+            manifest.close()
+    return 1 if failures else 0
+
+
+def run_watch(args: argparse.Namespace, output: IO[str]) -> int:
+    # Imported here so that --help works without loading the extension.
+    from uiucprescon.pymediaconch import mediaconch, watch
+
+    events = watch.watch(
+        args.paths,
+        policies=args.policies,
+        format=getattr(
+            mediaconch.MediaConch_format_t, f"MediaConch_format_{args.format}"
+        ),
+        max_workers=args.jobs,
+        mode=args.mode,
+        max_bytes=args.max_bytes,
+        settle=args.settle,
+        interval=args.interval,
+        initial=not args.skip_existing,
+        use_inotify=False if args.poll else None,
+        media_filter=_media_filter(args),
+    )
+    try:
+        for event in events:
+            record = to_record(event.result, args.format)
+            record["event"] = event.kind
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        events.close()
+    return 0
+
+
+def run_enqueue(args: argparse.Namespace, output: IO[str]) -> int:
+    from uiucprescon.pymediaconch import workqueue
+
+    added = workqueue.WorkQueue(args.queue).put(walk(args.paths))
+    output.write(f"Added {added} files to {args.queue}\n")
+    return 0
+
+
+def _work(args: argparse.Namespace) -> int:
+    # Imported here so that --help works without loading the extension.
+    from uiucprescon.pymediaconch import mediaconch, workqueue
+
+    queue = workqueue.WorkQueue(
+        args.queue, lease=args.lease, max_attempts=args.max_attempts
+    )
+    return workqueue.run_worker(
+        queue,
+        policies=args.policies,
+        format=getattr(
+            mediaconch.MediaConch_format_t, f"MediaConch_format_{args.format}"
+        ),
+        max_bytes=args.max_bytes,
+        wait=args.wait,
+        media_filter=_media_filter(args),
+    )
+
+
+def run_work(args: argparse.Namespace, output: IO[str]) -> int:
+    jobs = args.jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(_work, args) for _ in range(jobs)
+        ]
+        completed = sum(future.result() for future in futures)
+    output.write(f"Validated {completed} files from {args.queue}\n")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = get_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        match args.subcommand:
+            case "validate":
+                if args.output is None:
+                    return run_validate(args, sys.stdout)
+                # Append when resuming so earlier records are kept.
+                mode = "a" if args.manifest else "w"
+                with open(args.output, mode, encoding="utf-8") as output:
+                    return run_validate(args, output)
+            case "watch":
+                return run_watch(args, sys.stdout)
+            case "enqueue":
+                return run_enqueue(args, sys.stdout)
+            case "work":
+                return run_work(args, sys.stdout)
+            case _:
+                # This should never happen because argparse should enforce
+                # valid subcommands, but we include it for completeness.
+                parser.error(f"unknown subcommand {args.subcommand!r}")
+    except ValueError as error:
+        # Such as a policy that cannot be loaded.
+        parser.exit(1, f"{parser.prog}: error: {error}\n")
@@ -0,0 +1,273 @@
+"""Timings and counters for MediaConch calls."""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from uiucprescon.pymediaconch._native import mediaconch
+
+__all__ = ["InstrumentedMediaConch", "Metrics", "PhaseEvent"]
+
+#: ``add_file``: MediaInfoLib opens and parses the file.
+ANALYZE = "analyze"
+#: ``get_report``: policies are evaluated and the report is rendered.
+#: libmediaconch does both in one call so they cannot be timed separately.
+REPORT = "report"
+#: ``add_policy``: the policy is loaded and parsed.
+POLICY = "policy"
+
+
+@dataclasses.dataclass(frozen=True)
+class PhaseEvent:
+    """Passed to the callback at the start and the end of every phase.
+
+    ``seconds`` and ``size`` are only set at the end of a phase. ``size`` is
+    the number of bytes of the file analyzed or of the report produced.
+    """
+
+    phase: str
+    boundary: str
+    #: File name, file id, policy file name, or the number of files for
+    #: ``add_files``.
+    subject: Union[str, int]
+    seconds: Optional[float] = None
+    size: Optional[int] = None
+
+
+@dataclasses.dataclass
+class _PhaseStats:
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class Metrics:
+    """Thread safe counters and phase timings.
+
+    One Metrics object can be shared by several instruments, for example one
+    per worker thread, to aggregate a whole batch.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._phases: Dict[str, _PhaseStats] = {}
+        self.files = 0
+        self.policies = 0
+        self.reports = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.peak_report_size = 0
+
+    def record_phase(self, phase: str, seconds: float) -> None:
+        """Add a timing for a phase."""
+        with self._lock:
+            stats = self._phases.setdefault(phase, _PhaseStats())
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """Increase one of the counters."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_report(self, size: int) -> None:
+        """Count a report and track the largest report size."""
+        with self._lock:
+            self.reports += 1
+            self.peak_report_size = max(self.peak_report_size, size)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return all counters and phase timings as plain values."""
+        with self._lock:
+            return {
+                "files": self.files,
+                "policies": self.policies,
+                "reports": self.reports,
+                "errors": self.errors,
+                "bytes_read": self.bytes_read,
+                "peak_report_size": self.peak_report_size,
+                "phases": {
+                    phase: dataclasses.asdict(stats)
+                    for phase, stats in self._phases.items()
+                },
+            }
+
+    def to_prometheus(self, prefix: str = "pymediaconch") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        values = self.as_dict()
+        lines = []
+        for name, kind in (
+            ("files", "counter"),
+            ("policies", "counter"),
+            ("reports", "counter"),
+            ("errors", "counter"),
+            ("bytes_read", "counter"),
+            ("peak_report_size", "gauge"),
+        ):
+            suffix = "_total" if kind == "counter" else "_bytes"
+            metric = f"{prefix}_{name}{suffix}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {values[name]}")
+        metric = f"{prefix}_phase_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for phase, stats in sorted(values["phases"].items()):
+            lines.append(f'{metric}_count{{phase="{phase}"}} {stats["count"]}')
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {stats["seconds"]}')
+        metric = f"{prefix}_phase_max_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        for phase, stats in sorted(values["phases"].items()):
+            lines.append(f'{metric}{{phase="{phase}"}} {stats["max_seconds"]}')
+        return "\n".join(lines) + "\n"
+
+
+def _encoded_size(text: str) -> int:
+    # An ASCII string is as long in UTF-8 as in characters, which spares
+    # encoding a copy of the whole report just to measure it.
+    return len(text) if text.isascii() else len(text.encode())
+
+
+class InstrumentedMediaConch:
+    """MediaConch instance that records what each call costs.
+
+    Has the same methods as :class:`MediaConch` and can be used anywhere an
+    instance is expected, such as
+    :func:`~uiucprescon.pymediaconch.batch.validate_file`.
+
+    Args:
+        instance: MediaConch instance to wrap. A new one is created if not
+            given.
+        metrics: where to record. A new :class:`Metrics` if not given.
+        on_phase: called with a :class:`PhaseEvent` at the start and the
+            end of every phase.
+    """
+
+    def __init__(
+        self,
+        instance: Optional[mediaconch.MediaConch] = None,
+        metrics: Optional[Metrics] = None,
+        on_phase: Optional[Callable[[PhaseEvent], None]] = None,
+    ) -> None:
+        self.instance = (
+            instance if instance is not None else mediaconch.MediaConch()
+        )
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.on_phase = on_phase
+
+    def _timed(
+        self, phase: str, subject: Union[str, int], call: Callable[[], Any]
+    ):
+        if self.on_phase is not None:
+            self.on_phase(PhaseEvent(phase, "start", subject))
+        started = time.perf_counter()
+        try:
+            result = call()
+        except BaseException:
+            seconds = time.perf_counter() - started
+            self.metrics.record_phase(phase, seconds)
+            self.metrics.increment("errors")
+            self._finished(phase, subject, seconds)
+            raise
+        seconds = time.perf_counter() - started
+        self.metrics.record_phase(phase, seconds)
+        return result, seconds
+
+    def _finished(
+        self,
+        phase: str,
+        subject: Union[str, int],
+        seconds: float,
+        size: Optional[int] = None,
+    ) -> None:
+        if self.on_phase is not None:
+            self.on_phase(PhaseEvent(phase, "end", subject, seconds, size))
+
+    def add_file(self, filename: str) -> int:
+        """Add a file, timed as the analyze phase."""
+        file_id, seconds = self._timed(
+            ANALYZE, filename, lambda: self.instance.add_file(filename)
+        )
+        try:
+            size: Optional[int] = os.path.getsize(filename)
+        except OSError:
+            size = None
+        self.metrics.increment("files")
+        if file_id < 0:
+            self.metrics.increment("errors")
+        elif size is not None:
+            self.metrics.increment("bytes_read", size)
+        self._finished(ANALYZE, filename, seconds, size)
+        return file_id
+
+    def add_files(
+        self, filenames: List[str]
+    ) -> Tuple[List[int], Dict[int, str]]:
+        """Add files in one call, timed together as one analyze phase."""
+        filenames = list(filenames)
+        (file_ids, errors), seconds = self._timed(
+            ANALYZE, len(filenames), lambda: self.instance.add_files(filenames)
+        )
+        size = 0
+        for index, filename in enumerate(filenames):
+            if index not in errors:
+                with contextlib.suppress(OSError):
+                    size += os.path.getsize(filename)
+        self.metrics.increment("files", len(filenames))
+        self.metrics.increment("errors", len(errors))
+        self.metrics.increment("bytes_read", size)
+        self._finished(ANALYZE, len(filenames), seconds, size)
+        return file_ids, errors
+
+    def get_report(self, file_id: int) -> str:
+        """Get a report, timed as the report phase."""
+        return self.get_report_bytes(file_id).decode("utf-8")
+
+    def get_report_bytes(self, file_id: int) -> bytes:
+        """Get a report as bytes, timed as the report phase."""
+        report, seconds = self._timed(
+            REPORT, file_id, lambda: self.instance.get_report_bytes(file_id)
+        )
+        self.metrics.record_report(len(report))
+        self._finished(REPORT, file_id, seconds, len(report))
+        return report
+
+    def get_reports(
+        self,
+        file_id: int,
+        formats: List[mediaconch.MediaConch_format_t],
+    ) -> Dict[mediaconch.MediaConch_format_t, str]:
+        """Get reports in several formats, timed as one report phase."""
+        reports, seconds = self._timed(
+            REPORT,
+            file_id,
+            lambda: self.instance.get_reports(file_id, formats),
+        )
+        size = 0
+        for report in reports.values():
+            report_size = _encoded_size(report)
+            self.metrics.record_report(report_size)
+            size += report_size
+        self._finished(REPORT, file_id, seconds, size)
+        return reports
+
+    def add_policy(self, filename: str) -> int:
+        """Add a policy file, timed as the policy phase."""
+        result, seconds = self._timed(
+            POLICY, filename, lambda: self.instance.add_policy(filename)
+        )
+        self.metrics.increment("policies")
+        self._finished(POLICY, filename, seconds)
+        return result
+
+    def set_format(self, format: mediaconch.MediaConch_format_t) -> int:
+        """Set the output format."""
+        return self.instance.set_format(format)
+
+    def get_last_error(self) -> str:
+        """Get the last error message."""
+        return self.instance.get_last_error()
@@ -0,0 +1,195 @@
+"""Evaluate many policies against many files as a pass/fail matrix."""
+
+from __future__ import annotations
+
+import array
+import collections
+import dataclasses
+import os
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from uiucprescon.pymediaconch import batch, results
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.cache import ReportCache
+from uiucprescon.pymediaconch.policies import Policy, PolicySource, StrPath
+
+__all__ = [
+    "ERROR",
+    "FAIL",
+    "INFO",
+    "PASS",
+    "PolicyMatrix",
+    "WARN",
+    "evaluate_policies",
+    "matrix_row",
+]
+
+#: Result codes stored in :attr:`PolicyMatrix.codes`.
+ERROR = -1
+PASS = 0
+INFO = 1
+WARN = 2
+FAIL = 3
+
+_CODES = {"pass": PASS, "info": INFO, "warn": WARN, "fail": FAIL}
+
+_Cell = Tuple[int, int]
+
+
+@dataclasses.dataclass(frozen=True)
+class PolicyMatrix:
+    """Outcome of every policy for every file.
+
+    ``codes`` holds one result code per file and policy, row by row, so the
+    code of file ``i`` and policy ``j`` is ``codes[i * len(policies) + j]``.
+    A file that could not be analyzed has :data:`ERROR` for every policy.
+
+    ``failures`` only has an entry for the cells with failed rules. It maps
+    ``(file index, policy index)`` to the indices of the failed rules in
+    ``rules[policy index]``, which lists the rules of each policy depth
+    first, including those of nested policies.
+    """
+
+    paths: List[str]
+    policies: List[str]
+    rules: List[Tuple[str, ...]]
+    codes: array.array
+    failures: Dict[_Cell, Tuple[int, ...]]
+    errors: Dict[int, str]
+
+    def code(self, file_index: int, policy_index: int) -> int:
+        """Get the result code of a policy for a file."""
+        return self.codes[file_index * len(self.policies) + policy_index]
+
+    def row(self, file_index: int) -> array.array:
+        """Get the result codes of every policy for a file."""
+        start = file_index * len(self.policies)
+        return self.codes[start:start + len(self.policies)]
+
+    def failed_rules(self, file_index: int, policy_index: int) -> List[str]:
+        """Get the names of the rules of a policy that failed for a file."""
+        names = self.rules[policy_index]
+        return [
+            names[index]
+            for index in self.failures.get((file_index, policy_index), ())
+        ]
+
+
+def _flatten_rules(policy: results.PolicyResult) -> List[results.RuleResult]:
+    rules = list(policy.rules)
+    for nested in policy.policies:
+        rules.extend(_flatten_rules(nested))
+    return rules
+
+
+def matrix_row(
+    result: results.MediaResult, policy_count: int
+) -> Tuple[List[int], Dict[int, Tuple[int, ...]], List[Tuple[str, ...]]]:
+    """Turn one file's result into a row of the matrix.
+
+    The report lists the top level policies in the order they were added
+    to the instance, so the n-th top level policy in ``result`` is the n-th
+    policy applied. Policies missing from the report get :data:`ERROR`.
+
+    Returns:
+        The result code of each policy, the indices of the failed rules
+        keyed by policy index, and the rule names of each policy.
+    """
+    codes = [ERROR] * policy_count
+    failures: Dict[int, Tuple[int, ...]] = {}
+    rule_names: List[Tuple[str, ...]] = [()] * policy_count
+    for index, policy in enumerate(result.policies[:policy_count]):
+        codes[index] = _CODES.get(policy.outcome, ERROR)
+        rules = _flatten_rules(policy)
+        rule_names[index] = tuple(rule.name for rule in rules)
+        failed = tuple(
+            position for position, rule in enumerate(rules)
+            if rule.outcome == "fail"
+        )
+        if failed:
+            failures[index] = failed
+    return codes, failures, rule_names
+
+
+def _policy_name(policy: PolicySource) -> str:
+    if isinstance(policy, Policy):
+        return policy.name
+    return os.path.basename(os.fspath(policy))
+
+
+def evaluate_policies(
+    paths: Iterable[StrPath],
+    policies: Sequence[PolicySource],
+    max_workers: Optional[int] = None,
+    mode: str = "thread",
+    cache: Optional[ReportCache] = None,
+    max_bytes: Optional[int] = None,
+) -> PolicyMatrix:
+    """Evaluate every policy against every file.
+
+    All policies are added to each worker's instance, so each file is
+    parsed by MediaInfoLib once and every policy is checked against that
+    one parse in a single Xml report. Each report is read into its row of
+    the matrix as soon as it is ready and then dropped, so memory grows
+    with the matrix rather than with the reports.
+
+    Args:
+        paths: files to evaluate.
+        policies: policy files or :class:`Policy` objects, one column each.
+        max_workers: number of workers, as in
+            :func:`~uiucprescon.pymediaconch.batch.iter_validate`.
+        mode: ``"thread"`` or ``"process"``.
+        cache: reuse reports from, and store new reports in, this cache.
+        max_bytes: only analyze the first ``max_bytes`` of larger files.
+
+    Raises:
+        ValueError: one of the policies could not be loaded. Columns are
+            matched to policies by position, so every policy must load.
+    """
+    policies = list(policies)
+    file_paths = [os.fspath(path) for path in paths]
+    # Results arrive in completion order. The same path may be listed more
+    # than once, so each one maps to the rows still waiting for it.
+    rows: Dict[str, Deque[int]] = collections.defaultdict(collections.deque)
+    for file_index, path in enumerate(file_paths):
+        rows[path].append(file_index)
+    names = [_policy_name(policy) for policy in policies]
+    rules: List[Optional[Tuple[str, ...]]] = [None] * len(policies)
+    codes = array.array("b", [ERROR]) * (len(file_paths) * len(policies))
+    failures: Dict[_Cell, Tuple[int, ...]] = {}
+    errors: Dict[int, str] = {}
+    for validation in batch.iter_validate(
+        file_paths,
+        policies,
+        mediaconch.MediaConch_format_t.MediaConch_format_Xml,
+        max_workers=max_workers,
+        mode=mode,
+        max_bytes=max_bytes,
+        cache=cache,
+    ):
+        file_index = rows[validation.path].popleft()
+        result = None
+        if validation.report is not None:
+            result = next(
+                results.iter_results(validation.report.encode()), None
+            )
+        if result is None:
+            errors[file_index] = validation.error or "No result in report"
+            continue
+        row, row_failures, row_rules = matrix_row(result, len(policies))
+        start = file_index * len(policies)
+        codes[start:start + len(policies)] = array.array("b", row)
+        for policy_index, failed in row_failures.items():
+            failures[(file_index, policy_index)] = failed
+        for policy_index, policy in enumerate(result.policies):
+            if policy_index < len(policies) and rules[policy_index] is None:
+                rules[policy_index] = row_rules[policy_index]
+                names[policy_index] = policy.name or names[policy_index]
+    return PolicyMatrix(
+        paths=file_paths,
+        policies=names,
+        rules=[policy_rules or () for policy_rules in rules],
+        codes=codes,
+        failures=failures,
+        errors=errors,
+    )
@@ -0,0 +1,43 @@
+"""Python bindings for libmediaconch Library"""
+
+import enum
+from typing import Dict, List, Sequence, Tuple
+
+class MediaConch:
+    """MediaConch library instance.
+
+    Safe to share between threads, including on free-threaded Python:
+    calls on the same instance are serialized, calls on different instances
+    run in parallel. :meth:`get_last_error` returns the error of the
+    calling thread's last failed call, so it can follow a failed
+    :meth:`add_file` even while other threads use the instance.
+
+    Reports are rendered as ``MediaConch_format_Xml`` until
+    :meth:`set_format` is called.
+    """
+
+    def __init__(self) -> None: ...
+    def add_file(self, filename: str) -> int: ...
+    def add_files(
+        self, filenames: Sequence[str]
+    ) -> Tuple[List[int], Dict[int, str]]: ...
+    def get_report(self, file_id: int) -> str: ...
+    def get_reports(
+        self, file_id: int, formats: Sequence[MediaConch_format_t]
+    ) -> Dict[MediaConch_format_t, str]: ...
+    def get_report_bytes(self, file_id: int) -> bytes: ...
+    def add_policy(self, filename: str) -> int: ...
+    def set_format(self, format: MediaConch_format_t) -> int: ...
+    def get_last_error(self) -> str: ...
+
+class MediaConch_format_t(enum.Enum):
+    MediaConch_format_Text = 0
+    MediaConch_format_Xml = 1
+    MediaConch_format_MaXml = 2
+    MediaConch_format_JsTree = 3
+    MediaConch_format_Html = 4
+    MediaConch_format_OrigXml = 5
+    MediaConch_format_Simple = 6
+    MediaConch_format_CSV = 7
+    MediaConch_format_Json = 8
+    MediaConch_format_Max = 9
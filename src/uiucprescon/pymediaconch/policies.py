@@ -0,0 +1,193 @@
+"""Policies loaded once and shared by many MediaConch instances."""
+
+from __future__ import annotations
+
+import atexit
+import collections
+import contextlib
+import hashlib
+import os
+import threading
+from typing import Iterable, Iterator, Union
+
+from uiucprescon.pymediaconch._memfile import MemoryFile
+
+__all__ = [
+    "Policy",
+    "add_policies",
+    "add_policy",
+    "add_policy_bytes",
+    "add_policy_string",
+]
+
+StrPath = Union[str, "os.PathLike[str]"]
+PolicySource = Union[StrPath, "Policy"]
+
+#: Number of policy files kept open for reuse. libmediaconch reads a policy
+#: file when it is added, so a file is only needed while an add_policy call
+#: loads it. The least recently used files beyond this many are closed.
+MAX_MATERIALIZED = 32
+
+
+class _PolicyFile:
+    def __init__(self, policy: Policy) -> None:
+        self.file = MemoryFile(
+            name=f"policy-{policy.digest[:12]}", suffix=".xml"
+        )
+        self.file.write(policy.data)
+        # add_policy calls loading from the file right now.
+        self.users = 0
+
+
+# One file per distinct policy content, shared by every instance the policy
+# is attached to, ordered from least to most recently used.
+_materialized: collections.OrderedDict[str, _PolicyFile] = (
+    collections.OrderedDict()
+)
+_materialized_lock = threading.Lock()
+
+
+def _evict() -> None:
+    excess = len(_materialized) - MAX_MATERIALIZED
+    for digest, policy_file in list(_materialized.items()):
+        if excess <= 0:
+            return
+        if policy_file.users == 0:
+            del _materialized[digest]
+            policy_file.file.close()
+            excess -= 1
+
+
+@atexit.register
+def _close_materialized() -> None:
+    # Otherwise the temporary files used where there is no memfd_create are
+    # left behind.
+    with _materialized_lock:
+        for policy_file in _materialized.values():
+            policy_file.file.close()
+        _materialized.clear()
+
+
+def _forget_materialized() -> None:
+    global _materialized_lock
+    # A forked child must not close, and so delete, the files of its parent.
+    _materialized.clear()
+    _materialized_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_materialized)
+
+
+@contextlib.contextmanager
+def _materialize(policy: Policy) -> Iterator[str]:
+    with _materialized_lock:
+        policy_file = _materialized.get(policy.digest)
+        if policy_file is None:
+            policy_file = _PolicyFile(policy)
+            _materialized[policy.digest] = policy_file
+        _materialized.move_to_end(policy.digest)
+        policy_file.users += 1
+        _evict()
+    try:
+        yield policy_file.file.path
+    finally:
+        with _materialized_lock:
+            policy_file.users -= 1
+            _evict()
+
+
+class Policy:
+    """A policy read once and attachable to any number of instances.
+
+    libmediaconch only loads policies by path, and each instance parses the
+    policies added to it. A Policy keeps the policy content in memory and
+    writes it to a single in-memory file (see
+    :class:`~uiucprescon.pymediaconch._memfile.MemoryFile`) that every
+    instance then loads from. The files of the :data:`MAX_MATERIALIZED`
+    most recently used policies are kept for reuse, and the others closed.
+    Policies can come from a file, bytes or a
+    string, are identified by the SHA-256 digest of their content, and
+    pickle cheaply to worker processes.
+    """
+
+    def __init__(self, data: bytes, name: str = "policy") -> None:
+        self.data = bytes(data)
+        self.name = name
+        self.digest = hashlib.sha256(self.data).hexdigest()
+
+    @classmethod
+    def from_file(cls, path: StrPath) -> Policy:
+        """Read a policy from a file."""
+        with open(path, "rb") as file_handle:
+            return cls(file_handle.read(), name=os.path.basename(path))
+
+    @classmethod
+    def from_string(cls, text: str, name: str = "policy") -> Policy:
+        """Create a policy from XML or XSL text."""
+        return cls(text.encode("utf-8"), name=name)
+
+    @property
+    def path(self) -> str:
+        """Path that libmediaconch can load the policy from.
+
+        The file may be closed once :data:`MAX_MATERIALIZED` other policies
+        have been used since, so use the path straight away, or use
+        :meth:`attach`, which keeps the file open while it is loaded.
+        """
+        with _materialize(self) as path:
+            return path
+
+    def attach(self, instance) -> int:
+        """Add this policy to a MediaConch instance."""
+        with _materialize(self) as path:
+            return instance.add_policy(path)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Policy):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"Policy(name={self.name!r}, digest={self.digest[:12]!r})"
+
+
+def add_policy(instance, policy: PolicySource) -> int:
+    """Add a policy given as a path or a :class:`Policy` to an instance."""
+    if isinstance(policy, Policy):
+        return policy.attach(instance)
+    return instance.add_policy(os.fspath(policy))
+
+
+def add_policies(instance, policies: Iterable[PolicySource]) -> None:
+    """Add policies to an instance in order, stopping at one that fails.
+
+    The policies of a report are only known by their position, so a policy
+    that silently fails to load would shift every policy after it.
+
+    Raises:
+        ValueError: libmediaconch could not load one of the policies.
+    """
+    for policy in policies:
+        if add_policy(instance, policy) < 0:
+            name = (
+                policy.name if isinstance(policy, Policy)
+                else os.fspath(policy)
+            )
+            raise ValueError(
+                f"Unable to load policy {name}: "
+                f"{instance.get_last_error() or 'unknown error'}"
+            )
+
+
+def add_policy_bytes(instance, data: bytes, name: str = "policy") -> int:
+    """Add a policy held in memory as bytes to a MediaConch instance."""
+    return Policy(data, name=name).attach(instance)
+
+
+def add_policy_string(instance, text: str, name: str = "policy") -> int:
+    """Add a policy held in memory as text to a MediaConch instance."""
+    return Policy.from_string(text, name=name).attach(instance)
@@ -0,0 +1,218 @@
+"""Pool of configured MediaConch instances shared between threads."""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import os
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from uiucprescon.pymediaconch import batch
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import Policy, PolicySource
+from uiucprescon.pymediaconch.session import MediaConchSession
+
+__all__ = ["InstancePool", "PoolStats"]
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolStats:
+    """Snapshot of how busy an :class:`InstancePool` has been."""
+
+    size: int
+    in_use: int
+    checkouts: int
+    #: Checkouts that found no idle instance and had to wait.
+    waits: int
+    #: Checkouts that gave up after their timeout.
+    timeouts: int
+    wait_seconds: float
+    max_wait_seconds: float
+    #: Total time instances spent checked out.
+    busy_seconds: float
+    uptime_seconds: float
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        """Average time a checkout waited for an instance."""
+        return self.wait_seconds / self.checkouts if self.checkouts else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of the pool's capacity used since it was created."""
+        capacity = self.size * self.uptime_seconds
+        return self.busy_seconds / capacity if capacity else 0.0
+
+
+class InstancePool:
+    """Fixed set of ready to use instances, checked out one thread at a time.
+
+    Every instance is a
+    :class:`~uiucprescon.pymediaconch.session.MediaConchSession` set up with
+    the pool's format and policies before it is first needed, so creating
+    and configuring instances is kept off the path of each request. A
+    single instance must not be used by two threads at once; the pool
+    guarantees that by handing each one to one caller at a time::
+
+        pool = InstancePool(4, policies=["policy.xml"], format=fmt)
+        with pool.checkout() as mc:
+            file_id = mc.add_file(path)
+            report = mc.get_report(file_id)
+
+    When an instance is returned, the files added during the checkout are
+    forgotten. If the format was changed or policies were added during the
+    checkout, the instance is replaced with a fresh one.
+
+    Args:
+        size: number of instances.
+        policies: policy files or :class:`Policy` objects applied to every
+            instance.
+        format: report format. The library default is used if not set.
+        max_files: files analyzed by an instance before its memory is
+            released, see :class:`MediaConchSession`.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        policies: Iterable[PolicySource] = (),
+        format: Optional[mediaconch.MediaConch_format_t] = None,
+        max_files: Optional[int] = batch.WORKER_MAX_FILES,
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.format = format
+        self.max_files = max_files
+        self._policies: List[PolicySource] = [
+            policy if isinstance(policy, Policy) else os.fspath(policy)
+            for policy in policies
+        ]
+        self._condition = threading.Condition()
+        self._idle: List[MediaConchSession] = [
+            self._new_instance() for _ in range(size)
+        ]
+        self._closed = False
+        self._started = time.monotonic()
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._busy_seconds = 0.0
+
+    def _new_instance(self) -> MediaConchSession:
+        instance = MediaConchSession(
+            self._policies, self.format, max_files=self.max_files
+        )
+        instance.warm()
+        return instance
+
+    def _acquire(self, timeout: Optional[float]) -> MediaConchSession:
+        started = time.monotonic()
+        with self._condition:
+            waited = False
+            while not self._idle:
+                if self._closed:
+                    raise RuntimeError("InstancePool is closed")
+                waited = True
+                remaining = (
+                    None if timeout is None
+                    else timeout - (time.monotonic() - started)
+                )
+                if remaining is not None and remaining <= 0:
+                    self._timeouts += 1
+                    raise TimeoutError(
+                        f"No instance became free within {timeout} seconds"
+                    )
+                self._condition.wait(remaining)
+            if self._closed:
+                raise RuntimeError("InstancePool is closed")
+            # Last in, first out, so recently used instances stay hot.
+            instance = self._idle.pop()
+            wait = time.monotonic() - started
+            self._checkouts += 1
+            self._waits += waited
+            self._wait_seconds += wait
+            self._max_wait_seconds = max(self._max_wait_seconds, wait)
+            return instance
+
+    def _release(self, instance: MediaConchSession, busy: float) -> None:
+        if self._closed:
+            instance.clear()
+            with self._condition:
+                self._busy_seconds += busy
+            return
+        # Done outside the lock so other threads can check out meanwhile.
+        # Policies cannot be removed from an instance and a session keeps
+        # the last format it was given, so any change of format or policies
+        # gets a fresh instance.
+        if (
+            list(instance.policies) != self._policies
+            or instance.format != self.format
+        ):
+            instance = self._new_instance()
+        else:
+            instance.reset()
+            instance.warm()
+        with self._condition:
+            self._busy_seconds += busy
+            self._idle.append(instance)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def checkout(
+        self, timeout: Optional[float] = None
+    ) -> Iterator[MediaConchSession]:
+        """Borrow an instance for the duration of the block.
+
+        Waits for an instance to be returned if all are in use.
+
+        Args:
+            timeout: seconds to wait for a free instance. Waits forever if
+                None.
+
+        Raises:
+            TimeoutError: no instance became free in time.
+            RuntimeError: the pool was closed.
+        """
+        instance = self._acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield instance
+        finally:
+            self._release(instance, time.monotonic() - started)
+
+    def stats(self) -> PoolStats:
+        """Get the counters collected since the pool was created."""
+        with self._condition:
+            return PoolStats(
+                size=self.size,
+                in_use=self.size - len(self._idle),
+                checkouts=self._checkouts,
+                waits=self._waits,
+                timeouts=self._timeouts,
+                wait_seconds=self._wait_seconds,
+                max_wait_seconds=self._max_wait_seconds,
+                busy_seconds=self._busy_seconds,
+                uptime_seconds=time.monotonic() - self._started,
+            )
+
+    def close(self) -> None:
+        """Release the idle instances and refuse further checkouts.
+
+        Instances still checked out are released when they are returned.
+        """
+        with self._condition:
+            self._closed = True
+            for instance in self._idle:
+                instance.clear()
+            self._condition.notify_all()
+
+    def __enter__(self) -> InstancePool:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
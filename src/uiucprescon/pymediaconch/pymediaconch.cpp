@@ -2,22 +2,174 @@
 // Created by Borchers, Henry Samuel on 7/30/25.
 //
 #include <nanobind/nanobind.h>
+#include <nanobind/stl/map.h>
+#include <nanobind/stl/pair.h>
 #include <nanobind/stl/string.h>
+#include <nanobind/stl/vector.h>
+#include <cstddef>
+#include <map>
+#include <mutex>
+#include <thread>
+#include <utility>
+#include <vector>
 #include <MediaConchDLL.h>
 
 namespace nb = nanobind;
+
+namespace {
+// libmediaconch does not touch any Python objects, so every call into it is
+// made with the GIL released. The return values are converted to Python
+// objects only after the GIL has been reacquired.
+//
+// A MediaConch instance is not safe to use from several threads at once.
+// Because the GIL is released, that applies to regular builds as much as
+// to free-threaded ones, so each instance carries a mutex that every call
+// holds. It is always taken after the GIL has been released, and released
+// before the GIL is reacquired, so the two can never deadlock.
+//
+// libmediaconch keeps one last error per instance, which another thread can
+// overwrite between a failed call and the call to get_last_error. The calls
+// that can fail therefore read the error while still holding the lock and
+// keep it for the calling thread, and get_last_error returns that copy.
+struct Instance : MediaConch::MediaConch {
+    // The format libmediaconch renders reports in until it is told otherwise.
+    static constexpr MediaConch_format_t default_format = MediaConch_format_Xml;
+
+    std::mutex mutex;
+    // The output format, so that get_reports can put it back. libmediaconch
+    // has no call to read it, so it is set explicitly on construction rather
+    // than trusted to be the default.
+    MediaConch_format_t format = default_format;
+    // The error of the last failed call made by each thread.
+    std::map<std::thread::id, std::string> errors;
+
+    Instance() { this->set_format(format); }
+
+    // Must be called with the mutex held.
+    void record_error() { errors[std::this_thread::get_id()] = this->get_last_error(); }
+};
+
+using Lock = std::lock_guard<std::mutex>;
+
+auto add_file(Instance &self, const std::string &filename) -> long {
+    nb::gil_scoped_release release;
+    Lock lock(self.mutex);
+    const long file_id = self.add_file(filename);
+    if (file_id < 0) {
+        self.record_error();
+    }
+    return file_id;
+}
+
+// File ids in input order, and the error message for each failed file keyed
+// by its index in the input.
+using AddFilesResult = std::pair<std::vector<long>, std::map<std::size_t, std::string>>;
+
+auto add_files(Instance &self, const std::vector<std::string> &filenames) -> AddFilesResult {
+    AddFilesResult result;
+    result.first.reserve(filenames.size());
+    nb::gil_scoped_release release;
+    Lock lock(self.mutex);
+    for (std::size_t file_index = 0; file_index < filenames.size(); ++file_index) {
+        const long file_id = self.add_file(filenames[file_index]);
+        result.first.push_back(file_id);
+        if (file_id < 0) {
+            self.record_error();
+            result.second[file_index] = self.errors[std::this_thread::get_id()];
+        }
+    }
+    return result;
+}
+
+auto get_report(Instance &self, long file_id) -> std::string {
+    std::string report;
+    {
+        nb::gil_scoped_release release;
+        Lock lock(self.mutex);
+        report = self.get_report(file_id);
+    }
+    return report;
+}
+
+// Renders one report per requested format from the analysis done by
+// add_file. The output format is restored before the lock is released.
+auto get_reports(Instance &self, long file_id, const std::vector<MediaConch_format_t> &formats)
+    -> std::map<MediaConch_format_t, std::string> {
+    std::map<MediaConch_format_t, std::string> reports;
+    nb::gil_scoped_release release;
+    Lock lock(self.mutex);
+    for (const MediaConch_format_t format : formats) {
+        self.set_format(format);
+        reports[format] = self.get_report(file_id);
+    }
+    self.set_format(self.format);
+    return reports;
+}
+
+auto get_report_bytes(Instance &self, long file_id) -> nb::bytes {
+    std::string report;
+    {
+        nb::gil_scoped_release release;
+        Lock lock(self.mutex);
+        report = self.get_report(file_id);
+    }
+    // Copied straight into a bytes object, skipping the UTF-8 decode and the
+    // str object that get_report creates.
+    return nb::bytes(report.data(), report.size());
+}
+
+auto add_policy(Instance &self, const std::string &filename) -> int {
+    nb::gil_scoped_release release;
+    Lock lock(self.mutex);
+    const int result = self.add_policy(filename);
+    if (result < 0) {
+        self.record_error();
+    }
+    return result;
+}
+
+auto set_format(Instance &self, MediaConch_format_t format) -> int {
+    nb::gil_scoped_release release;
+    Lock lock(self.mutex);
+    const int result = self.set_format(format);
+    if (result >= 0) {
+        self.format = format;
+    } else {
+        self.record_error();
+    }
+    return result;
+}
+
+auto get_last_error(Instance &self) -> std::string {
+    std::string error;
+    {
+        nb::gil_scoped_release release;
+        Lock lock(self.mutex);
+        const auto found = self.errors.find(std::this_thread::get_id());
+        error = found != self.errors.end() ? found->second : self.get_last_error();
+    }
+    return error;
+}
+} // namespace
+
 // NOLINTNEXTLINE(readability-identifier-length, modernize-use-trailing-return-type)
 NB_MODULE(mediaconch, mod) {
     mod.doc() = "Python bindings for libmediaconch Library";
 
     // // Bindings for the MediaConchLib class
-    nb::class_<MediaConch::MediaConch>(mod, "MediaConch")
-        .def(nb::init<>(), "Initialize the MediaConch library")
-        .def("add_file",         &MediaConch::MediaConch::add_file,           nb::arg("filename"),     "Add a file to the MediaConch library")
-        .def("get_report",       &MediaConch::MediaConch::get_report,         nb::arg("file_id"),      "Get report for a file")
-        .def("add_policy",       &MediaConch::MediaConch::add_policy,         nb::arg("filename"),     "Add a policy file")
-        .def("set_format",       &MediaConch::MediaConch::set_format,         nb::arg("format"),       "Set output format")
-        .def("get_last_error",   &MediaConch::MediaConch::get_last_error,                              "Get last error message");
+    nb::class_<Instance>(mod, "MediaConch",
+        "MediaConch library instance. Safe to share between threads, including on free-threaded Python: calls on the "
+        "same instance are serialized, calls on different instances run in parallel. get_last_error returns the error "
+        "of the calling thread's last failed call.")
+        .def(nb::init<>(), "Initialize the MediaConch library, rendering reports as Xml")
+        .def("add_file",         &add_file,           nb::arg("filename"),     "Add a file to the MediaConch library")
+        .def("add_files",        &add_files,          nb::arg("filenames"),    "Add files to the MediaConch library, returning their file ids and a dict of errors by index")
+        .def("get_report",       &get_report,         nb::arg("file_id"),      "Get report for a file")
+        .def("get_reports",      &get_reports,        nb::arg("file_id"), nb::arg("formats"), "Get reports for a file in several formats, then restore the output format")
+        .def("get_report_bytes", &get_report_bytes,   nb::arg("file_id"),      "Get report for a file as undecoded bytes")
+        .def("add_policy",       &add_policy,         nb::arg("filename"),     "Add a policy file")
+        .def("set_format",       &set_format,         nb::arg("format"),       "Set output format")
+        .def("get_last_error",   &get_last_error,                              "Get the error message of this thread's last failed call");
         ;
     nb::enum_<MediaConch_format_t>(mod, "MediaConch_format_t")
         .value("MediaConch_format_Text",     MediaConch_format_Text)
@@ -31,4 +183,4 @@ NB_MODULE(mediaconch, mod) {
         .value("MediaConch_format_Json",     MediaConch_format_Json)
         .value("MediaConch_format_Max",      MediaConch_format_Max)
     ;
-}
\ No newline at end of file
+}
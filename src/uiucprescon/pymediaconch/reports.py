@@ -0,0 +1,91 @@
+"""Render reports in several formats with a cache of rendered output."""
+
+from __future__ import annotations
+
+import collections
+from typing import Dict, Iterable, Optional, Tuple
+
+from uiucprescon.pymediaconch._native import mediaconch
+
+__all__ = ["ReportRenderer"]
+
+_Key = Tuple[int, "mediaconch.MediaConch_format_t"]
+
+
+class ReportRenderer:
+    """Render reports for files added to an instance, in any format.
+
+    Rendered reports are kept keyed by file id and format, so asking for
+    the same report again does not go back to the library. The renderer
+    changes the output format of ``instance`` as needed, so do not rely on
+    the format set on the instance while a renderer is using it.
+
+    Args:
+        instance: MediaConch instance the files were added to.
+        maxsize: number of rendered reports to keep, evicting the least
+            recently used. None keeps every report and 0 disables caching.
+    """
+
+    def __init__(
+        self, instance: mediaconch.MediaConch, maxsize: Optional[int] = 128
+    ) -> None:
+        self.instance = instance
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rendered: collections.OrderedDict[_Key, str] = (
+            collections.OrderedDict()
+        )
+
+    def get_report(
+        self, file_id: int, format: mediaconch.MediaConch_format_t
+    ) -> str:
+        """Get the report for a file in one format."""
+        return self.get_reports(file_id, [format])[format]
+
+    def get_reports(
+        self,
+        file_id: int,
+        formats: Iterable[mediaconch.MediaConch_format_t],
+    ) -> Dict[mediaconch.MediaConch_format_t, str]:
+        """Get the reports for a file in each of the formats.
+
+        Formats not already cached are rendered together in a single call
+        to ``MediaConch.get_reports``.
+        """
+        formats = list(dict.fromkeys(formats))
+        reports = {}
+        missing = []
+        for report_format in formats:
+            key = (file_id, report_format)
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                reports[report_format] = self._rendered[key]
+                self.hits += 1
+            else:
+                missing.append(report_format)
+                self.misses += 1
+        if missing:
+            rendered = self.instance.get_reports(file_id, missing)
+            for report_format in missing:
+                reports[report_format] = rendered[report_format]
+                self._store((file_id, report_format), rendered[report_format])
+        return {
+            report_format: reports[report_format] for report_format in formats
+        }
+
+    def _store(self, key: _Key, report: str) -> None:
+        if self.maxsize == 0:
+            return
+        self._rendered[key] = report
+        if self.maxsize is not None:
+            while len(self._rendered) > self.maxsize:
+                self._rendered.popitem(last=False)
+
+    def invalidate(self, file_id: Optional[int] = None) -> None:
+        """Forget rendered reports for one file, or for all files."""
+        if file_id is None:
+            self._rendered.clear()
+            return
+        for key in [key for key in self._rendered if key[0] == file_id]:
+            del self._rendered[key]
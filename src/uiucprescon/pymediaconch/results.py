@@ -0,0 +1,346 @@
+"""Incremental parsing of MediaConch Xml and MaXml reports."""
+
+from __future__ import annotations
+
+import dataclasses
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+__all__ = [
+    "MediaOutcome",
+    "MediaResult",
+    "PolicyOutcome",
+    "PolicyResult",
+    "RuleOutcome",
+    "RuleResult",
+    "TrackResult",
+    "iter_failures",
+    "iter_outcomes",
+    "iter_results",
+]
+
+ReportSource = Union[
+    bytes, bytearray, memoryview, str, "os.PathLike[str]", BinaryIO
+]
+
+# Outcomes from least to most severe.
+_SEVERITY = ("pass", "info", "warn", "fail")
+
+# A report passed as str, rather than the path to one, starts with markup.
+_MARKUP = re.compile(r"[\s\ufeff]*<")
+
+
+@dataclasses.dataclass(frozen=True)
+class RuleOutcome:
+    """Outcome of a single policy rule."""
+
+    media: str
+    policy: str
+    name: str
+    outcome: str
+    xpath: Optional[str] = None
+    track_type: Optional[str] = None
+    occurrence: Optional[str] = None
+    value: Optional[str] = None
+    actual: Optional[str] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class PolicyOutcome:
+    """Outcome of a policy, yielded after the rules it contains."""
+
+    media: str
+    name: str
+    outcome: str
+    rules_run: Optional[int] = None
+    pass_count: Optional[int] = None
+    fail_count: Optional[int] = None
+    parent: Optional[str] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class MediaOutcome:
+    """Overall outcome of a file, yielded after its policies.
+
+    ``outcome`` is the most severe outcome of the file's top level policies,
+    or None if no policy was applied.
+    """
+
+    ref: str
+    outcome: Optional[str]
+
+
+Outcome = Union[RuleOutcome, PolicyOutcome, MediaOutcome]
+
+
+@dataclasses.dataclass(slots=True)
+class RuleResult:
+    """Outcome of a single rule inside a :class:`PolicyResult`."""
+
+    name: str
+    outcome: str
+    xpath: Optional[str] = None
+    track_type: Optional[str] = None
+    occurrence: Optional[str] = None
+    value: Optional[str] = None
+    actual: Optional[str] = None
+
+
+@dataclasses.dataclass(slots=True)
+class PolicyResult:
+    """Outcome of a policy with its rules and nested policies."""
+
+    name: str
+    outcome: str
+    rules_run: Optional[int] = None
+    pass_count: Optional[int] = None
+    fail_count: Optional[int] = None
+    rules: List[RuleResult] = dataclasses.field(default_factory=list)
+    policies: List[PolicyResult] = dataclasses.field(default_factory=list)
+
+    def failures(self) -> Iterator[RuleResult]:
+        """Yield the failed rules of this policy and its nested policies."""
+        for rule in self.rules:
+            if rule.outcome == "fail":
+                yield rule
+        for policy in self.policies:
+            yield from policy.failures()
+
+
+@dataclasses.dataclass(slots=True)
+class TrackResult:
+    """A MediaInfo track from a MaXml report, with its fields as text."""
+
+    type: str
+    fields: Dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass(slots=True)
+class MediaResult:
+    """Everything a report says about one file.
+
+    ``tracks`` is only filled in for MaXml reports, which embed the
+    MediaInfo output. ``outcome`` is the most severe outcome of the top
+    level policies, or None if no policy was applied.
+    """
+
+    ref: str
+    outcome: Optional[str] = None
+    policies: List[PolicyResult] = dataclasses.field(default_factory=list)
+    tracks: List[TrackResult] = dataclasses.field(default_factory=list)
+
+    def failures(self) -> Iterator[RuleResult]:
+        """Yield every failed rule of every policy."""
+        for policy in self.policies:
+            yield from policy.failures()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def _worst(first: Optional[str], second: Optional[str]) -> Optional[str]:
+    if first is None:
+        return second
+    if second is None:
+        return first
+    ranks = [
+        _SEVERITY.index(outcome) if outcome in _SEVERITY else -1
+        for outcome in (first, second)
+    ]
+    return first if ranks[0] >= ranks[1] else second
+
+
+def _open(source: ReportSource) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, str) and _MARKUP.match(source):
+        return io.BytesIO(source.encode("utf-8"))
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    return source
+
+
+def iter_outcomes(source: ReportSource) -> Iterator[Outcome]:
+    """Parse a report, yielding outcomes as soon as they are read.
+
+    Works on reports produced with ``MediaConch_format_Xml`` or
+    ``MediaConch_format_MaXml``. Each rule yields a :class:`RuleOutcome`,
+    each policy a :class:`PolicyOutcome` after its rules and each file a
+    :class:`MediaOutcome` after its policies. Elements are discarded once
+    they have been read, so memory use does not grow with the report size.
+
+    Implementation checks and the embedded MediaInfo and MediaTrace
+    sections of MaXml reports are skipped.
+
+    Args:
+        source: the report as bytes, for example from
+            ``MediaConch.get_report_bytes``, the report as text from
+            ``MediaConch.get_report``, the path to a saved report or a
+            binary file object. Text starting with ``<`` is taken to be a
+            report and any other text a path.
+    """
+    stream = _open(source)
+    try:
+        yield from _parse(stream)
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def _parse(stream: BinaryIO) -> Iterator[Outcome]:
+    elements: List[ET.Element] = []
+    policies: List[str] = []
+    media: Optional[str] = None
+    media_element: Optional[ET.Element] = None
+    media_outcome: Optional[str] = None
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        name = _local_name(element.tag)
+        if event == "start":
+            elements.append(element)
+            if name == "media" and media is None and "ref" in element.attrib:
+                media = element.get("ref")
+                media_element = element
+                media_outcome = None
+            elif name == "policy" and media is not None:
+                policies.append(element.get("name", ""))
+            continue
+
+        elements.pop()
+        if media is not None:
+            if name == "rule" and policies:
+                yield RuleOutcome(
+                    media=media,
+                    policy=policies[-1],
+                    name=element.get("name", ""),
+                    outcome=element.get("outcome", ""),
+                    xpath=element.get("xpath"),
+                    track_type=element.get("tracktype"),
+                    occurrence=element.get("occurrence"),
+                    value=element.get("value"),
+                    actual=element.get("actual"),
+                )
+            elif name == "policy" and policies:
+                policies.pop()
+                outcome = element.get("outcome", "")
+                if not policies:
+                    media_outcome = _worst(media_outcome, outcome)
+                yield PolicyOutcome(
+                    media=media,
+                    name=element.get("name", ""),
+                    outcome=outcome,
+                    rules_run=_optional_int(element.get("rules_run")),
+                    pass_count=_optional_int(element.get("pass_count")),
+                    fail_count=_optional_int(element.get("fail_count")),
+                    parent=policies[-1] if policies else None,
+                )
+            elif element is media_element:
+                yield MediaOutcome(ref=media, outcome=media_outcome)
+                media = None
+                media_element = None
+
+        # Drop the element from its parent so that finished parts of the
+        # document can be garbage collected.
+        element.clear()
+        if elements and len(elements[-1]) and elements[-1][-1] is element:
+            del elements[-1][-1]
+
+
+def iter_failures(source: ReportSource) -> Iterator[RuleOutcome]:
+    """Parse a report, yielding only the rules that failed."""
+    for outcome in iter_outcomes(source):
+        if isinstance(outcome, RuleOutcome) and outcome.outcome == "fail":
+            yield outcome
+
+
+def iter_results(source: ReportSource) -> Iterator[MediaResult]:
+    """Parse a report into one :class:`MediaResult` per file.
+
+    Works on the same reports and sources as :func:`iter_outcomes`. Each
+    file's result is yielded as soon as its part of the report has been
+    read, and the parsed elements are discarded as they are converted.
+    """
+    stream = _open(source)
+    try:
+        yield from _build(stream)
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def _build(stream: BinaryIO) -> Iterator[MediaResult]:
+    elements: List[ET.Element] = []
+    policies: List[PolicyResult] = []
+    media: Optional[MediaResult] = None
+    media_element: Optional[ET.Element] = None
+    track: Optional[TrackResult] = None
+    track_element: Optional[ET.Element] = None
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        name = _local_name(element.tag)
+        if event == "start":
+            elements.append(element)
+            if name == "media" and media is None and "ref" in element.attrib:
+                media = MediaResult(ref=element.get("ref", ""))
+                media_element = element
+            elif name == "policy" and media is not None:
+                # Policy attributes are complete at the start tag, so the
+                # policy can be linked in before its rules are read.
+                policy = PolicyResult(
+                    name=element.get("name", ""),
+                    outcome=element.get("outcome", ""),
+                    rules_run=_optional_int(element.get("rules_run")),
+                    pass_count=_optional_int(element.get("pass_count")),
+                    fail_count=_optional_int(element.get("fail_count")),
+                )
+                parent = policies[-1].policies if policies else media.policies
+                parent.append(policy)
+                policies.append(policy)
+            elif (
+                name == "track"
+                and media is not None
+                and not policies
+                and "type" in element.attrib
+            ):
+                track = TrackResult(type=element.get("type", ""))
+                track_element = element
+                media.tracks.append(track)
+            continue
+
+        elements.pop()
+        if media is not None:
+            if name == "rule" and policies:
+                policies[-1].rules.append(
+                    RuleResult(
+                        name=element.get("name", ""),
+                        outcome=element.get("outcome", ""),
+                        xpath=element.get("xpath"),
+                        track_type=element.get("tracktype"),
+                        occurrence=element.get("occurrence"),
+                        value=element.get("value"),
+                        actual=element.get("actual"),
+                    )
+                )
+            elif name == "policy" and policies:
+                policy = policies.pop()
+                if not policies:
+                    media.outcome = _worst(media.outcome, policy.outcome)
+            elif track is not None and element is track_element:
+                track = None
+                track_element = None
+            elif track is not None and elements[-1] is track_element:
+                track.fields[name] = element.text or ""
+            elif element is media_element:
+                yield media
+                media = None
+                media_element = None
+
+        element.clear()
+        if elements and len(elements[-1]) and elements[-1][-1] is element:
+            del elements[-1][-1]
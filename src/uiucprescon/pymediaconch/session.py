@@ -0,0 +1,238 @@
+"""MediaConch instance with bounded memory for long-running processes."""
+
+from __future__ import annotations
+
+import itertools
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import (
+    Policy,
+    PolicySource,
+    StrPath,
+    add_policies,
+    add_policy,
+)
+
+__all__ = ["MediaConchSession"]
+
+
+class _Generation:
+    """One native instance and the session file ids that live in it."""
+
+    def __init__(self, instance: mediaconch.MediaConch) -> None:
+        self.instance = instance
+        self.added = 0
+        self.live: Set[int] = set()
+
+
+class MediaConchSession:
+    """MediaConch instance whose memory can be released.
+
+    libmediaconch keeps the analysis of every file added to an instance for
+    the life of the instance and has no call to drop a single file. A
+    session therefore hands out its own file ids, and it replaces the
+    native instance once none of its files are still in use. The format
+    and policies are set up again on each new instance.
+
+    With ``max_files`` set, a new instance is started after every
+    ``max_files`` files. The files in the instance before that are evicted
+    together once the next instance is full as well, so at most
+    ``2 * max_files`` analyses are held at any time. Without ``max_files``
+    memory is only released by :meth:`clear`. Asking for the report of a
+    removed or evicted file raises KeyError. Setting up an instance raises
+    ValueError if one of the policies cannot be loaded.
+
+    Use as a context manager, or call :meth:`clear` when done.
+
+    Unlike :class:`MediaConch`, a session must only be used by one thread
+    at a time. Give each thread its own session, or share them through an
+    :class:`~uiucprescon.pymediaconch.pool.InstancePool`.
+    """
+
+    def __init__(
+        self,
+        policies: Iterable[PolicySource] = (),
+        format: Optional[mediaconch.MediaConch_format_t] = None,
+        max_files: Optional[int] = None,
+    ) -> None:
+        if max_files is not None and max_files < 1:
+            raise ValueError("max_files must be at least 1")
+        self.max_files = max_files
+        self._policies: List[PolicySource] = []
+        self._format = format
+        self._ids = itertools.count()
+        self._files: Dict[int, Tuple[_Generation, int]] = {}
+        self._generations: List[_Generation] = []
+        self._last_error = ""
+        for policy in policies:
+            self._policies.append(
+                policy if isinstance(policy, Policy) else os.fspath(policy)
+            )
+
+    def _new_generation(self) -> _Generation:
+        instance = mediaconch.MediaConch()
+        if self._format is not None:
+            instance.set_format(self._format)
+        add_policies(instance, self._policies)
+        generation = _Generation(instance)
+        self._generations.append(generation)
+        return generation
+
+    def _is_full(self, generation: _Generation) -> bool:
+        if self.max_files is None:
+            return False
+        return generation.added >= self.max_files
+
+    def _current(self) -> _Generation:
+        if self._generations and not self._is_full(self._generations[-1]):
+            return self._generations[-1]
+        # The current instance is full. Evict everything older than it, and
+        # the full instance itself if none of its files are in use.
+        for old in self._generations[:-1]:
+            self._drop(old)
+        if self._generations and not self._generations[-1].live:
+            self._drop(self._generations[-1])
+        return self._new_generation()
+
+    def _drop(self, generation: _Generation) -> None:
+        for file_id in generation.live:
+            del self._files[file_id]
+        generation.live.clear()
+        self._generations.remove(generation)
+
+    @property
+    def format(self) -> Optional[mediaconch.MediaConch_format_t]:
+        """Output format of every instance, or None for the default."""
+        return self._format
+
+    @property
+    def policies(self) -> Tuple[PolicySource, ...]:
+        """Policies applied to every instance, in the order they were added."""
+        return tuple(self._policies)
+
+    def _lookup(self, file_id: int) -> Tuple[_Generation, int]:
+        try:
+            return self._files[file_id]
+        except KeyError:
+            raise KeyError(
+                f"File id {file_id} was removed or evicted"
+            ) from None
+
+    def add_file(self, filename: StrPath) -> int:
+        """Add a file, returning a session file id or -1 on error."""
+        generation = self._current()
+        native_id = generation.instance.add_file(os.fspath(filename))
+        generation.added += 1
+        if native_id < 0:
+            self._last_error = generation.instance.get_last_error()
+            return native_id
+        file_id = next(self._ids)
+        generation.live.add(file_id)
+        self._files[file_id] = (generation, native_id)
+        return file_id
+
+    def get_report(self, file_id: int) -> str:
+        """Get the report for a session file id."""
+        generation, native_id = self._lookup(file_id)
+        return generation.instance.get_report(native_id)
+
+    def get_report_bytes(self, file_id: int) -> bytes:
+        """Get the report for a session file id as undecoded bytes."""
+        generation, native_id = self._lookup(file_id)
+        return generation.instance.get_report_bytes(native_id)
+
+    def get_reports(
+        self,
+        file_id: int,
+        formats: Iterable[mediaconch.MediaConch_format_t],
+    ) -> Dict[mediaconch.MediaConch_format_t, str]:
+        """Get the reports for a session file id in several formats.
+
+        The session's output format is restored afterwards.
+        """
+        generation, native_id = self._lookup(file_id)
+        return generation.instance.get_reports(native_id, list(formats))
+
+    def add_policy(self, policy: PolicySource) -> int:
+        """Add a policy to this and every later instance.
+
+        A policy that the current instance fails to load is not kept for
+        later instances.
+        """
+        if not isinstance(policy, Policy):
+            policy = os.fspath(policy)
+        result = 0
+        for generation in self._generations:
+            result = add_policy(generation.instance, policy)
+            if result < 0:
+                self._last_error = generation.instance.get_last_error()
+                return result
+        self._policies.append(policy)
+        return result
+
+    def set_format(self, format: mediaconch.MediaConch_format_t) -> int:
+        """Set the output format of this and every later instance."""
+        self._format = format
+        result = 0
+        for generation in self._generations:
+            result = generation.instance.set_format(format)
+        return result
+
+    def get_last_error(self) -> str:
+        """Get the last error message."""
+        return self._last_error
+
+    def remove_file(self, file_id: int) -> None:
+        """Forget a file.
+
+        Memory is released once every file of an instance has been removed
+        and the instance is no longer accepting new files, which needs
+        ``max_files`` to be set.
+        """
+        generation, _ = self._lookup(file_id)
+        del self._files[file_id]
+        generation.live.discard(file_id)
+        accepting = (
+            generation is self._generations[-1]
+            and not self._is_full(generation)
+        )
+        if not generation.live and not accepting:
+            self._generations.remove(generation)
+
+    def warm(self) -> None:
+        """Set up the native instance now instead of on the next file."""
+        self._current()
+
+    def reset(self) -> None:
+        """Forget every file, keeping the instance that takes new files.
+
+        Unlike :meth:`clear`, the next file does not have to wait for a new
+        instance to be set up. The analyses already in that instance are
+        only released when it is rotated out, so use ``max_files`` to bound
+        memory.
+        """
+        self._files.clear()
+        keep = [
+            generation for generation in self._generations[-1:]
+            if not self._is_full(generation)
+        ]
+        for generation in keep:
+            generation.live.clear()
+        self._generations[:] = keep
+        self._last_error = ""
+
+    def clear(self) -> None:
+        """Forget every file and release the native instances."""
+        self._files.clear()
+        self._generations.clear()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __enter__(self) -> MediaConchSession:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.clear()
@@ -0,0 +1,216 @@
+"""Recognize media files from their first bytes, before a full analysis."""
+
+from __future__ import annotations
+
+import dataclasses
+import fnmatch
+import os
+from typing import Callable, FrozenSet, Optional, Sequence, Tuple, Union
+
+__all__ = ["KINDS", "MediaFilter", "sniff"]
+
+StrPath = Union[str, "os.PathLike[str]"]
+
+DEFAULT_READ_SIZE = 4096
+
+_ISO_BMFF_BOXES = {
+    b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid"
+}
+_MXF_PARTITION_KEY = bytes.fromhex("060e2b34020501010d010201")
+_TS_PACKET_SIZE = 188
+
+
+def _riff(form_types: Tuple[bytes, ...]) -> Callable[[bytes], bool]:
+    def match(header: bytes) -> bool:
+        return (
+            header[:4] in (b"RIFF", b"RF64", b"BW64")
+            and header[8:12] in form_types
+        )
+    return match
+
+
+def _transport_stream(header: bytes) -> bool:
+    # Sync bytes at the start of the first packets, with or without the
+    # 4 byte timecode of M2TS.
+    for offset, size in ((0, _TS_PACKET_SIZE), (4, _TS_PACKET_SIZE + 4)):
+        positions = range(offset, min(len(header), offset + 3 * size), size)
+        if len(positions) >= 2 and all(
+            header[position] == 0x47 for position in positions
+        ):
+            return True
+    return False
+
+
+# Bit rates in kbit/s by bit rate index, for MPEG-1 layers I, II and III
+# and for MPEG-2 and 2.5 layer I and layers II and III. Index 0 is the
+# free format, whose frame length cannot be worked out from the header.
+_MPEG1_BIT_RATES = (
+    (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+)
+_MPEG2_BIT_RATES = (
+    (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+)
+# Sample rates by sample rate index, for MPEG-1, 2 and 2.5.
+_MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+
+def _mpeg_frame_length(header: bytes) -> Optional[int]:
+    """Length of the MPEG audio frame header starts with, if it is one."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = header[1] >> 3 & 0x3
+    layer = 4 - (header[1] >> 1 & 0x3)
+    bit_rate_index = header[2] >> 4
+    sample_rate_index = header[2] >> 2 & 0x3
+    padding = header[2] >> 1 & 0x1
+    if (
+        version == 1
+        or layer == 4
+        or bit_rate_index in (0, 15)
+        or sample_rate_index == 3
+    ):
+        return None
+    if version == 3:
+        kbits = _MPEG1_BIT_RATES[layer - 1][bit_rate_index]
+    else:
+        kbits = _MPEG2_BIT_RATES[min(layer, 2) - 1][bit_rate_index]
+    bit_rate = kbits * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        return (12 * bit_rate // sample_rate + padding) * 4
+    if layer == 3 and version != 3:
+        return 72 * bit_rate // sample_rate + padding
+    return 144 * bit_rate // sample_rate + padding
+
+
+def _mpeg_audio(header: bytes) -> bool:
+    if header[:3] == b"ID3":
+        return True
+    # Two bytes of frame sync are too common, in UTF-16 byte order marks
+    # for one, so the next frame has to follow where this one ends.
+    length = _mpeg_frame_length(header)
+    return (
+        length is not None
+        and _mpeg_frame_length(header[length:length + 4]) is not None
+    )
+
+
+#: Container signatures, checked in order. Each kind name maps to a test on
+#: the first bytes of the file.
+_SIGNATURES: Tuple[Tuple[str, Callable[[bytes], bool]], ...] = (
+    ("matroska", lambda header: header[:4] == b"\x1a\x45\xdf\xa3"),
+    ("mp4", lambda header: header[4:8] in _ISO_BMFF_BOXES),
+    ("wav", _riff((b"WAVE",))),
+    ("avi", _riff((b"AVI ", b"AVIX"))),
+    (
+        "aiff",
+        lambda header: header[:4] == b"FORM"
+        and header[8:12] in (b"AIFF", b"AIFC"),
+    ),
+    ("dpx", lambda header: header[:4] in (b"SDPX", b"XPDS")),
+    # MXF files may start with a run-in before the header partition.
+    ("mxf", lambda header: _MXF_PARTITION_KEY in header),
+    ("mpeg-ps", lambda header: header[:4] == b"\x00\x00\x01\xba"),
+    ("mpeg-video", lambda header: header[:4] == b"\x00\x00\x01\xb3"),
+    ("mpeg-ts", _transport_stream),
+    ("dv", lambda header: header[:3] == b"\x1f\x07\x00"),
+    ("ogg", lambda header: header[:4] == b"OggS"),
+    ("flac", lambda header: header[:4] == b"fLaC"),
+    (
+        "asf",
+        lambda header: header[:8] == b"\x30\x26\xb2\x75\x8e\x66\xcf\x11",
+    ),
+    ("flv", lambda header: header[:3] == b"FLV"),
+    ("tiff", lambda header: header[:4] in (b"II*\x00", b"MM\x00*")),
+    (
+        "jpeg2000",
+        lambda header: header[:12]
+        == b"\x00\x00\x00\x0cjP  \r\n\x87\n",
+    ),
+    ("exr", lambda header: header[:4] == b"\x76\x2f\x31\x01"),
+    ("mp3", _mpeg_audio),
+)
+
+#: Every kind of file :func:`sniff` can recognize.
+KINDS: FrozenSet[str] = frozenset(kind for kind, _ in _SIGNATURES)
+
+
+def sniff(
+    path: StrPath, read_size: int = DEFAULT_READ_SIZE
+) -> Optional[str]:
+    """Guess the container of a file from its first bytes.
+
+    Returns:
+        One of :data:`KINDS`, or None if the file is not recognized or
+        cannot be read.
+    """
+    try:
+        with open(path, "rb") as file_handle:
+            header = file_handle.read(read_size)
+    except OSError:
+        return None
+    for kind, matches in _SIGNATURES:
+        if matches(header):
+            return kind
+    return None
+
+
+@dataclasses.dataclass(frozen=True)
+class MediaFilter:
+    """Decide which files are worth a full MediaConch analysis.
+
+    Rules are applied in this order:
+
+    1. a file whose name matches one of ``exclude`` is skipped,
+    2. a file whose name matches one of ``include`` is kept,
+    3. otherwise the file is kept if :func:`sniff` recognizes it as one of
+       ``kinds`` and not one of ``exclude_kinds``.
+
+    Patterns are shell style, as in :mod:`fnmatch`, and are matched against
+    the file name, or against the whole path if they contain a ``/``.
+    Call the filter with a path to apply it. Filters pickle, so they can be
+    sent to worker processes.
+
+    Args:
+        kinds: kinds of file to keep. Every kind in :data:`KINDS` if None.
+        exclude_kinds: kinds of file to skip.
+        include: patterns of files to always keep.
+        exclude: patterns of files to always skip.
+        read_size: bytes read from the start of each file.
+    """
+
+    kinds: Optional[FrozenSet[str]] = None
+    exclude_kinds: FrozenSet[str] = frozenset()
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
+    read_size: int = DEFAULT_READ_SIZE
+
+    def __post_init__(self) -> None:
+        unknown = (set(self.kinds or ()) | set(self.exclude_kinds)) - KINDS
+        if unknown:
+            raise ValueError(f"Unknown kinds: {', '.join(sorted(unknown))}")
+
+    def _matches(self, path: str, patterns: Sequence[str]) -> bool:
+        name = os.path.basename(path)
+        return any(
+            fnmatch.fnmatch(path if "/" in pattern else name, pattern)
+            for pattern in patterns
+        )
+
+    def __call__(self, path: StrPath) -> bool:
+        path = os.fspath(path)
+        if self._matches(path, self.exclude):
+            return False
+        if self._matches(path, self.include):
+            return True
+        kind = sniff(path, self.read_size)
+        if kind is None or kind in self.exclude_kinds:
+            return False
+        return self.kinds is None or kind in self.kinds
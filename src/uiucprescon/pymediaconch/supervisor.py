@@ -0,0 +1,356 @@
+"""Worker processes with per-file timeouts, memory limits and progress.
+
+A call into MediaInfoLib cannot be interrupted from Python, so a file that
+makes it hang or grow without bound ties up its worker for good. Here each
+worker is a process of its own that can be killed. A worker that runs
+past the time limit or the memory limit is killed and replaced, and the
+file it was working on is reported as failed.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+)
+
+from uiucprescon.pymediaconch import batch
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import Policy, PolicySource, StrPath
+
+__all__ = ["Progress", "SupervisedValidator"]
+
+
+@dataclasses.dataclass(frozen=True)
+class Progress:
+    """How far the analysis of a file has got.
+
+    ``bytes_read`` is the read position of the worker in the file, or None
+    where it cannot be found out. It is only available on Linux, read from
+    ``/proc``, and it is a hint: MediaInfoLib seeks around the file and
+    does not read every byte.
+    """
+
+    path: str
+    bytes_read: Optional[int]
+    size: Optional[int]
+    seconds: float
+
+
+def _run_worker(
+    connection: multiprocessing.connection.Connection,
+    policies: Sequence[PolicySource],
+    format_name: Optional[str],
+    max_bytes: Optional[int],
+    media_filter: Optional[batch.MediaFilter],
+) -> None:
+    session = batch.initialize_process_worker(
+        policies, format_name, max_bytes, media_filter
+    )
+    # Load the extension and the policies before reporting ready, so that
+    # the time they take is not counted against the first file.
+    session.warm()
+    connection.send(None)
+    while True:
+        path = connection.recv()
+        if path is None:
+            return
+        connection.send(batch.validate_in_process_worker(path))
+
+
+def _resident_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _read_position(pid: int, path: str) -> Optional[int]:
+    descriptors = f"/proc/{pid}/fd"
+    try:
+        names = os.listdir(descriptors)
+    except OSError:
+        return None
+    for name in names:
+        try:
+            if os.readlink(os.path.join(descriptors, name)) != path:
+                continue
+            with open(f"/proc/{pid}/fdinfo/{name}", encoding="ascii") as info:
+                for line in info:
+                    if line.startswith("pos:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class _Worker:
+    def __init__(self, context, args) -> None:
+        self.connection: multiprocessing.connection.Connection
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_run_worker, args=(child, *args), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.path: Optional[str] = None
+        self.real_path = ""
+        self.size: Optional[int] = None
+        # Set once the process has reported that it is set up, or when a
+        # file is started after that. None until then.
+        self.ready = False
+        self.started: Optional[float] = None
+        self.position: Optional[int] = None
+
+    def start(self, path: str) -> None:
+        self.path = path
+        self.real_path = os.path.realpath(path)
+        try:
+            self.size = os.path.getsize(path)
+        except OSError:
+            self.size = None
+        self.position = None
+        self.started = time.monotonic() if self.ready else None
+        self.connection.send(path)
+
+    def set_ready(self) -> None:
+        self.ready = True
+        if self.path is not None:
+            self.started = time.monotonic()
+
+    def finish(self) -> str:
+        path = self.path
+        assert path is not None
+        self.path = None
+        return path
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class SupervisedValidator:
+    """Validate files in worker processes that are watched over.
+
+    Each worker process keeps a configured instance, as in
+    :class:`~uiucprescon.pymediaconch.batch.ProcessPoolValidator`, but gets
+    one file at a time so that a stuck file only holds up one worker:
+
+    * a file that takes longer than ``timeout`` seconds is reported with
+      ``timed_out`` set, and its worker is killed and replaced. The time
+      is counted from when the worker is set up, so starting a worker and
+      loading the policies do not count against its first file,
+    * a worker whose resident memory goes over ``max_memory`` bytes is
+      killed and replaced, and the file it was on is reported as an error,
+    * ``progress`` is called with a :class:`Progress` for every running
+      file each ``poll_interval`` seconds in which it moved on,
+    * once ``cancel`` is cancelled no more files are started, and the files
+      being worked on are stopped and reported as cancelled.
+
+    Memory limits and progress rely on ``/proc`` and only work on Linux.
+    Use as a context manager, or call :meth:`close` when done.
+
+    Args:
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format: report format. The library default is used if not set.
+        max_workers: number of worker processes. Defaults to the number of
+            CPUs.
+        timeout: seconds allowed per file. No limit if None.
+        max_memory: resident bytes allowed per worker. No limit if None.
+        max_bytes: only analyze the first ``max_bytes`` of larger files.
+        poll_interval: seconds between checks on the running files.
+        media_filter: only validate the files it returns True for. Other
+            files are left out of the results. Must be picklable.
+    """
+
+    def __init__(
+        self,
+        policies: Sequence[PolicySource] = (),
+        format: Optional[mediaconch.MediaConch_format_t] = None,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_memory: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        poll_interval: float = 0.5,
+        media_filter: Optional[batch.MediaFilter] = None,
+    ) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context()
+        self._args = (
+            tuple(
+                policy if isinstance(policy, Policy) else os.fspath(policy)
+                for policy in policies
+            ),
+            None if format is None else format.name,
+            max_bytes,
+            media_filter,
+        )
+        self._workers: List[_Worker] = []
+        #: Number of workers killed and replaced.
+        self.recycled = 0
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        self._workers.remove(worker)
+        self.recycled += 1
+
+    def _idle_worker(self) -> Optional[_Worker]:
+        for worker in self._workers:
+            if worker.path is None:
+                return worker
+        if len(self._workers) < self.max_workers:
+            worker = _Worker(self._context, self._args)
+            self._workers.append(worker)
+            return worker
+        return None
+
+    def _over_memory(self, worker: _Worker) -> bool:
+        if self.max_memory is None:
+            return False
+        resident = _resident_bytes(worker.process.pid)
+        return resident is not None and resident > self.max_memory
+
+    def validate(
+        self,
+        paths: Iterable[StrPath],
+        progress: Optional[Callable[[Progress], None]] = None,
+        cancel: Optional[batch.CancellationToken] = None,
+    ) -> Iterator[batch.ValidationResult]:
+        """Validate files, yielding each result as soon as it is ready."""
+        paths = iter(paths)
+        exhausted = False
+        try:
+            while True:
+                cancelled = cancel is not None and cancel.cancelled
+                while not (exhausted or cancelled):
+                    worker = self._idle_worker()
+                    if worker is None:
+                        break
+                    path = next(paths, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    worker.start(os.fspath(path))
+                busy = {
+                    worker.connection: worker
+                    for worker in self._workers if worker.path is not None
+                }
+                if not busy:
+                    return
+                if cancelled:
+                    for worker in busy.values():
+                        path = worker.finish()
+                        self._replace(worker)
+                        yield batch.ValidationResult(path, error="Cancelled")
+                    return
+                yield from self._collect(busy)
+                yield from self._check(busy.values(), progress)
+        finally:
+            # Abandon the files still running if the caller stopped early.
+            for worker in list(self._workers):
+                if worker.path is not None:
+                    self._replace(worker)
+
+    def _collect(
+        self, busy: Dict[multiprocessing.connection.Connection, _Worker]
+    ) -> Iterator[batch.ValidationResult]:
+        ready = multiprocessing.connection.wait(
+            list(busy), timeout=self.poll_interval
+        )
+        for connection, worker in busy.items():
+            if connection not in ready:
+                continue
+            try:
+                result: Optional[batch.ValidationResult] = connection.recv()
+            except EOFError:
+                exitcode = worker.process.exitcode
+                path = worker.finish()
+                self._replace(worker)
+                yield batch.ValidationResult(
+                    path, error=f"Worker exited with code {exitcode}"
+                )
+                continue
+            if result is None:
+                # The worker is set up, and starts on its file now.
+                worker.set_ready()
+                continue
+            worker.finish()
+            if not result.skipped:
+                yield result
+            if self._over_memory(worker):
+                # Done, but keep the next file from pushing it further.
+                self._replace(worker)
+
+    def _check(
+        self,
+        workers: Iterable[_Worker],
+        progress: Optional[Callable[[Progress], None]],
+    ) -> Iterator[batch.ValidationResult]:
+        now = time.monotonic()
+        for worker in list(workers):
+            if worker.path is None or worker.started is None:
+                continue
+            seconds = now - worker.started
+            if self.timeout is not None and seconds > self.timeout:
+                path = worker.finish()
+                self._replace(worker)
+                yield batch.ValidationResult(
+                    path,
+                    error=f"Timed out after {self.timeout} seconds",
+                    timed_out=True,
+                )
+            elif self._over_memory(worker):
+                path = worker.finish()
+                self._replace(worker)
+                yield batch.ValidationResult(
+                    path,
+                    error=f"Worker used more than {self.max_memory} bytes",
+                )
+            elif progress is not None:
+                position = _read_position(
+                    worker.process.pid, worker.real_path
+                )
+                if position != worker.position:
+                    worker.position = position
+                    progress(
+                        Progress(worker.path, position, worker.size, seconds)
+                    )
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+
+    def __enter__(self) -> SupervisedValidator:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,311 @@
+"""Revalidate files as they appear or change in watched directories."""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import dataclasses
+import os
+import select
+import struct
+import sys
+import time
+from typing import (
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from uiucprescon.pymediaconch import batch
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import PolicySource
+
+__all__ = ["WatchEvent", "watch"]
+
+# inotify constants from <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+_FileState = Tuple[int, int]
+
+
+@dataclasses.dataclass(frozen=True)
+class WatchEvent:
+    """A file was validated because it is ``"new"`` or ``"changed"``."""
+
+    kind: str
+    result: batch.ValidationResult
+
+
+def _walk(directory: str, recursive: bool = True) -> Iterator[str]:
+    try:
+        with os.scandir(directory) as iterator:
+            entries = list(iterator)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from _walk(entry.path)
+        elif entry.is_file():
+            yield entry.path
+
+
+def _state(path: str) -> Optional[_FileState]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _PollingSource:
+    """Reports every file under the roots on every poll."""
+
+    def __init__(self, roots: Sequence[str]) -> None:
+        self.roots = roots
+
+    def wait(self, timeout: float) -> Iterator[str]:
+        time.sleep(timeout)
+        return self.all_files()
+
+    def all_files(self) -> Iterator[str]:
+        for root in self.roots:
+            yield from _walk(root)
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifySource:
+    """Reports only the files in directories that inotify saw change."""
+
+    def __init__(self, roots: Sequence[str]) -> None:
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c"), use_errno=True
+        )
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.roots = roots
+        self._directories: Dict[int, str] = {}
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_tree(self, directory: str) -> None:
+        self._add_watch(directory)
+        for current, subdirectories, _ in os.walk(directory):
+            for subdirectory in subdirectories:
+                self._add_watch(os.path.join(current, subdirectory))
+
+    def _add_watch(self, directory: str) -> None:
+        descriptor = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), _WATCH_MASK
+        )
+        if descriptor >= 0:
+            self._directories[descriptor] = directory
+
+    def wait(self, timeout: float) -> Iterator[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return iter(())
+        changed_directories: Set[str] = set()
+        new_directories: List[str] = []
+        data = self._read_events()
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = _EVENT_HEADER.unpack_from(
+                data, offset
+            )
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if descriptor == -1 and mask & _IN_Q_OVERFLOW:
+                # Events were dropped, so any file may have changed and
+                # new directories may have gone unwatched.
+                for root in self.roots:
+                    self._add_tree(root)
+                return self.all_files()
+            directory = self._directories.get(descriptor)
+            if directory is None:
+                continue
+            if mask & _IN_ISDIR:
+                new_directories.append(os.path.join(directory, name))
+            else:
+                changed_directories.add(directory)
+        for directory in new_directories:
+            self._add_tree(directory)
+        return self._changed_files(changed_directories, new_directories)
+
+    def _read_events(self) -> bytes:
+        chunks = []
+        while True:
+            try:
+                chunks.append(os.read(self._fd, 64 * 1024))
+            except BlockingIOError:
+                return b"".join(chunks)
+
+    def _changed_files(
+        self, directories: Iterable[str], new_directories: Iterable[str]
+    ) -> Iterator[str]:
+        for directory in directories:
+            yield from _walk(directory, recursive=False)
+        for directory in new_directories:
+            yield from _walk(directory)
+
+    def all_files(self) -> Iterator[str]:
+        for root in self.roots:
+            yield from _walk(root)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def _open_source(roots: Sequence[str], use_inotify: Optional[bool]):
+    if use_inotify is None:
+        use_inotify = sys.platform.startswith("linux")
+    if use_inotify:
+        try:
+            return _InotifySource(roots)
+        except (OSError, AttributeError):
+            # No usable inotify, for example on a network share or a libc
+            # without it. Fall back to polling.
+            pass
+    return _PollingSource(roots)
+
+
+def _open_validator(
+    policies: Sequence[PolicySource],
+    format: Optional[mediaconch.MediaConch_format_t],
+    max_workers: Optional[int],
+    mode: str,
+    max_bytes: Optional[int],
+    media_filter: Optional[batch.MediaFilter],
+) -> Union[batch.ThreadPoolValidator, batch.ProcessPoolValidator]:
+    if mode == "thread":
+        return batch.ThreadPoolValidator(
+            policies, format, max_workers, max_bytes, media_filter
+        )
+    if mode == "process":
+        return batch.ProcessPoolValidator(
+            policies,
+            format,
+            max_workers,
+            chunksize=1,
+            max_bytes=max_bytes,
+            media_filter=media_filter,
+        )
+    raise ValueError(f"Unknown mode {mode!r}, expected 'thread' or 'process'")
+
+
+def watch(
+    roots: Iterable[str],
+    policies: Sequence[PolicySource] = (),
+    format: Optional[mediaconch.MediaConch_format_t] = None,
+    max_workers: Optional[int] = None,
+    mode: str = "thread",
+    max_bytes: Optional[int] = None,
+    settle: float = 5.0,
+    interval: float = 2.0,
+    initial: bool = True,
+    use_inotify: Optional[bool] = None,
+    media_filter: Optional[batch.MediaFilter] = None,
+) -> Generator[WatchEvent, None, None]:
+    """Validate new and changed files under ``roots`` as they settle.
+
+    A file is validated once its size and modification time have stayed
+    the same for ``settle`` seconds, so files that are still being copied
+    or written are left alone until they are complete. A file is only
+    validated again when its size or modification time changes.
+
+    On Linux, inotify is used to find out which directories changed so
+    only those are listed again. Elsewhere, or if inotify is unavailable,
+    the whole tree is polled every ``interval`` seconds.
+
+    The workers, and the policies loaded in them, are started once and
+    kept for as long as the watch runs. It runs until the generator is
+    closed.
+
+    Args:
+        roots: directories to watch.
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format: report format. The library default is used if not set.
+        max_workers: number of workers validating settled files.
+        mode: ``"thread"`` or ``"process"`` workers.
+        max_bytes: only analyze the first ``max_bytes`` of larger files.
+        settle: seconds a file must be unchanged before it is validated.
+        interval: seconds between polls, and the longest time between
+            checks on files that are settling.
+        initial: validate the files already present when watching starts.
+        use_inotify: force inotify on or off. Detected if None.
+        media_filter: only validate the files it returns True for, such as
+            a :class:`~uiucprescon.pymediaconch.sniff.MediaFilter`. Files
+            it turns down are checked again only when they change.
+    """
+    roots = [os.fspath(root) for root in roots]
+    validator = _open_validator(
+        policies, format, max_workers, mode, max_bytes, media_filter
+    )
+    try:
+        source = _open_source(roots, use_inotify)
+    except BaseException:
+        validator.close()
+        raise
+    validated: Dict[str, _FileState] = {}
+    settling: Dict[str, Tuple[_FileState, float]] = {}
+    if not initial:
+        for path in source.all_files():
+            state = _state(path)
+            if state is not None:
+                validated[path] = state
+    candidates: Iterable[str] = source.all_files() if initial else ()
+    try:
+        while True:
+            now = time.monotonic()
+            for path in set(candidates) | set(settling):
+                state = _state(path)
+                if state is None:
+                    settling.pop(path, None)
+                    validated.pop(path, None)
+                elif validated.get(path) == state:
+                    settling.pop(path, None)
+                elif path not in settling or settling[path][0] != state:
+                    settling[path] = (state, now)
+
+            ready = [
+                path for path, (_, since) in settling.items()
+                if now - since >= settle
+            ]
+            for path, result in zip(ready, validator.validate(ready)):
+                kind = "changed" if path in validated else "new"
+                validated[path] = settling.pop(path)[0]
+                # Files turned down by the media filter are not reported.
+                if not result.skipped:
+                    yield WatchEvent(kind, result)
+
+            timeout = interval
+            if settling:
+                next_ready = min(since for _, since in settling.values())
+                timeout = max(
+                    0.0, min(interval, next_ready + settle - time.monotonic())
+                )
+            candidates = source.wait(timeout)
+    finally:
+        source.close()
+        validator.close()
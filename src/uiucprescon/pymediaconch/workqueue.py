@@ -0,0 +1,394 @@
+"""Work queue in a shared directory for validating across several hosts.
+
+The queue is a spool directory with one file per job, so it needs nothing
+but a filesystem that every worker can reach, such as an NFS mount. Jobs
+move between the subdirectories with ``rename``, which is atomic on local
+filesystems and on NFS, so only one worker can claim a job::
+
+    <queue>/pending/<shard>/<job id>.<attempt>   waiting to be claimed
+    <queue>/claimed/<job id>.<attempt>.<worker>  being validated
+    <queue>/done/<job id>.json                   result
+    <queue>/failed/<job id>                      gave up after max_attempts
+
+Pending jobs are spread over 16 shard directories named after the first
+hex digit of the job id. Each claim only lists the shards it needs.
+Workers visit the shards in random order and start at a random entry in
+each, so they rarely race each other for the same job.
+
+A claimed job holds a lease that its worker renews while it works. If the
+worker dies, the lease runs out and the job goes back to pending for
+another worker, up to ``max_attempts`` times. Lease times are compared
+against the file server's clock, so hosts do not need synchronized clocks.
+SQLite is not used because its locking is not reliable over NFS.
+
+Jobs are run at least once: a worker that stalls past its lease may finish
+a job that has already been handed to another worker. Both write the same
+result file and the last one wins.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from uiucprescon.pymediaconch import batch
+from uiucprescon.pymediaconch._native import mediaconch
+from uiucprescon.pymediaconch.policies import PolicySource, StrPath
+from uiucprescon.pymediaconch.session import MediaConchSession
+
+__all__ = ["Job", "WorkQueue", "run_worker"]
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+_STATES = (PENDING, CLAIMED, DONE, FAILED)
+_SHARDS = "0123456789abcdef"
+
+
+@dataclasses.dataclass(frozen=True)
+class Job:
+    """A path claimed from the queue by this worker."""
+
+    id: str
+    path: str
+    #: 0 the first time a job is claimed, counting up with each retry.
+    attempt: int
+    claim_file: str
+
+
+def job_id(path: str) -> str:
+    """Get the id of the job for a path."""
+    return hashlib.sha256(os.fsencode(path)).hexdigest()[:32]
+
+
+class WorkQueue:
+    """Shared spool directory of paths to validate.
+
+    Args:
+        directory: queue directory, created if it does not exist.
+        lease: seconds a claimed job is reserved without being renewed.
+        max_attempts: times a job is claimed before it is given up.
+        worker: name of this worker, unique per process. Generated from the
+            host name and process id if not given.
+        requeue_interval: seconds between the checks :meth:`claim` makes
+            for jobs whose lease ran out. A quarter of ``lease`` if not
+            given.
+    """
+
+    def __init__(
+        self,
+        directory: StrPath,
+        lease: float = 300.0,
+        max_attempts: int = 3,
+        worker: Optional[str] = None,
+        requeue_interval: Optional[float] = None,
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.directory = os.fspath(directory)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.worker = worker or (
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        ).replace(".", "_")
+        self.requeue_interval = (
+            lease / 4 if requeue_interval is None else requeue_interval
+        )
+        for state in _STATES:
+            os.makedirs(os.path.join(self.directory, state), exist_ok=True)
+        for shard in _SHARDS:
+            os.makedirs(
+                os.path.join(self.directory, PENDING, shard), exist_ok=True
+            )
+        self._clock = os.path.join(self.directory, ".clock")
+        self._last_requeue: Optional[float] = None
+
+    def _state_path(self, state: str, name: str) -> str:
+        if state == PENDING:
+            return os.path.join(self.directory, state, name[0], name)
+        return os.path.join(self.directory, state, name)
+
+    def _list(self, state: str) -> List[str]:
+        if state == PENDING:
+            return sorted(
+                name
+                for shard in _SHARDS
+                for name in os.listdir(
+                    os.path.join(self.directory, PENDING, shard)
+                )
+            )
+        return sorted(os.listdir(os.path.join(self.directory, state)))
+
+    def _now(self) -> float:
+        # Touching a file sets its time from the file server's clock, which
+        # is also the clock that stamps the lease files.
+        with open(self._clock, "a"):
+            pass
+        os.utime(self._clock, None)
+        return os.stat(self._clock).st_mtime
+
+    def put(self, paths: Iterable[StrPath]) -> int:
+        """Add paths to the queue, skipping paths already in it.
+
+        Returns:
+            Number of paths added.
+        """
+        known: Set[str] = set()
+        for state in _STATES:
+            known.update(name.split(".")[0] for name in self._list(state))
+        added = 0
+        for path in paths:
+            path = os.fspath(path)
+            identifier = job_id(path)
+            if identifier in known:
+                continue
+            self._write(self._state_path(PENDING, f"{identifier}.0"), path)
+            known.add(identifier)
+            added += 1
+        return added
+
+    def _write(self, destination: str, text: str) -> None:
+        temporary = os.path.join(
+            self.directory, f".{self.worker}.{uuid.uuid4().hex}.tmp"
+        )
+        with open(temporary, "w", encoding="utf-8") as file_handle:
+            file_handle.write(text)
+        os.replace(temporary, destination)
+
+    def claim(self) -> Optional[Job]:
+        """Claim a pending job, or return None if there is none.
+
+        Jobs whose lease has run out are put back in the queue every
+        ``requeue_interval`` seconds, and before giving up when no pending
+        job is found.
+        """
+        requeued = None
+        if (
+            self._last_requeue is None
+            or time.monotonic() - self._last_requeue >= self.requeue_interval
+        ):
+            requeued = self.requeue_expired()
+        job = self._claim_pending()
+        if job is None and requeued is None and self.requeue_expired():
+            job = self._claim_pending()
+        return job
+
+    def _claim_pending(self) -> Optional[Job]:
+        start = random.randrange(len(_SHARDS))
+        for shard in _SHARDS[start:] + _SHARDS[:start]:
+            names = os.listdir(os.path.join(self.directory, PENDING, shard))
+            if not names:
+                continue
+            offset = random.randrange(len(names))
+            for name in names[offset:] + names[:offset]:
+                job = self._claim_file(name)
+                if job is not None:
+                    return job
+        return None
+
+    def _claim_file(self, name: str) -> Optional[Job]:
+        identifier, _, attempt = name.partition(".")
+        pending_file = self._state_path(PENDING, name)
+        claim_file = self._state_path(CLAIMED, f"{name}.{self.worker}")
+        try:
+            # Start the lease on the server's clock before the job shows up
+            # as claimed, or it could look expired straight away.
+            os.utime(pending_file, None)
+            os.rename(pending_file, claim_file)
+        except FileNotFoundError:
+            # Another worker got it first, unless the rename went through
+            # and only its reply was lost.
+            if not os.path.exists(claim_file):
+                return None
+        with open(claim_file, encoding="utf-8") as file_handle:
+            path = file_handle.read()
+        return Job(identifier, path, int(attempt), claim_file)
+
+    def renew(self, job: Job) -> bool:
+        """Extend the lease on a job.
+
+        Returns:
+            False if the lease was lost because it ran out.
+        """
+        try:
+            os.utime(job.claim_file, None)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job: Job, record: Dict[str, Any]) -> None:
+        """Write the result of a job and remove it from the queue."""
+        record = dict(record, attempt=job.attempt, worker=self.worker)
+        self._write(
+            self._state_path(DONE, f"{job.id}.json"), json.dumps(record)
+        )
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(job.claim_file)
+
+    def retry(self, job: Job) -> bool:
+        """Put a job that could not be finished back in the queue.
+
+        The job is given up once it has been tried ``max_attempts`` times.
+
+        Returns:
+            False if the job was given up.
+        """
+        self._requeue(job.claim_file, job.id, job.attempt)
+        return job.attempt + 1 < self.max_attempts
+
+    def _requeue(self, claim_file: str, identifier: str, attempt: int) -> bool:
+        if attempt + 1 >= self.max_attempts:
+            destination = self._state_path(FAILED, identifier)
+        else:
+            destination = self._state_path(
+                PENDING, f"{identifier}.{attempt + 1}"
+            )
+        try:
+            os.rename(claim_file, destination)
+        except FileNotFoundError:
+            # Requeued by another worker, or the lease was lost.
+            return False
+        return True
+
+    def requeue_expired(self) -> int:
+        """Put jobs whose lease ran out back in the queue.
+
+        Returns:
+            Number of jobs put back or given up.
+        """
+        self._last_requeue = time.monotonic()
+        now = self._now()
+        requeued = 0
+        for name in self._list(CLAIMED):
+            claim_file = self._state_path(CLAIMED, name)
+            try:
+                expired = os.stat(claim_file).st_mtime + self.lease < now
+            except FileNotFoundError:
+                continue
+            identifier, attempt, _ = name.split(".", 2)
+            if expired and self._requeue(claim_file, identifier, int(attempt)):
+                requeued += 1
+        return requeued
+
+    def counts(self) -> Dict[str, int]:
+        """Count the jobs in each state."""
+        return {state: len(self._list(state)) for state in _STATES}
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Read the results written so far."""
+        for name in self._list(DONE):
+            with open(
+                self._state_path(DONE, name), encoding="utf-8"
+            ) as file_handle:
+                yield json.load(file_handle)
+
+    def failed(self) -> Iterator[str]:
+        """Yield the paths of the jobs that were given up."""
+        for name in self._list(FAILED):
+            with open(
+                self._state_path(FAILED, name), encoding="utf-8"
+            ) as file_handle:
+                yield file_handle.read()
+
+
+@contextlib.contextmanager
+def _renewing(queue: WorkQueue, job: Job) -> Iterator[None]:
+    stop = threading.Event()
+
+    def renew() -> None:
+        while not stop.wait(queue.lease / 3):
+            if not queue.renew(job):
+                return
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_worker(
+    queue: WorkQueue,
+    policies: Sequence[PolicySource] = (),
+    format: Optional[mediaconch.MediaConch_format_t] = None,
+    max_bytes: Optional[int] = None,
+    max_jobs: Optional[int] = None,
+    wait: Optional[float] = None,
+    media_filter: Optional[batch.MediaFilter] = None,
+) -> int:
+    """Validate jobs from the queue until it is empty.
+
+    Run one worker per process, in as many processes and on as many hosts
+    as needed. The lease on each job is renewed while it is validated.
+
+    Args:
+        queue: queue to take jobs from.
+        policies: policy files or :class:`Policy` objects applied to every
+            file.
+        format: report format. The library default is used if not set.
+        max_bytes: only analyze the first ``max_bytes`` of larger files.
+        max_jobs: stop after this many jobs.
+        wait: when the queue is empty, wait this many seconds and look
+            again instead of returning, as long as other workers still hold
+            claimed jobs that may come back.
+        media_filter: only validate the files it returns True for. The
+            others are completed with ``skipped`` set in their result.
+
+    Returns:
+        Number of jobs completed.
+
+    Raises:
+        ValueError: one of the policies could not be loaded. This stops the
+            worker before it claims a job, so no job is spent on it.
+    """
+    completed = 0
+    with MediaConchSession(
+        policies, format, max_files=batch.WORKER_MAX_FILES
+    ) as session:
+        while max_jobs is None or completed < max_jobs:
+            # Set up the instance the next file goes into, loading the
+            # policies, so that errors doing so are not taken for errors
+            # validating the file.
+            session.warm()
+            job = queue.claim()
+            if job is None:
+                if wait is None or not queue.counts()[CLAIMED]:
+                    break
+                time.sleep(wait)
+                continue
+            try:
+                with _renewing(queue, job):
+                    result = batch.validate_file(
+                        session, job.path, max_bytes, media_filter
+                    )
+            except Exception as error:
+                # Try again elsewhere, and record the error once out of
+                # attempts. The worker itself carries on with the next job.
+                if job.attempt + 1 < queue.max_attempts:
+                    queue.retry(job)
+                    continue
+                result = batch.ValidationResult(job.path, error=repr(error))
+            queue.complete(job, dataclasses.asdict(result))
+            completed += 1
+    return completed
@@ -0,0 +1,36 @@
+import os
+import shutil
+
+import pytest
+import sample_media_files
+
+PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE = "PYMEDIACONCH_SAMPLE_FILES"
+
+@pytest.fixture(scope="session")
+def sample_files(tmp_path_factory):
+    if not any(condition for condition in [
+        os.getenv(PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE),
+        shutil.which('ffmpeg')
+    ]):
+        pytest.skip(
+            f"neither environment variable "
+            f"{PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE} nor ffmpeg was found, "
+            f"skipping integration test"
+        )
+    if sample_file_path := os.getenv(PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE):
+        return sample_media_files.get_sample_files(sample_file_path)
+
+    return sample_media_files.create_sample_files(tmp_path_factory.mktemp('samples'))
+
+
+@pytest.fixture
+def sample_copies(sample_files, tmp_path):
+    """Paths of four copies of the bars and tone file."""
+    test_path = tmp_path / 'testing_area'
+    test_path.mkdir()
+    files = []
+    for i in range(4):
+        destination = test_path / f'bars_{i}.mp4'
+        shutil.copy(str(sample_files['bars_and_tone_file']), str(destination))
+        files.append(str(destination))
+    return files
@@ -0,0 +1,109 @@
+import pytest
+from uiucprescon.pymediaconch import archive, results
+
+REPORT = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<MediaConch xmlns="https://mediaarea.net/mediaconch" version="0.3">'
+    '<media ref="{ref}">'
+    '<policy name="Preservation" outcome="pass" rules_run="1">'
+    '<rule name="Is Matroska" outcome="pass" actual="Matroska"/>'
+    '</policy></media></MediaConch>\n'
+)
+
+
+@pytest.fixture
+def report_archive(tmp_path):
+    with archive.ReportArchive(tmp_path / "reports.db") as report_archive:
+        yield report_archive
+
+
+def test_add_and_get(report_archive):
+    report = REPORT.format(ref="a.mkv")
+    entry_id = report_archive.add("a.mkv", report)
+    assert report_archive.get(entry_id) == report.encode()
+
+
+def test_identical_reports_are_stored_once(report_archive):
+    report = REPORT.format(ref="a.mkv")
+    first = report_archive.add("a.mkv", report)
+    second = report_archive.add("a.mkv", report.encode())
+    assert first != second
+    stats = report_archive.stats()
+    assert stats["entries"] == 2
+    assert stats["reports"] == 1
+
+
+def test_reports_of_different_files_are_stored_once(report_archive):
+    first = report_archive.add("a.mkv", REPORT.format(ref="a.mkv"))
+    second = report_archive.add("b.mkv", REPORT.format(ref="b.mkv"))
+    assert report_archive.stats()["reports"] == 1
+    assert report_archive.get(first) == REPORT.format(ref="a.mkv").encode()
+    assert report_archive.get(second) == REPORT.format(ref="b.mkv").encode()
+
+
+def test_path_is_restored_in_escaped_forms(report_archive):
+    path = 'tapes/"A&B"/1.mkv'
+    report = (
+        REPORT.format(ref='tapes/&quot;A&amp;B&quot;/1.mkv')
+        + '{"ref": "tapes/\\"A&B\\"/1.mkv"}\n'
+    )
+    entry_id = report_archive.add(path, report)
+    assert report_archive.get(entry_id) == report.encode()
+
+
+def test_open_restores_path_across_reads(report_archive):
+    report = "\x00".join(
+        REPORT.format(ref="a.mkv") for _ in range(10_000)
+    )
+    entry_id = report_archive.add("a.mkv", report)
+    with report_archive.open(entry_id) as stream:
+        chunks = iter(lambda: stream.read(1021), b"")
+        assert b"".join(chunks) == report.encode()
+
+
+def test_latest_by_path(report_archive):
+    report_archive.add("a.mkv", REPORT.format(ref="old"))
+    newest = report_archive.add("a.mkv", REPORT.format(ref="new"))
+    report_archive.add("b.mkv", REPORT.format(ref="b.mkv"))
+    assert report_archive.latest("a.mkv") == newest
+    assert report_archive.latest("missing.mkv") is None
+    assert [entry.id for entry in report_archive.entries("a.mkv")][-1] == (
+        newest
+    )
+
+
+def test_open_streams_large_report(report_archive):
+    report = REPORT.format(ref="x" * 1_000_000)
+    entry_id = report_archive.add("big.mkv", report)
+    with report_archive.open(entry_id) as stream:
+        assert stream.read(5) == b"<?xml"
+        rest = stream.read()
+    assert b"<?xml" + rest == report.encode()
+    entry = next(report_archive.entries("big.mkv"))
+    assert entry.stored_size < entry.size // 100
+
+
+def test_open_feeds_results_parser(report_archive):
+    entry_id = report_archive.add("a.mkv", REPORT.format(ref="a.mkv"))
+    with report_archive.open(entry_id) as stream:
+        [media] = results.iter_results(stream)
+    assert media.outcome == "pass"
+
+
+def test_missing_entry(report_archive):
+    with pytest.raises(KeyError):
+        report_archive.get(42)
+
+
+def test_zstd_with_dictionary(tmp_path):
+    pytest.importorskip("zstandard")
+    with archive.ReportArchive(
+        tmp_path / "reports.db", codec="zstd"
+    ) as report_archive:
+        for index in range(200):
+            report_archive.add(f"{index}.mkv", REPORT.format(ref=index))
+        report_archive.train_dictionary(size=4096)
+        report = REPORT.format(ref="after.mkv")
+        entry_id = report_archive.add("after.mkv", report)
+        assert report_archive.get(entry_id) == report.encode()
+        assert report_archive.get(1) == REPORT.format(ref=0).encode()
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from uiucprescon.pymediaconch import batch
+
+
+class EchoInstance:
+    """Reports name the file they were added as, like MediaConch."""
+
+    def __init__(self, template):
+        self.template = template
+        self.added = []
+
+    def add_file(self, filename):
+        self.added.append(filename)
+        return len(self.added) - 1
+
+    def get_report(self, file_id):
+        return self.template.replace("PATH", self.added[file_id])
+
+    def get_last_error(self):
+        return ""
+
+
+@pytest.mark.parametrize("template, name", [
+    ('<media ref="PATH"/>', 'a &amp; &quot;b&quot;.mkv'),
+    ('{"media": [{"ref": "PATH"}]}', 'a & \\"b\\".mkv'),
+    ("PATH: pass", 'a & "b".mkv'),
+])
+def test_partial_report_names_the_file(tmp_path, template, name):
+    path = tmp_path / 'a & "b".mkv'
+    path.write_bytes(b"\0" * 100)
+    instance = EchoInstance(template)
+    result = batch.validate_file(instance, path, max_bytes=10)
+    assert result.partial
+    assert instance.added[0] != str(path)
+    directory = str(tmp_path)
+    if template.startswith("{"):
+        directory = json.dumps(directory)[1:-1]
+    assert result.report == template.replace("PATH", f"{directory}/{name}")
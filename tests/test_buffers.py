@@ -0,0 +1,68 @@
+import io
+import mmap
+import os
+import tempfile
+from uiucprescon.pymediaconch import buffers
+
+DATA = bytes(range(256)) * 64
+
+
+class RecordingInstance:
+    def __init__(self):
+        self.contents = []
+
+    def add_file(self, filename):
+        with open(filename, "rb") as file_handle:
+            self.contents.append(file_handle.read())
+        return len(self.contents) - 1
+
+
+def test_add_buffer_from_bytes():
+    instance = RecordingInstance()
+    with buffers.add_buffer(instance, DATA) as file_id:
+        assert instance.contents[file_id] == DATA
+
+
+def test_add_buffer_from_mmap(tmp_path):
+    source = tmp_path / "media.bin"
+    source.write_bytes(DATA)
+    instance = RecordingInstance()
+    with open(source, "rb") as file_handle, \
+            mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with buffers.add_buffer(instance, mapped) as file_id:
+            assert instance.contents[file_id] == DATA
+
+
+def test_add_stream_in_chunks():
+    instance = RecordingInstance()
+    with buffers.add_stream(instance, io.BytesIO(DATA), chunk_size=1000) as file_id:
+        assert instance.contents[file_id] == DATA
+
+
+def test_add_stream_with_size():
+    instance = RecordingInstance()
+    with buffers.add_stream(instance, io.BytesIO(DATA), size=1500, chunk_size=1000) as file_id:
+        assert instance.contents[file_id] == DATA[:1500]
+
+
+def test_buffer_file_is_removed_after_use():
+    with buffers.buffer_file(DATA) as path:
+        pass
+    try:
+        open(path, "rb").close()
+    except OSError:
+        pass
+    else:
+        assert False, f"{path} still exists"
+
+
+
+def test_stream_file_moves_to_disk_past_max_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with buffers.stream_file(
+        io.BytesIO(DATA), chunk_size=1000, max_memory=1500
+    ) as path:
+        assert os.path.dirname(path) == str(tmp_path)
+        with open(path, "rb") as file_handle:
+            assert file_handle.read() == DATA
+    assert list(tmp_path.iterdir()) == []
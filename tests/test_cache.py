@@ -0,0 +1,60 @@
+import pytest
+from uiucprescon.pymediaconch import cache
+
+
+@pytest.fixture()
+def report_cache(tmp_path):
+    with cache.ReportCache(tmp_path / "cache.sqlite", max_bytes=10) as value:
+        yield value
+
+
+def test_cache_miss_then_hit(report_cache):
+    assert report_cache.get("key") is None
+    report_cache.put("key", "report")
+    assert report_cache.get("key") == "report"
+    assert report_cache.stats()["hits"] == 1
+    assert report_cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used(report_cache):
+    report_cache.put("first", "aaaa")
+    report_cache.put("second", "bbbb")
+    report_cache.get("first")
+    report_cache.put("third", "cccc")
+    assert report_cache.get("second") is None
+    assert report_cache.get("first") == "aaaa"
+    assert report_cache.stats()["evictions"] == 1
+
+
+def test_cache_replacing_an_entry_keeps_the_size(report_cache):
+    report_cache.put("first", "aaaa")
+    report_cache.put("first", "bbbbbb")
+    report_cache.put("second", "cccc")
+    assert report_cache.stats()["bytes"] == 10
+    assert report_cache.stats()["evictions"] == 0
+    assert report_cache.get("first") == "bbbbbb"
+
+
+def test_cache_key_changes_with_content(report_cache, tmp_path):
+    media = tmp_path / "file.mkv"
+    media.write_bytes(b"one")
+    key = report_cache.key(media, format_name="MediaConch_format_Json")
+    media.write_bytes(b"two")
+    assert report_cache.key(media, format_name="MediaConch_format_Json") != key
+
+
+def test_cache_key_changes_with_format(report_cache, tmp_path):
+    media = tmp_path / "file.mkv"
+    media.write_bytes(b"one")
+    assert report_cache.key(media, format_name="MediaConch_format_Json") != \
+           report_cache.key(media, format_name="MediaConch_format_Xml")
+
+
+def test_cache_pickles_to_a_new_connection(report_cache):
+    import pickle
+
+    report_cache.put("key", "report")
+    with pickle.loads(pickle.dumps(report_cache)) as copy:
+        assert copy.path == report_cache.path
+        assert copy.max_bytes == report_cache.max_bytes
+        assert copy.get("key") == "report"
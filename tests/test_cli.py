@@ -0,0 +1,53 @@
+from uiucprescon.pymediaconch import cli
+
+
+def test_walk_is_sorted_and_recursive(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "two.mkv").write_bytes(b"")
+    (tmp_path / "one.mkv").write_bytes(b"")
+    (tmp_path / "a.mkv").write_bytes(b"")
+    assert list(cli.walk([str(tmp_path)])) == [
+        str(tmp_path / "a.mkv"),
+        str(tmp_path / "b" / "two.mkv"),
+        str(tmp_path / "one.mkv"),
+    ]
+
+
+def test_manifest_resumes(tmp_path):
+    manifest_file = tmp_path / "manifest.jsonl"
+    manifest = cli.Manifest(str(manifest_file))
+    manifest.record("good.mkv", True)
+    manifest.record("bad.mkv", False)
+    manifest.close()
+    with open(manifest_file, "a") as file_handle:
+        file_handle.write('{"path": "interrupt')
+
+    manifest = cli.Manifest(str(manifest_file))
+    assert manifest.should_skip("good.mkv")
+    assert manifest.should_skip("bad.mkv")
+    assert not manifest.should_skip("bad.mkv", retry_failed=True)
+    assert not manifest.should_skip("new.mkv")
+    manifest.close()
+
+
+def test_enqueue(tmp_path, capsys):
+    (tmp_path / "media").mkdir()
+    (tmp_path / "media" / "a.mkv").write_bytes(b"")
+    (tmp_path / "media" / "b.mkv").write_bytes(b"")
+    queue = tmp_path / "queue"
+    assert cli.main(["enqueue", str(queue), str(tmp_path / "media")]) == 0
+    assert len(list((queue / "pending").glob("*/*"))) == 2
+    assert "Added 2 files" in capsys.readouterr().out
+
+
+def test_media_filter_arguments():
+    parser = cli.get_arg_parser()
+    args = parser.parse_args(["validate", "media"])
+    assert cli._media_filter(args) is None
+
+    args = parser.parse_args(
+        ["validate", "media", "--kind", "dpx", "--exclude", "*.tmp"]
+    )
+    media_filter = cli._media_filter(args)
+    assert media_filter.kinds == frozenset({"dpx"})
+    assert media_filter.exclude == ("*.tmp",)
@@ -0,0 +1,38 @@
+import pytest
+from uiucprescon.pymediaconch import instrumentation
+
+
+class FailingInstance:
+    def get_report_bytes(self, file_id):
+        raise RuntimeError("render failed")
+
+    def get_reports(self, file_id, formats):
+        return {report_format: "réport" for report_format in formats}
+
+
+def test_failed_call_ends_the_phase_and_counts_an_error():
+    events = []
+    mc = instrumentation.InstrumentedMediaConch(
+        FailingInstance(), on_phase=events.append
+    )
+    with pytest.raises(RuntimeError):
+        mc.get_report(1)
+    assert [(event.phase, event.boundary) for event in events] == [
+        ("report", "start"), ("report", "end"),
+    ]
+    metrics = mc.metrics.as_dict()
+    assert metrics["errors"] == 1
+    assert metrics["phases"]["report"]["count"] == 1
+
+
+def test_get_reports_records_encoded_sizes():
+    events = []
+    mc = instrumentation.InstrumentedMediaConch(
+        FailingInstance(), on_phase=events.append
+    )
+    reports = mc.get_reports(1, ["xml", "json"])
+    assert reports == {"xml": "réport", "json": "réport"}
+    metrics = mc.metrics.as_dict()
+    assert metrics["reports"] == 2
+    assert metrics["peak_report_size"] == len("réport".encode())
+    assert events[-1].size == 2 * len("réport".encode())
@@ -1,28 +1,28 @@
+import asyncio
 import json
 import os
 import shutil
 import subprocess
 import pytest
-import sample_media_files
-from uiucprescon.pymediaconch import mediaconch
-
-PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE = "PYMEDIACONCH_SAMPLE_FILES"
-
-@pytest.fixture(scope="session")
-def sample_files(tmp_path_factory):
-    if not any(condition for condition in [
-        os.getenv(PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE),
-        shutil.which('ffmpeg')
-    ]):
-        pytest.skip(
-            f"neither environment variable "
-            f"{PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE} nor ffmpeg was found, "
-            f"skipping integration test"
-        )
-    if sample_file_path := os.getenv(PYMEDIACONCH_SAMPLE_FILES_ENV_VARIABLE):
-        return sample_media_files.get_sample_files(sample_file_path)
+from uiucprescon.pymediaconch import (
+    aio,
+    batch,
+    cli,
+    instrumentation,
+    matrix,
+    mediaconch,
+    reports,
+    results,
+    session,
+    sniff,
+    supervisor,
+    watch,
+    workqueue,
+)
+from uiucprescon.pymediaconch.cache import ReportCache
+from uiucprescon.pymediaconch.policies import Policy
+from uiucprescon.pymediaconch.pool import InstancePool
 
-    return sample_media_files.create_sample_files(tmp_path_factory.mktemp('samples'))
 
 def test_integration(sample_files, tmpdir, monkeypatch):
     test_path = tmpdir.mkdir('testing_area')
@@ -36,3 +36,418 @@ def test_integration(sample_files, tmpdir, monkeypatch):
     report = json.loads(mc.get_report(file_id))
     assert report['MediaConch']['media'][0]['ref'] == str(bar_and_tone)
 
+
+
+def test_validate_many(sample_copies):
+    files = sample_copies
+
+    validated = batch.validate_many(
+        files,
+        format=mediaconch.MediaConch_format_t.MediaConch_format_Json,
+        max_workers=2
+    )
+    assert [result.path for result in validated] == files
+    for result in validated:
+        assert json.loads(result.report)['MediaConch']['media'][0]['ref'] == result.path
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_validate_many_with_cache(sample_files, tmpdir, mode):
+    paths = [str(sample_files['bars_and_tone_file'])]
+    with ReportCache(str(tmpdir / "cache.sqlite"), hash_content=True) as cache:
+        [first] = batch.validate_many(paths, cache=cache, mode=mode)
+        [second] = batch.validate_many(paths, cache=cache, mode=mode)
+        assert first.ok
+        assert second.report == first.report
+        assert cache.stats()["entries"] == 1
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_iter_validate_with_cache(sample_files, tmpdir, mode):
+    paths = [str(sample_files['bars_and_tone_file'])]
+    with ReportCache(str(tmpdir / "cache.sqlite")) as cache:
+        [first] = batch.iter_validate(paths, cache=cache, mode=mode)
+        [second] = batch.iter_validate(paths, cache=cache, mode=mode)
+        assert second.report == first.report
+        assert cache.stats()["entries"] == 1
+
+def test_validate_many_with_processes(sample_copies):
+    files = sample_copies
+
+    validated = batch.validate_many(
+        files,
+        format=mediaconch.MediaConch_format_t.MediaConch_format_Json,
+        max_workers=2,
+        mode="process",
+        chunksize=2
+    )
+    assert [result.path for result in validated] == files
+    assert all(result.ok for result in validated)
+
+
+def test_async_as_completed(sample_copies):
+    files = sample_copies
+
+    async def validate():
+        async with aio.AsyncMediaConch(max_concurrency=2) as async_mc:
+            await async_mc.set_format(
+                mediaconch.MediaConch_format_t.MediaConch_format_Json
+            )
+            return [result async for result in async_mc.as_completed(files)]
+
+    validated = asyncio.run(validate())
+    assert sorted(result.path for result in validated) == sorted(files)
+    assert all(result.ok for result in validated)
+
+
+def test_async_validate_after_add_policy(sample_files):
+    policy = Policy.from_string(
+        '<?xml version="1.0"?>'
+        '<policy type="and" name="Is MPEG-4">'
+        '<rule name="Format" value="Format" tracktype="General" '
+        'occurrence="*" operator="=">MPEG-4</rule>'
+        '</policy>'
+    )
+    path = str(sample_files['bars_and_tone_file'])
+
+    async def validate():
+        async with aio.AsyncMediaConch(max_concurrency=2) as async_mc:
+            await async_mc.set_format(
+                mediaconch.MediaConch_format_t.MediaConch_format_Xml
+            )
+            # The worker running the first file predates the policy, so it
+            # must not be reused for the second.
+            await asyncio.gather(
+                async_mc.validate(path), async_mc.add_policy(policy)
+            )
+            return await async_mc.validate(path)
+
+    result = asyncio.run(validate())
+    [media] = results.iter_results(result.report.encode())
+    assert [policy.name for policy in media.policies] == ["Is MPEG-4"]
+
+def test_async_validate_after_an_invalid_policy(sample_files):
+    path = str(sample_files['bars_and_tone_file'])
+
+    async def validate():
+        async with aio.AsyncMediaConch(max_concurrency=2) as async_mc:
+            result = await async_mc.add_policy(
+                Policy.from_string("this is not a policy")
+            )
+            return result, await async_mc.validate(path)
+
+    added, result = asyncio.run(validate())
+    assert added < 0
+    assert result.ok
+
+
+def test_get_reports_restores_the_default_format(sample_files):
+    mc = mediaconch.MediaConch()
+    file_id = mc.add_file(str(sample_files['bars_and_tone_file']))
+    xml_report = mc.get_report(file_id)
+    mc.get_reports(
+        file_id, [mediaconch.MediaConch_format_t.MediaConch_format_Json]
+    )
+    assert mc.get_report(file_id) == xml_report
+
+
+def test_get_report_bytes(sample_files, tmpdir, monkeypatch):
+    test_path = tmpdir.mkdir('testing_area')
+    bar_and_tone = test_path / 'bars.mp4'
+    shutil.copy(str(sample_files['bars_and_tone_file']), str(bar_and_tone))
+    monkeypatch.chdir(test_path)
+
+    mc = mediaconch.MediaConch()
+    mc.set_format(mediaconch.MediaConch_format_t.MediaConch_format_Json)
+    file_id = mc.add_file(str(bar_and_tone))
+    report = mc.get_report_bytes(file_id)
+    assert isinstance(report, bytes)
+    assert report == mc.get_report(file_id).encode()
+
+
+def test_validate_file_with_byte_budget(sample_files):
+    bar_and_tone = sample_files['bars_and_tone_file']
+    mc = mediaconch.MediaConch()
+    result = batch.validate_file(mc, bar_and_tone, max_bytes=1024)
+    assert result.partial is True
+    assert result.path == str(bar_and_tone)
+
+    result = batch.validate_file(
+        mc, bar_and_tone, max_bytes=os.path.getsize(bar_and_tone)
+    )
+    assert result.partial is False
+
+
+def test_validate_many_with_byte_budget_and_unreadable_path(
+    sample_files, tmpdir
+):
+    directory = tmpdir.mkdir('not_a_file')
+    good, bad = batch.validate_many(
+        [str(sample_files['bars_and_tone_file']), str(directory)],
+        max_bytes=10,
+    )
+    assert good.ok
+    assert not bad.ok
+    assert bad.path == str(directory)
+
+def test_instrumented_media_conch(sample_files):
+    events = []
+    mc = instrumentation.InstrumentedMediaConch(on_phase=events.append)
+    mc.set_format(mediaconch.MediaConch_format_t.MediaConch_format_Json)
+    file_id = mc.add_file(str(sample_files['bars_and_tone_file']))
+    report = mc.get_report(file_id)
+
+    metrics = mc.metrics.as_dict()
+    assert metrics['files'] == 1
+    assert metrics['errors'] == 0
+    assert metrics['bytes_read'] == os.path.getsize(sample_files['bars_and_tone_file'])
+    assert metrics['peak_report_size'] == len(report.encode())
+    assert set(metrics['phases']) == {'analyze', 'report'}
+    assert [(event.phase, event.boundary) for event in events] == [
+        ('analyze', 'start'), ('analyze', 'end'),
+        ('report', 'start'), ('report', 'end'),
+    ]
+    assert 'pymediaconch_files_total 1' in mc.metrics.to_prometheus()
+
+
+def test_add_files(sample_files, tmpdir):
+    test_path = tmpdir.mkdir('testing_area')
+    bar_and_tone = test_path / 'bars.mp4'
+    shutil.copy(str(sample_files['bars_and_tone_file']), str(bar_and_tone))
+    missing = test_path / 'missing.mp4'
+
+    mc = mediaconch.MediaConch()
+    mc.set_format(mediaconch.MediaConch_format_t.MediaConch_format_Json)
+    file_ids, errors = mc.add_files([str(bar_and_tone), str(missing)])
+    assert len(file_ids) == 2
+    assert list(errors) == [1]
+    report = json.loads(mc.get_report(file_ids[0]))
+    assert report['MediaConch']['media'][0]['ref'] == str(bar_and_tone)
+
+
+def test_report_renderer(sample_files):
+    formats = mediaconch.MediaConch_format_t
+    mc = mediaconch.MediaConch()
+    file_id = mc.add_file(str(sample_files['bars_and_tone_file']))
+    renderer = reports.ReportRenderer(mc)
+    rendered = renderer.get_reports(
+        file_id, [formats.MediaConch_format_Json, formats.MediaConch_format_Xml]
+    )
+    assert list(rendered) == [formats.MediaConch_format_Json, formats.MediaConch_format_Xml]
+    assert json.loads(rendered[formats.MediaConch_format_Json])
+    assert renderer.get_report(file_id, formats.MediaConch_format_Xml) == rendered[formats.MediaConch_format_Xml]
+    assert renderer.hits == 1
+
+
+def test_session_rolling_window(sample_files):
+    bar_and_tone = str(sample_files['bars_and_tone_file'])
+    with session.MediaConchSession(
+        format=mediaconch.MediaConch_format_t.MediaConch_format_Json,
+        max_files=2
+    ) as mc:
+        file_ids = [mc.add_file(bar_and_tone) for _ in range(5)]
+        assert len(mc) == 3
+        with pytest.raises(KeyError):
+            mc.get_report(file_ids[0])
+        report = json.loads(mc.get_report(file_ids[-1]))
+        assert report['MediaConch']['media'][0]['ref'] == bar_and_tone
+
+        mc.remove_file(file_ids[-1])
+        with pytest.raises(KeyError):
+            mc.get_report(file_ids[-1])
+        mc.clear()
+        assert len(mc) == 0
+
+
+def test_cli_validate(sample_files, tmpdir):
+    test_path = tmpdir.mkdir('testing_area')
+    for i in range(3):
+        shutil.copy(str(sample_files['bars_and_tone_file']), str(test_path / f'bars_{i}.mp4'))
+    output = tmpdir / 'output.jsonl'
+    manifest = tmpdir / 'manifest.jsonl'
+    args = ['validate', str(test_path), '--output', str(output), '--manifest', str(manifest)]
+
+    assert cli.main(args) == 0
+    records = [json.loads(line) for line in output.readlines()]
+    assert sorted(record['path'] for record in records) == sorted(
+        str(test_path / f'bars_{i}.mp4') for i in range(3)
+    )
+
+    # Everything is in the manifest, so nothing is validated again.
+    assert cli.main(args) == 0
+    assert len(output.readlines()) == 3
+
+
+def test_cli_validate_with_an_invalid_policy(sample_files, tmpdir, capsys):
+    policy = tmpdir / 'broken.xml'
+    policy.write('this is not a policy')
+    args = [
+        'validate', str(sample_files['bars_and_tone_file']),
+        '--policy', str(policy),
+    ]
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(args)
+    assert exit_info.value.code == 1
+    assert 'broken.xml' in capsys.readouterr().err
+
+
+def test_watch_validates_existing_files(sample_files, tmpdir):
+    test_path = tmpdir.mkdir('testing_area')
+    bar_and_tone = test_path / 'bars.mp4'
+    shutil.copy(str(sample_files['bars_and_tone_file']), str(bar_and_tone))
+
+    events = watch.watch([str(test_path)], settle=0, interval=0.1)
+    try:
+        event = next(events)
+    finally:
+        events.close()
+    assert event.kind == 'new'
+    assert event.result.path == str(bar_and_tone)
+    assert event.result.ok
+
+
+def test_instance_pool(sample_files):
+    with InstancePool(
+        1, format=mediaconch.MediaConch_format_t.MediaConch_format_Json
+    ) as pool:
+        with pool.checkout() as mc:
+            file_id = mc.add_file(str(sample_files['bars_and_tone_file']))
+            assert "MediaConch" in json.loads(mc.get_report(file_id))
+            with pytest.raises(TimeoutError):
+                with pool.checkout(timeout=0.01):
+                    pass
+        with pool.checkout() as mc:
+            # Files from the last checkout are forgotten on return.
+            with pytest.raises(KeyError):
+                mc.get_report(file_id)
+        stats = pool.stats()
+    assert stats.checkouts == 2
+    assert stats.timeouts == 1
+    assert stats.in_use == 0
+    assert 0 < stats.utilization <= 1
+
+
+def test_instance_pool_resets_a_default_format(sample_files):
+    with InstancePool(1) as pool:
+        with pool.checkout() as mc:
+            mc.set_format(mediaconch.MediaConch_format_t.MediaConch_format_Json)
+        with pool.checkout() as mc:
+            assert mc.format is None
+            file_id = mc.add_file(str(sample_files['bars_and_tone_file']))
+            report = mc.get_report(file_id)
+    with pytest.raises(ValueError):
+        json.loads(report)
+
+
+def test_evaluate_policies(sample_files, tmpdir):
+    policies = [
+        Policy.from_string(
+            '<?xml version="1.0"?>'
+            '<policy type="and" name="Is MPEG-4">'
+            '<rule name="Format" value="Format" tracktype="General" '
+            'occurrence="*" operator="=">MPEG-4</rule>'
+            '</policy>',
+            name="mp4",
+        ),
+        Policy.from_string(
+            '<?xml version="1.0"?>'
+            '<policy type="and" name="Is Matroska">'
+            '<rule name="Format" value="Format" tracktype="General" '
+            'occurrence="*" operator="=">Matroska</rule>'
+            '</policy>',
+            name="mkv",
+        ),
+    ]
+    missing = str(tmpdir / "missing.mp4")
+    result = matrix.evaluate_policies(
+        [str(sample_files['bars_and_tone_file']), missing], policies
+    )
+    assert result.policies == ["Is MPEG-4", "Is Matroska"]
+    assert list(result.row(0)) == [matrix.PASS, matrix.FAIL]
+    assert result.failed_rules(0, 1) == ["Format"]
+    assert list(result.row(1)) == [matrix.ERROR, matrix.ERROR]
+    assert 1 in result.errors
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_evaluate_policies_with_an_invalid_policy(sample_files, mode):
+    policies = [
+        Policy.from_string("this is not a policy", name="broken"),
+        Policy.from_string(
+            '<?xml version="1.0"?>'
+            '<policy type="and" name="Is MPEG-4">'
+            '<rule name="Format" value="Format" tracktype="General" '
+            'occurrence="*" operator="=">MPEG-4</rule>'
+            '</policy>',
+            name="mp4",
+        ),
+    ]
+    # Skipping the broken policy would report the second policy's outcome
+    # in the first column, so evaluation fails instead.
+    with pytest.raises(ValueError, match="broken"):
+        matrix.evaluate_policies(
+            [str(sample_files['bars_and_tone_file'])], policies, mode=mode
+        )
+
+
+def test_work_queue(sample_files, tmpdir):
+    queue = workqueue.WorkQueue(str(tmpdir / "queue"))
+    queue.put([str(sample_files['bars_and_tone_file'])])
+    assert workqueue.run_worker(
+        queue, format=mediaconch.MediaConch_format_t.MediaConch_format_Json
+    ) == 1
+    [record] = queue.results()
+    assert record["path"] == str(sample_files['bars_and_tone_file'])
+    assert "MediaConch" in json.loads(record["report"])
+
+
+def test_work_queue_with_an_invalid_policy(sample_files, tmpdir):
+    policy = tmpdir / "broken.xml"
+    policy.write("this is not a policy")
+    queue = workqueue.WorkQueue(str(tmpdir / "queue"))
+    queue.put([str(sample_files['bars_and_tone_file'])])
+    with pytest.raises(ValueError):
+        workqueue.run_worker(queue, [str(policy)])
+    assert queue.counts()["pending"] == 1
+    assert list(queue.results()) == []
+
+
+def test_supervised_validator(sample_files):
+    path = str(sample_files['bars_and_tone_file'])
+    with supervisor.SupervisedValidator(
+        format=mediaconch.MediaConch_format_t.MediaConch_format_Json,
+        max_workers=2,
+        timeout=60,
+        max_memory=4 * 1024 ** 3,
+    ) as validator:
+        [result] = validator.validate([path])
+        assert result.ok
+        assert not result.timed_out
+
+        cancel = batch.CancellationToken()
+        cancel.cancel()
+        assert list(validator.validate([path], cancel=cancel)) == []
+
+
+def test_iter_validate_cancelled(sample_files):
+    cancel = batch.CancellationToken()
+    cancel.cancel()
+    paths = [str(sample_files['bars_and_tone_file'])] * 4
+    assert list(batch.iter_validate(paths, cancel=cancel)) == []
+
+
+def test_validate_with_media_filter(sample_files, tmpdir):
+    media = str(sample_files['bars_and_tone_file'])
+    notes = tmpdir / 'notes.txt'
+    notes.write('not a media file')
+    media_filter = sniff.MediaFilter()
+
+    media_result, notes_result = batch.validate_many(
+        [media, str(notes)], media_filter=media_filter
+    )
+    assert media_result.ok
+    assert notes_result.skipped
+
+    validated = list(batch.iter_validate(
+        [media, str(notes)], mode='process', media_filter=media_filter
+    ))
+    assert [result.path for result in validated] == [media]
@@ -0,0 +1,65 @@
+from uiucprescon.pymediaconch import matrix, results
+
+XML_REPORT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MediaConch xmlns="https://mediaarea.net/mediaconch" version="0.3">
+  <media ref="/data/sample.mkv">
+    <policy name="Preservation" type="and" rules_run="3" fail_count="1" pass_count="2" outcome="fail">
+      <rule name="Is Matroska" value="Format" tracktype="General" occurrence="*" operator="=" outcome="pass" actual="Matroska"/>
+      <policy name="Video" type="and" rules_run="2" fail_count="1" pass_count="1" outcome="fail">
+        <rule name="Is FFV1" value="Format" tracktype="Video" occurrence="*" operator="=" outcome="pass" actual="FFV1"/>
+        <rule name="Is 10 bit" value="BitDepth" tracktype="Video" occurrence="*" operator="=" outcome="fail" actual="8"/>
+      </policy>
+    </policy>
+    <policy name="Access" type="or" rules_run="1" fail_count="0" pass_count="1" outcome="pass">
+      <rule name="Has audio" value="Format" tracktype="Audio" occurrence="*" operator="exists" outcome="pass"/>
+    </policy>
+  </media>
+</MediaConch>
+"""
+
+
+def test_matrix_row():
+    [result] = results.iter_results(XML_REPORT)
+    codes, failures, rules = matrix.matrix_row(result, 3)
+    assert codes == [matrix.FAIL, matrix.PASS, matrix.ERROR]
+    assert failures == {0: (2,)}
+    assert rules[0] == ("Is Matroska", "Is FFV1", "Is 10 bit")
+    assert rules[2] == ()
+
+
+def test_policy_matrix_lookups():
+    [result] = results.iter_results(XML_REPORT)
+    codes, failures, rules = matrix.matrix_row(result, 2)
+    policy_matrix = matrix.PolicyMatrix(
+        paths=["a.mkv", "b.mkv"],
+        policies=["Preservation", "Access"],
+        rules=rules,
+        codes=matrix.array.array("b", codes + [matrix.ERROR] * 2),
+        failures={(0, 0): failures[0]},
+        errors={1: "unreadable"},
+    )
+    assert policy_matrix.code(0, 1) == matrix.PASS
+    assert list(policy_matrix.row(1)) == [matrix.ERROR, matrix.ERROR]
+    assert policy_matrix.failed_rules(0, 0) == ["Is 10 bit"]
+    assert policy_matrix.failed_rules(0, 1) == []
+
+
+def test_evaluate_policies_fills_rows_in_completion_order(monkeypatch):
+    def iter_validate(paths, *args, **kwargs):
+        # Completion order, with the failed file first.
+        yield matrix.batch.ValidationResult("b.mkv", error="unreadable")
+        yield matrix.batch.ValidationResult("a.mkv", XML_REPORT.decode())
+        yield matrix.batch.ValidationResult("a.mkv", XML_REPORT.decode())
+
+    monkeypatch.setattr(matrix.batch, "iter_validate", iter_validate)
+    policy_matrix = matrix.evaluate_policies(
+        ["a.mkv", "b.mkv", "a.mkv"], ["one.xml", "two.xml"]
+    )
+    assert policy_matrix.paths == ["a.mkv", "b.mkv", "a.mkv"]
+    assert list(policy_matrix.codes) == [
+        matrix.FAIL, matrix.PASS,
+        matrix.ERROR, matrix.ERROR,
+        matrix.FAIL, matrix.PASS,
+    ]
+    assert policy_matrix.errors == {1: "unreadable"}
+    assert policy_matrix.failed_rules(2, 0) == ["Is 10 bit"]
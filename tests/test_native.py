@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+from uiucprescon.pymediaconch import _native
+
+
+def test_lazy_module_loads_on_attribute_access():
+    module = _native._LazyModule("colorsys")
+    assert not module.loaded
+    assert module.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+    assert module.loaded
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "uiucprescon.pymediaconch.batch",
+        "uiucprescon.pymediaconch.cli",
+        "uiucprescon.pymediaconch.results",
+        "uiucprescon.pymediaconch.session",
+        "uiucprescon.pymediaconch.watch",
+    ],
+)
+def test_import_does_not_load_extension(module):
+    code = (
+        f"import sys, {module}; "
+        f"sys.exit('uiucprescon.pymediaconch.mediaconch' in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_from_import_does_not_load_extension():
+    code = (
+        "import sys; "
+        "from uiucprescon.pymediaconch import mediaconch; "
+        "sys.exit('uiucprescon.pymediaconch.mediaconch' in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,94 @@
+import pytest
+from uiucprescon.pymediaconch import policies
+
+POLICY = """<?xml version="1.0"?>
+<policy type="and" name="Is Matroska">
+  <rule name="Container" value="Format" tracktype="General" occurrence="*" operator="=">Matroska</rule>
+</policy>
+"""
+
+
+class RecordingInstance:
+    def __init__(self):
+        self.policies = []
+
+    def add_policy(self, filename):
+        self.policies.append(filename)
+        return 0
+
+
+def test_policy_path_contains_policy():
+    policy = policies.Policy.from_string(POLICY)
+    with open(policy.path, encoding="utf-8") as file_handle:
+        assert file_handle.read() == POLICY
+
+
+def test_policy_is_written_once_for_many_instances():
+    policy = policies.Policy.from_string(POLICY)
+    instances = [RecordingInstance() for _ in range(3)]
+    for instance in instances:
+        policy.attach(instance)
+    assert len({instance.policies[0] for instance in instances}) == 1
+
+
+def test_same_content_is_same_policy(tmp_path):
+    policy_file = tmp_path / "policy.xml"
+    policy_file.write_text(POLICY, encoding="utf-8")
+    assert policies.Policy.from_file(policy_file) == \
+           policies.Policy.from_string(POLICY)
+
+
+def test_add_policy_bytes():
+    instance = RecordingInstance()
+    policies.add_policy_bytes(instance, POLICY.encode())
+    with open(instance.policies[0], "rb") as file_handle:
+        assert file_handle.read() == POLICY.encode()
+
+
+def test_least_recently_used_policy_files_are_closed(monkeypatch):
+    monkeypatch.setattr(policies, "MAX_MATERIALIZED", 2)
+    attached = [
+        policies.Policy.from_string(POLICY.replace("Matroska", str(index)))
+        for index in range(4)
+    ]
+    instance = RecordingInstance()
+    for policy in attached:
+        policy.attach(instance)
+    assert list(policies._materialized)[-2:] == [
+        policy.digest for policy in attached[-2:]
+    ]
+    assert attached[0].digest not in policies._materialized
+    assert len(policies._materialized) <= 2
+
+
+def test_policy_file_is_kept_while_it_is_loaded(monkeypatch):
+    monkeypatch.setattr(policies, "MAX_MATERIALIZED", 0)
+    policy = policies.Policy.from_string(POLICY)
+
+    class ReadingInstance:
+        def add_policy(self, filename):
+            with open(filename, encoding="utf-8") as file_handle:
+                return 0 if file_handle.read() == POLICY else -1
+
+    assert policy.attach(ReadingInstance()) == 0
+    assert policy.digest not in policies._materialized
+
+
+class RejectingInstance(RecordingInstance):
+    def add_policy(self, filename):
+        if filename.endswith("broken.xml"):
+            return -1
+        return super().add_policy(filename)
+
+    def get_last_error(self):
+        return "not a policy"
+
+
+def test_add_policies_stops_at_a_policy_that_fails(tmp_path):
+    instance = RejectingInstance()
+    good = policies.Policy.from_string(POLICY)
+    with pytest.raises(ValueError, match="broken.xml: not a policy"):
+        policies.add_policies(
+            instance, [good, str(tmp_path / "broken.xml"), good]
+        )
+    assert len(instance.policies) == 1
@@ -0,0 +1,110 @@
+import pytest
+from uiucprescon.pymediaconch import results
+
+XML_REPORT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MediaConch xmlns="https://mediaarea.net/mediaconch" version="0.3">
+  <media ref="/data/sample.mkv">
+    <implementationChecks name="MediaConch EBML Implementation Checker" tests_run="1" fail_count="0" pass_count="1">
+      <check icid="EBML-ELEMENT-VALID-PARENT" version="1" tests_run="1" fail_count="0" pass_count="1">
+        <test outcome="pass"/>
+      </check>
+    </implementationChecks>
+    <policy name="Preservation" type="and" rules_run="3" fail_count="1" pass_count="2" outcome="fail">
+      <description>Masters</description>
+      <rule name="Is Matroska" value="Format" tracktype="General" occurrence="*" operator="=" outcome="pass" xpath="mi:MediaInfo/mi:track[@type='General'][*]/mi:Format='Matroska'" actual="Matroska"/>
+      <policy name="Video" type="and" rules_run="2" fail_count="1" pass_count="1" outcome="fail">
+        <rule name="Is FFV1" value="Format" tracktype="Video" occurrence="*" operator="=" outcome="pass" xpath="mi:MediaInfo/mi:track[@type='Video'][*]/mi:Format='FFV1'" actual="FFV1"/>
+        <rule name="Is 10 bit" value="BitDepth" tracktype="Video" occurrence="*" operator="=" outcome="fail" xpath="mi:MediaInfo/mi:track[@type='Video'][*]/mi:BitDepth='10'" actual="8"/>
+      </policy>
+    </policy>
+  </media>
+</MediaConch>
+"""
+
+
+def test_iter_outcomes_order():
+    outcomes = list(results.iter_outcomes(XML_REPORT))
+    assert [type(outcome).__name__ for outcome in outcomes] == [
+        "RuleOutcome",
+        "RuleOutcome",
+        "RuleOutcome",
+        "PolicyOutcome",
+        "PolicyOutcome",
+        "MediaOutcome",
+    ]
+
+
+def test_iter_outcomes_policy_details():
+    policies = [
+        outcome for outcome in results.iter_outcomes(XML_REPORT)
+        if isinstance(outcome, results.PolicyOutcome)
+    ]
+    assert policies[0].name == "Video"
+    assert policies[0].parent == "Preservation"
+    assert policies[1].rules_run == 3
+    assert policies[1].parent is None
+
+
+def test_iter_outcomes_media_outcome():
+    media = list(results.iter_outcomes(XML_REPORT))[-1]
+    assert media == results.MediaOutcome(ref="/data/sample.mkv", outcome="fail")
+
+
+def test_iter_failures():
+    failures = list(results.iter_failures(XML_REPORT))
+    assert len(failures) == 1
+    assert failures[0].policy == "Video"
+    assert failures[0].track_type == "Video"
+    assert failures[0].actual == "8"
+
+
+def test_iter_outcomes_from_text():
+    outcomes = list(results.iter_outcomes(XML_REPORT.decode()))
+    assert outcomes == list(results.iter_outcomes(XML_REPORT))
+
+
+def test_iter_outcomes_from_file(tmp_path):
+    report = tmp_path / "report.xml"
+    report.write_bytes(XML_REPORT)
+    assert len(list(results.iter_failures(report))) == 1
+    assert len(list(results.iter_failures(str(report)))) == 1
+
+
+MAXML_REPORT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MediaArea xmlns="https://mediaarea.net/mediaarea" version="0.1">
+  <media ref="/data/sample.mkv">
+    <MediaInfo xmlns="https://mediaarea.net/mediainfo" version="2.0">
+      <track type="General">
+        <Format>Matroska</Format>
+      </track>
+      <track type="Video">
+        <Format>FFV1</Format>
+        <BitDepth>8</BitDepth>
+      </track>
+    </MediaInfo>
+    <MediaConch xmlns="https://mediaarea.net/mediaconch" version="0.3">
+      <policy name="Is 8 bit" type="and" rules_run="1" fail_count="0" pass_count="1" outcome="pass">
+        <rule name="BitDepth" value="BitDepth" tracktype="Video" occurrence="*" operator="=" outcome="pass" actual="8"/>
+      </policy>
+    </MediaConch>
+  </media>
+</MediaArea>
+"""
+
+
+def test_iter_results_builds_policy_tree():
+    [media] = list(results.iter_results(XML_REPORT))
+    assert media.ref == "/data/sample.mkv"
+    assert media.outcome == "fail"
+    [preservation] = media.policies
+    assert [rule.name for rule in preservation.rules] == ["Is Matroska"]
+    [video] = preservation.policies
+    assert [rule.name for rule in video.rules] == ["Is FFV1", "Is 10 bit"]
+    assert [rule.actual for rule in media.failures()] == ["8"]
+
+
+def test_iter_results_tracks():
+    [media] = list(results.iter_results(MAXML_REPORT))
+    assert [track.type for track in media.tracks] == ["General", "Video"]
+    assert media.tracks[1].fields == {"Format": "FFV1", "BitDepth": "8"}
+    assert media.outcome == "pass"
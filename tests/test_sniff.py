@@ -0,0 +1,92 @@
+import pickle
+
+import pytest
+
+from uiucprescon.pymediaconch import sniff
+
+
+@pytest.mark.parametrize("header, kind", [
+    (b"\x1a\x45\xdf\xa3\x01\x00\x00\x00", "matroska"),
+    (b"\x00\x00\x00\x18ftypisom", "mp4"),
+    (b"\x00\x00\x00\x08wide\x00\x00\x00\x00mdat", "mp4"),
+    (b"RIFF\x24\x00\x00\x00WAVEfmt ", "wav"),
+    (b"RF64\xff\xff\xff\xffWAVEds64", "wav"),
+    (b"RIFF\x24\x00\x00\x00AVI LIST", "avi"),
+    (b"FORM\x00\x00\x00\x24AIFFCOMM", "aiff"),
+    (b"SDPX\x00\x00\x20\x00V2.0", "dpx"),
+    (b"XPDS\x00\x20\x00\x00V1.0", "dpx"),
+    (
+        b"\x00" * 16
+        + bytes.fromhex("060e2b34020501010d01020101020400"),
+        "mxf",
+    ),
+    (b"\x00\x00\x01\xba\x44\x00\x04\x00", "mpeg-ps"),
+    (b"\x47" + b"\x00" * 187 + b"\x47" + b"\x00" * 187, "mpeg-ts"),
+    (
+        (b"\x00\x00\x00\x00\x47" + b"\x00" * 187) * 2,
+        "mpeg-ts",
+    ),
+    (b"\x1f\x07\x00\x3f\x78\x78\x78\x78", "dv"),
+    (b"OggS\x00\x02\x00\x00", "ogg"),
+    (b"fLaC\x00\x00\x00\x22", "flac"),
+    (b"II*\x00\x08\x00\x00\x00", "tiff"),
+    (b"\x00\x00\x00\x0cjP  \r\n\x87\n\x00\x00", "jpeg2000"),
+    (b"ID3\x04\x00\x00\x00\x00", "mp3"),
+    # Two MPEG-1 layer III frames at 128 kbit/s and 44.1 kHz.
+    ((b"\xff\xfb\x90\x00" + b"\x00" * 413) * 2, "mp3"),
+])
+def test_sniff_recognizes_signatures(tmp_path, header, kind):
+    path = tmp_path / "file"
+    path.write_bytes(header)
+    assert sniff.sniff(path) == kind
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"%PDF-1.7\n",
+    b"<?xml version='1.0'?><policy/>",
+    b"\x89PNG\r\n\x1a\n",
+    b"\x47 just text starting with G",
+    "artist,title\r\nA,B\r\n".encode("utf-16"),
+    b"\xff\xfb\x90\x00" + b"\x00" * 413 + b"not another frame",
+])
+def test_sniff_rejects_other_files(tmp_path, content):
+    path = tmp_path / "file"
+    path.write_bytes(content)
+    assert sniff.sniff(path) is None
+
+
+def test_sniff_unreadable_file(tmp_path):
+    assert sniff.sniff(tmp_path / "missing.mkv") is None
+
+
+def test_media_filter_rules(tmp_path):
+    mkv = tmp_path / "film.mkv"
+    mkv.write_bytes(b"\x1a\x45\xdf\xa3")
+    dpx = tmp_path / "frame.dpx"
+    dpx.write_bytes(b"SDPX")
+    text = tmp_path / "notes.txt"
+    text.write_bytes(b"notes")
+
+    keep = sniff.MediaFilter()
+    assert keep(mkv) and keep(dpx) and not keep(text)
+
+    assert not sniff.MediaFilter(kinds=frozenset({"dpx"}))(mkv)
+    assert not sniff.MediaFilter(exclude_kinds=frozenset({"dpx"}))(dpx)
+    assert sniff.MediaFilter(include=("*.txt",))(text)
+    assert not sniff.MediaFilter(exclude=("film.*",))(mkv)
+    assert not sniff.MediaFilter(
+        include=("*",), exclude=(f"{tmp_path}/*.mkv",)
+    )(mkv)
+
+
+def test_media_filter_unknown_kind():
+    with pytest.raises(ValueError):
+        sniff.MediaFilter(kinds=frozenset({"betamax"}))
+
+
+def test_media_filter_pickles():
+    media_filter = sniff.MediaFilter(
+        kinds=frozenset({"matroska"}), exclude=("*.tmp",)
+    )
+    assert pickle.loads(pickle.dumps(media_filter)) == media_filter
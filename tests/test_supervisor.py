@@ -0,0 +1,30 @@
+import os
+import sys
+import types
+
+import pytest
+from uiucprescon.pymediaconch import supervisor
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="reads /proc"
+)
+
+
+def test_read_position(tmp_path):
+    path = tmp_path / "media.bin"
+    path.write_bytes(b"\0" * 1000)
+    with open(path, "rb") as file_handle:
+        file_handle.seek(300)
+        assert supervisor._read_position(os.getpid(), str(path)) == 300
+    assert supervisor._read_position(os.getpid(), str(path)) is None
+
+
+def test_resident_bytes():
+    assert supervisor._resident_bytes(os.getpid()) > 0
+
+
+def test_timeout_starts_once_the_worker_is_ready():
+    validator = supervisor.SupervisedValidator(timeout=0)
+    # A worker still loading its policies has a file but no start time.
+    worker = types.SimpleNamespace(path="a.mkv", started=None)
+    assert list(validator._check([worker], None)) == []
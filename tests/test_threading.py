@@ -0,0 +1,126 @@
+"""Stress tests for calling into MediaConch from many threads at once.
+
+These are most useful on a free-threaded interpreter (3.13t, 3.14t), where
+the calls really run in parallel. On a regular build the GIL is released
+around every library call, so they still overlap inside libmediaconch.
+"""
+import concurrent.futures
+import json
+import sys
+import sysconfig
+import threading
+
+import pytest
+from uiucprescon.pymediaconch import mediaconch
+
+THREADS = 16
+ITERATIONS = 20
+
+JSON = mediaconch.MediaConch_format_t.MediaConch_format_Json
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Make a GIL build switch threads as often as it can, to get as much
+    # interleaving as possible.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_in_threads(work, threads=THREADS):
+    barrier = threading.Barrier(threads)
+
+    def start_together(index):
+        barrier.wait()
+        return work(index)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(start_together, range(threads)))
+
+
+@pytest.mark.skipif(
+    not sysconfig.get_config_var("Py_GIL_DISABLED"),
+    reason="needs a free-threaded interpreter",
+)
+def test_extension_does_not_enable_gil():
+    # Importing an extension that does not declare free-threading support
+    # turns the GIL back on.
+    assert mediaconch.MediaConch() is not None
+    assert not sys._is_gil_enabled()
+
+
+def test_shared_instance(sample_files):
+    path = str(sample_files['bars_and_tone_file'])
+    mc = mediaconch.MediaConch()
+    mc.set_format(JSON)
+    expected = mc.get_report(mc.add_file(path))
+
+    def work(_):
+        reports = []
+        for _ in range(ITERATIONS):
+            file_id = mc.add_file(path)
+            assert file_id >= 0
+            reports.append(mc.get_report(file_id))
+        return reports
+
+    for reports in run_in_threads(work):
+        assert reports == [expected] * ITERATIONS
+
+
+def test_instance_per_thread(sample_files):
+    path = str(sample_files['bars_and_tone_file'])
+
+    def work(_):
+        mc = mediaconch.MediaConch()
+        mc.set_format(JSON)
+        for _ in range(ITERATIONS):
+            report = json.loads(mc.get_report_bytes(mc.add_file(path)))
+            assert report['MediaConch']['media'][0]['ref'] == path
+
+    run_in_threads(work)
+
+
+def test_shared_instance_mixed_calls(sample_files):
+    path = str(sample_files['bars_and_tone_file'])
+    mc = mediaconch.MediaConch()
+    file_ids = mc.add_files([path] * THREADS)[0]
+    formats = [
+        mediaconch.MediaConch_format_t.MediaConch_format_Xml,
+        mediaconch.MediaConch_format_t.MediaConch_format_Text,
+        JSON,
+    ]
+
+    def work(index):
+        for iteration in range(ITERATIONS):
+            match (index + iteration) % 4:
+                case 0:
+                    mc.set_format(formats[iteration % len(formats)])
+                case 1:
+                    assert mc.get_report(file_ids[index])
+                case 2:
+                    reports = mc.get_reports(file_ids[index], formats)
+                    assert set(reports) == set(formats)
+                case _:
+                    assert mc.add_file(path) >= 0
+                    mc.get_last_error()
+
+    run_in_threads(work)
+
+
+def test_instance_pool(sample_files):
+    from uiucprescon.pymediaconch.pool import InstancePool
+
+    path = str(sample_files['bars_and_tone_file'])
+    with InstancePool(4, format=JSON) as pool:
+
+        def work(_):
+            for _ in range(ITERATIONS):
+                with pool.checkout() as mc:
+                    assert json.loads(mc.get_report(mc.add_file(path)))
+
+        run_in_threads(work)
+        stats = pool.stats()
+    assert stats.checkouts == THREADS * ITERATIONS
+    assert stats.in_use == 0
@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+from uiucprescon.pymediaconch import batch, watch
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_inotify_queue_overflow_rescans_every_root(tmp_path):
+    root = tmp_path / "root"
+    (root / "sub").mkdir(parents=True)
+    (root / "sub" / "a.mkv").write_bytes(b"a")
+    source = watch._InotifySource([str(root)])
+    try:
+        overflow = watch._EVENT_HEADER.pack(-1, watch._IN_Q_OVERFLOW, 0, 0)
+        source._read_events = lambda: overflow
+        # Any event makes the descriptor readable.
+        (root / "b.mkv").write_bytes(b"b")
+        assert sorted(source.wait(1)) == [
+            str(root / "b.mkv"), str(root / "sub" / "a.mkv")
+        ]
+    finally:
+        source.close()
+
+
+class RecordingValidator:
+    def __init__(self):
+        self.closed = False
+
+    def validate(self, paths):
+        return [batch.ValidationResult(path, report="") for path in paths]
+
+    def close(self):
+        self.closed = True
+
+
+def test_watch_keeps_one_validator(tmp_path, monkeypatch):
+    validators = []
+
+    def open_validator(*args):
+        validators.append(RecordingValidator())
+        return validators[-1]
+
+    monkeypatch.setattr(watch, "_open_validator", open_validator)
+    (tmp_path / "a.mkv").write_bytes(b"a")
+    events = watch.watch(
+        [str(tmp_path)], settle=0, interval=0.01, use_inotify=False
+    )
+    try:
+        assert next(events).kind == "new"
+        (tmp_path / "a.mkv").write_bytes(b"changed")
+        assert next(events).kind == "changed"
+    finally:
+        events.close()
+    assert len(validators) == 1
+    assert validators[0].closed
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from uiucprescon.pymediaconch import workqueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return workqueue.WorkQueue(tmp_path / "queue", worker="first")
+
+
+def test_put_skips_known_paths(queue):
+    assert queue.put(["a.mkv", "b.mkv"]) == 2
+    assert queue.put(["b.mkv", "c.mkv"]) == 1
+    assert queue.counts()["pending"] == 3
+
+
+def test_claim_is_exclusive(queue, tmp_path):
+    other = workqueue.WorkQueue(tmp_path / "queue", worker="second")
+    queue.put(["a.mkv"])
+    job = queue.claim()
+    assert job.path == "a.mkv"
+    assert job.attempt == 0
+    assert other.claim() is None
+
+
+def test_complete_writes_result(queue):
+    queue.put(["a.mkv"])
+    job = queue.claim()
+    queue.complete(job, {"path": job.path, "ok": True})
+    assert list(queue.results()) == [
+        {"path": "a.mkv", "ok": True, "attempt": 0, "worker": "first"}
+    ]
+    assert queue.counts() == {
+        "pending": 0, "claimed": 0, "done": 1, "failed": 0
+    }
+    assert queue.put(["a.mkv"]) == 0
+
+
+def test_expired_lease_is_requeued(queue, tmp_path):
+    other = workqueue.WorkQueue(
+        tmp_path / "queue", lease=60, worker="second"
+    )
+    queue.put(["a.mkv"])
+    job = queue.claim()
+    # Make the lease look two minutes old.
+    stat = os.stat(job.claim_file)
+    os.utime(job.claim_file, (stat.st_atime - 120, stat.st_mtime - 120))
+    retried = other.claim()
+    assert retried.path == "a.mkv"
+    assert retried.attempt == 1
+    assert not queue.renew(job)
+
+
+def test_retry_gives_up_after_max_attempts(tmp_path):
+    queue = workqueue.WorkQueue(tmp_path / "queue", max_attempts=2)
+    queue.put(["a.mkv"])
+    assert queue.retry(queue.claim())
+    assert not queue.retry(queue.claim())
+    assert queue.claim() is None
+    assert list(queue.failed()) == ["a.mkv"]
+
+
+def test_claim_checks_leases_every_requeue_interval(tmp_path, monkeypatch):
+    queue = workqueue.WorkQueue(
+        tmp_path / "queue", worker="first", requeue_interval=3600
+    )
+    queue.put(["a.mkv", "b.mkv"])
+    checks = []
+    requeue_expired = queue.requeue_expired
+
+    def counting_requeue_expired():
+        checks.append(None)
+        return requeue_expired()
+
+    monkeypatch.setattr(queue, "requeue_expired", counting_requeue_expired)
+    queue.claim()
+    queue.claim()
+    assert len(checks) == 1
+    # With nothing pending, leases are checked again before giving up.
+    assert queue.claim() is None
+    assert len(checks) == 2
+
+
+def test_claim_drains_every_shard(queue):
+    paths = [f"{index}.mkv" for index in range(50)]
+    queue.put(paths)
+    claimed = set()
+    while (job := queue.claim()) is not None:
+        claimed.add(job.path)
+    assert claimed == set(paths)
+    assert queue.counts()["pending"] == 0